@@ -1,147 +1,163 @@
-from fastapi import FastAPI, Query, HTTPException
-from fastapi.responses import Response, HTMLResponse
+from fastapi import FastAPI, Query, HTTPException, Header, Request
+from fastapi.responses import Response, HTMLResponse, StreamingResponse
 from app.scheduler import start_scheduler
-from app.script.db import SessionLocal
-from app.script.models import TechnicalIndicator, NewsArticle
+from app.script.db import AsyncSessionLocal
+from app.script.models import NewsArticle, currency_mask, matching_masks
 from datetime import datetime, timedelta
-import matplotlib.pyplot as plt
 import pandas as pd
-import io
 from typing import Optional, List
-from sqlalchemy import desc
 from app.script.debug import debug_printer as d
+from app.script.timeframes import (
+    SUPPORTED_TIMEFRAMES, INDICATOR_FIELDS, load_indicator_frame, fetch_indicator_rows, fetch_indicator_rows_multi,
+    rows_to_frame, indicator_records, indicator_columns,
+)
+from app.script.downsample import lttb_frame, MIN_POINTS
+from app.script.news_search import search_news
+from app.script.archive import query_news_window
+from app.script.pagination import decode_cursor, InvalidCursor
+from app.script.latest import get_latest
+from app.script.data_version import data_version, window_bucket
+from app.script.charts import render_chart, render_panel, compose_panels, shutdown_pool, chart_cache, chart_etag, etag_matches
+from app.script.client_chart import client_chart_canvas, client_chart_script
+from app.script.executors import chart_executor, llm_executor, data_executor, run_in, shutdown_executors
+from app.script.responses import offloaded_json_response
+from app.script.export import export_indicators, export_news, EXPORT_FORMATS
+from app.script.singleflight import SingleFlight
+from app.script.conditional import DataVersionETagMiddleware, versioned
 from app.ws_trump import run_ws
+import asyncio
 import threading
 import torch # 追加
 import gc # 追加
 
 app = FastAPI()
+# @versioned を付けたJSONのAPIは、データが更新されるまでIf-None-Matchに304で応える
+app.add_middleware(DataVersionETagMiddleware)
 
 @app.on_event("startup")
 def startup_event():
     start_scheduler()
     threading.Thread(target=run_ws, daemon=True).start()
 
+@app.on_event("shutdown")
+def shutdown_event():
+    shutdown_executors()
+    shutdown_pool()
+
 @app.get("/")
 def read_root():
     return {"message": "Forex Technical Indicator API is running"}
 
 # ============ テクニカル指標 ============
+#
+# 読み込み専用のエンドポイントは非同期エンジン（aiosqlite）で読み、既存の同期クエリ関数は AsyncSession.run_sync で呼ぶ。
+# チャート描画・LLM推論は専用のスレッドプール（app.script.executors）で実行し、共有スレッドプールを占有しない。
+# run_syncはイベントループ上で実行されるため、その中では行を読むだけにし、DataFrameへの変換・LTTB・
+# JSONの変換と圧縮はdata_executor（またはchart_executor）で行う。
+# 同時に届いた同じ描画・集計のリクエストは inflight で1回の処理にまとめる。
+
+inflight = SingleFlight()
+
+def check_timeframe(timeframe: str):
+    if timeframe not in SUPPORTED_TIMEFRAMES:
+        raise HTTPException(status_code=400, detail=f"時間足が無効です。{', '.join(SUPPORTED_TIMEFRAMES)} のいずれかを指定してください")
+
+# チャートに描く指標（デフォルト）
+CHART_INDICATORS = ["close", "rsi", "macd", "macd_signal", "sma_20", "ema_50", "bb_upper", "bb_lower", "adx"]
 
 @app.get("/visualization/{pair_code}")
-def visualize_indicators(
+async def visualize_indicators(
     pair_code: str,
     days: int = Query(default=7, ge=1, le=30),
     width: int = Query(default=1000, ge=300, le=2000),
     height: int = Query(default=800, ge=200, le=1600),
-    indicators: List[str] = Query(default=["close", "rsi", "macd", "macd_signal", "sma_20", "ema_50", "bb_upper", "bb_lower", "adx"])
+    indicators: List[str] = Query(default=CHART_INDICATORS),
+    timeframe: str = Query(default="1h", description="時間足（1h, 4h, 1d）"),
+    max_points: Optional[int] = Query(default=None, ge=MIN_POINTS, description="描画する最大点数（省略時は画像の横幅ピクセル数）"),
+    if_none_match: Optional[str] = Header(default=None)
 ):
     """
     為替レートとテクニカル指標のグラフを生成します。
+    描画済みの画像はデータが更新されるまでキャッシュし、ETagで再検証できます。
+    点数が画像の横幅（またはmax_points）を超える場合は、LTTBで間引いてから描画します。
 
     Args:
         pair_code: 通貨ペアコード (例: "USDJPY", "EURJPY")
         days: 何日分のデータを表示するか (1-30日)
         indicators: 表示する指標のリスト
+        timeframe: 時間足（1h, 4h, 1d）。4h, 1dは保存済みの1時間足から集約したもの
+        max_points: 描画する最大点数（省略時は横幅のピクセル数）
     """
+    check_timeframe(timeframe)
+    max_points = max_points or width
+
     # データベースからデータを取得
-    session = SessionLocal()
-    try:
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days)
-
-        query = session.query(TechnicalIndicator).filter(
-            TechnicalIndicator.currency_pair == pair_code,
-            TechnicalIndicator.timestamp >= start_date,
-            TechnicalIndicator.timestamp <= end_date
-        ).order_by(TechnicalIndicator.timestamp)
-
-        results = query.all()
-
-        if not results:
-            raise HTTPException(status_code=404, detail=f"データが見つかりません。通貨ペア: {pair_code}")
-
-        # DataFrameに変換
-        data = {
-            'timestamp': [r.timestamp for r in results],
-            'close': [r.close for r in results],
-            'rsi': [r.rsi for r in results],
-            'macd': [r.macd for r in results],
-            'macd_signal': [r.macd_signal for r in results],
-            'sma_20': [r.sma_20 for r in results],
-            'ema_50': [r.ema_50 for r in results],
-            'bb_upper': [r.bb_upper for r in results],
-            'bb_lower': [r.bb_lower for r in results],
-            'adx': [r.adx for r in results]
-        }
+    async with AsyncSessionLocal() as session:
+        # データバージョンと期間の区切りが同じなら、描画済みの画像を返す（ブラウザが同じ画像を持っていれば304）
+        version = await session.run_sync(data_version, pair_code)
+        cache_key = (pair_code, timeframe, days, width, height, tuple(sorted(set(indicators))), max_points, version, window_bucket())
+        etag = chart_etag(cache_key)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        png = chart_cache.get(cache_key)
+        if png is not None:
+            return Response(content=png, media_type="image/png", headers=headers)
+
+    # 同じ画像を描画中のリクエストがあれば、その結果を待つ
+    png = await inflight.do(
+        cache_key, draw_indicator_chart, cache_key, pair_code, days, width, height, indicators, timeframe, max_points
+    )
+    return Response(content=png, media_type="image/png", headers=headers)
 
-        df = pd.DataFrame(data)
-        df.set_index('timestamp', inplace=True)
-
-        # グラフ作成
-        plt.figure(figsize=(12, 8))
-
-        # figureサイズを動的に設定
-        fig_width = width / 100  # ピクセルからインチへ変換
-        fig_height = height / 100
-
-        # サブプロットの設定
-        fig, axes = plt.subplots(nrows=3, ncols=1, figsize=(fig_width, fig_height),
-                            sharex=True, gridspec_kw={'height_ratios': [3, 1, 1]})
-
-        # メインチャート（価格とMA）
-        price_indicators = [i for i in ["close", "sma_20", "ema_50", "bb_upper", "bb_lower"] if i in indicators]
-        for ind in price_indicators:
-            if ind == "close":
-                axes[0].plot(df.index, df[ind], label=f"価格", linewidth=1.5)
-            else:
-                axes[0].plot(df.index, df[ind], label=f"{ind}", linewidth=1)
-
-        axes[0].set_title(f"{pair_code} テクニカル分析 ({days}日間)")
-        axes[0].set_ylabel("価格")
-        axes[0].legend()
-        axes[0].grid(True)
-
-        # RSI
-        if "rsi" in indicators:
-            axes[1].plot(df.index, df["rsi"], label="RSI", color="purple")
-            axes[1].axhline(y=70, color='r', linestyle='-', alpha=0.3)
-            axes[1].axhline(y=30, color='g', linestyle='-', alpha=0.3)
-            axes[1].set_ylabel("RSI")
-            axes[1].set_ylim([0, 100])
-            axes[1].legend()
-            axes[1].grid(True)
-
-        # MACD
-        if "macd" in indicators and "macd_signal" in indicators:
-            axes[2].plot(df.index, df["macd"], label="MACD")
-            axes[2].plot(df.index, df["macd_signal"], label="シグナル", linestyle="--")
-            axes[2].bar(df.index, df["macd"] - df["macd_signal"], color=["green" if val >= 0 else "red" for val in (df["macd"] - df["macd_signal"])], alpha=0.3)
-            axes[2].set_ylabel("MACD")
-            axes[2].legend()
-            axes[2].grid(True)
-
-        plt.tight_layout()
-
-        # 画像をバイト列に変換
-        buf = io.BytesIO()
-        plt.savefig(buf, format="png", dpi=100)
-        buf.seek(0)
-
-        return Response(content=buf.getvalue(), media_type="image/png")
-
-    finally:
-        session.close()
+async def draw_indicator_chart(cache_key, pair_code, days, width, height, indicators, timeframe, max_points) -> bytes:
+    """
+    指標を読み込んでチャートを描画し、キャッシュに入れる
+    """
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=days)
+
+    async with AsyncSessionLocal() as session:
+        rows = await session.run_sync(fetch_indicator_rows, pair_code, timeframe, start=start_date, end=end_date)
+
+    if not rows:
+        raise HTTPException(status_code=404, detail=f"データが見つかりません。通貨ペア: {pair_code}")
+
+    png = await run_in(chart_executor, render_indicator_rows, rows, pair_code, days, timeframe, width, height, indicators, max_points)
+    chart_cache.put(cache_key, png)
+    return png
+
+def render_indicator_rows(rows, pair_code, days, timeframe, width, height, indicators, max_points) -> bytes:
+    # 横幅より多い点は描いても見分けられないので、表示する指標の形を保ったまま間引く
+    df = lttb_frame(rows_to_frame(rows), max_points, [c for c in indicators if c in INDICATOR_FIELDS] or None)
+    return render_chart(df, pair_code, days, timeframe, width, height, indicators)
+
+def downsampled_frames(groups, max_points, columns=None, plotted=None) -> dict:
+    """
+    fetch_indicator_rows_multiの行をペアごとのDataFrameにし、LTTBで間引く（data_executorで実行する）
+    """
+    return {pair: lttb_frame(rows_to_frame(rows, columns), max_points, plotted) for pair, rows in groups.items()}
 
 # HTMLでグラフを表示するページ
 @app.get("/chart/{pair_code}", response_class=HTMLResponse)
 def show_chart(
     pair_code: str,
-    days: int = Query(default=7, ge=1, le=30)
+    days: int = Query(default=7, ge=1, le=30),
+    render: str = Query("server", pattern="^(server|client)$", description="server: サーバーで描画したPNG / client: ブラウザで描画"),
+    timeframe: str = Query(default="1h", description="時間足（1h, 4h, 1d）")
 ):
     """
     為替レートとテクニカル指標のHTMLページを返します。
+    render=client の場合は列形式のJSON（/api/indicators/{pair_code}/columns）を取得してブラウザで描画します。
     """
+    check_timeframe(timeframe)
+    if render == "client":
+        chart = client_chart_canvas(pair_code, days, timeframe, 1000, 800)
+        script = client_chart_script()
+    else:
+        chart = f'<img class="chart" src="/visualization/{pair_code}?days={days}&timeframe={timeframe}" alt="{pair_code} Chart">'
+        script = ""
+
     html_content = f"""
     <!DOCTYPE html>
     <html>
@@ -165,11 +181,20 @@ def show_chart(
                     <button onclick="updateDays(14)">2週間</button>
                     <button onclick="updateDays(30)">1ヶ月</button>
                 </div>
-                <img class="chart" src="/visualization/{pair_code}?days={days}" alt="{pair_code} Chart">
+                {chart}
             </div>
+            {script}
             <script>
                 function updateDays(days) {{
-                    window.location.href = `/chart/{pair_code}?days=` + days;
+                    const url = new URL(window.location);
+                    url.searchParams.set('days', days);
+                    if (typeof loadAllCharts === 'function') {{
+                        // ブラウザ描画ではページを読み直さずにデータだけ取得し直す
+                        history.replaceState(null, '', url.toString());
+                        loadAllCharts(days);
+                    }} else {{
+                        window.location.href = url.toString();
+                    }}
                 }}
             </script>
         </body>
@@ -177,14 +202,20 @@ def show_chart(
     """
     return html_content
 
+# 比較ページ・比較APIで一度に扱う通貨ペアの上限
+MAX_COMPARE_PAIRS = 12
+
 # 複数通貨ペアの比較ページ
 @app.get("/compare", response_class=HTMLResponse)
 def compare_pairs(
     days: int = Query(default=7, ge=1, le=30),
-    pairs: List[str] = Query(default=["USDJPY", "EURJPY"])
+    pairs: List[str] = Query(default=["USDJPY", "EURJPY"]),
+    render: str = Query("server", pattern="^(server|client|composite)$", description="server: ペアごとのPNG / client: ブラウザで描画 / composite: 全ペアを1枚にまとめたPNG")
 ):
     """
     複数の通貨ペアを比較するHTMLページを返します。
+    render=client の場合は全ペアの列形式のJSONを1回で取得してブラウザで描画します（サーバーでの画像生成なし）。
+    render=composite の場合は全ペアを1回のクエリで読み込み、並列に描画した1枚の画像を表示します。
     """
     # 利用可能な通貨ペアリスト
     available_pairs = ["USDJPY", "EURJPY"]
@@ -193,6 +224,18 @@ def compare_pairs(
     chart_width = 600 if len(pairs) > 1 else 1000
     chart_height = 500 if len(pairs) > 1 else 800
 
+    script = ""
+    if render == "composite":
+        pair_params = "".join(f"&pairs={pair}" for pair in pairs)
+        chart_boxes = f'<div class="chart-box" style="grid-column: 1 / -1;"><img class="chart" src="/compare/visualization?days={days}&width={chart_width}&height={chart_height}{pair_params}" alt="Compare Chart"></div>'
+    else:
+        if render == "client":
+            charts = [client_chart_canvas(pair, days, "1h", chart_width, chart_height) for pair in pairs]
+            script = client_chart_script()
+        else:
+            charts = [f'<img class="chart" src="/visualization/{pair}?days={days}&width={chart_width}&height={chart_height}" alt="{pair} Chart">' for pair in pairs]
+        chart_boxes = ''.join([f'<div class="chart-box"><h3>{pair}</h3>{chart}</div>' for pair, chart in zip(pairs, charts)])
+
     # HTML生成
     html_content = f"""
     <!DOCTYPE html>
@@ -284,10 +327,11 @@ def compare_pairs(
                 </div>
 
                 <div class="chart-container">
-                    {''.join([f'<div class="chart-box"><h3>{pair}</h3><img class="chart" src="/visualization/{pair}?days={days}&width={chart_width}&height={chart_height}" alt="{pair} Chart"></div>' for pair in pairs])}
+                    {chart_boxes}
                 </div>
             </div>
 
+            {script}
             <script>
                 function updateDays(days) {{
                     const url = new URL(window.location);
@@ -313,6 +357,10 @@ def compare_pairs(
                 }}
 
                 function refreshAllCharts() {{
+                    if (typeof loadAllCharts === 'function') {{
+                        loadAllCharts();
+                        return;
+                    }}
                     const charts = document.querySelectorAll('.chart');
                     const timestamp = new Date().getTime();
                     charts.forEach(chart => {{
@@ -325,148 +373,248 @@ def compare_pairs(
     """
     return html_content
 
+# 複数通貨ペアのチャートを1枚にまとめた画像
+@app.get("/compare/visualization")
+async def visualize_compare(
+    pairs: List[str] = Query(default=["USDJPY", "EURJPY"]),
+    days: int = Query(default=7, ge=1, le=30),
+    width: int = Query(default=600, ge=300, le=2000, description="1ペアあたりの幅"),
+    height: int = Query(default=500, ge=200, le=1600, description="1ペアあたりの高さ"),
+    columns: int = Query(default=2, ge=1, le=4, description="横に並べるペア数"),
+    indicators: List[str] = Query(default=CHART_INDICATORS),
+    timeframe: str = Query(default="1h", description="時間足（1h, 4h, 1d）"),
+    if_none_match: Optional[str] = Header(default=None)
+):
+    """
+    複数の通貨ペアのチャートを格子状に並べた1枚の画像を返します。
+    全ペアの指標を1回のクエリで読み込み、ペアごとのパネルを並列に描画して合成します。
+    """
+    check_timeframe(timeframe)
+    pairs = list(dict.fromkeys(pairs))[:MAX_COMPARE_PAIRS]
+
+    async with AsyncSessionLocal() as session:
+        versions = [await session.run_sync(data_version, pair) for pair in pairs]
+        cache_key = ("compare", tuple(pairs), timeframe, days, width, height, columns, tuple(sorted(set(indicators))), tuple(versions), window_bucket())
+        etag = chart_etag(cache_key)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        png = chart_cache.get(cache_key)
+        if png is not None:
+            return Response(content=png, media_type="image/png", headers=headers)
+
+    png = await inflight.do(
+        cache_key, draw_compare_chart, cache_key, pairs, days, width, height, columns, indicators, timeframe
+    )
+    return Response(content=png, media_type="image/png", headers=headers)
+
+async def draw_compare_chart(cache_key, pairs, days, width, height, columns, indicators, timeframe) -> bytes:
+    """
+    全ペアの指標を読み込んでパネルを描画・合成し、キャッシュに入れる
+    """
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=days)
+
+    async with AsyncSessionLocal() as session:
+        groups = await session.run_sync(fetch_indicator_rows_multi, pairs, timeframe, start=start_date, end=end_date)
+
+    if not groups:
+        raise HTTPException(status_code=404, detail=f"データが見つかりません。通貨ペア: {', '.join(pairs)}")
+
+    # ペアごとのパネルを描画用のスレッドプール（→プロセスプール）で並列に描画
+    plotted = [c for c in indicators if c in INDICATOR_FIELDS] or None
+    frames = await run_in(data_executor, downsampled_frames, groups, width, plotted=plotted)
+    panels = await asyncio.gather(*[
+        run_in(chart_executor, render_panel, df, pair, days, timeframe, width, height, indicators)
+        for pair, df in frames.items()
+    ])
+    png = await run_in(data_executor, compose_panels, panels, columns=min(columns, len(panels)))
+    chart_cache.put(cache_key, png)
+    return png
+
+# 複数通貨ペアの指標を列形式でまとめて取得するAPI
+@app.get("/api/compare/indicators")
+async def get_compare_indicators(
+    request: Request,
+    pairs: List[str] = Query(default=["USDJPY", "EURJPY"]),
+    days: int = Query(default=7, ge=1, le=30),
+    timeframe: str = Query(default="1h", description="時間足（1h, 4h, 1d）"),
+    indicators: Optional[List[str]] = Query(default=None, description="返す列（省略時はclose と全指標）"),
+    max_points: Optional[int] = Query(default=None, ge=MIN_POINTS, description="ペアごとに返す最大行数（超える場合はLTTBで間引く）")
+):
+    """
+    複数の通貨ペアの指標を1回のクエリで読み込み、ペアごとに列形式（/api/indicators/{pair_code}/columns と同じ）で返します。
+
+    例: {"timeframe": "1h", "pairs": {"USDJPY": {"timestamps": [...], "columns": {...}}, "EURJPY": {...}}}
+    データが無いペアは含まれません。
+    """
+    check_timeframe(timeframe)
+    columns = indicators or INDICATOR_FIELDS
+    unknown = [c for c in columns if c not in INDICATOR_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"指標が無効です: {', '.join(unknown)}")
+    pairs = list(dict.fromkeys(pairs))[:MAX_COMPARE_PAIRS]
+
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=days)
+
+    columns = list(dict.fromkeys(columns))
+
+    async with AsyncSessionLocal() as session:
+        groups = await session.run_sync(
+            fetch_indicator_rows_multi, pairs, timeframe, start=start_date, end=end_date, columns=columns
+        )
+
+    if not groups:
+        raise HTTPException(status_code=404, detail=f"データが見つかりません。通貨ペア: {', '.join(pairs)}")
+
+    def build():
+        frames = downsampled_frames(groups, max_points, columns)
+        return {"timeframe": timeframe, "pairs": {pair: indicator_columns(df) for pair, df in frames.items()}}
+
+    return await offloaded_json_response(data_executor, request, build)
+
 # 指標のデータをJSON形式で取得するAPI
 @app.get("/api/indicators/{pair_code}")
-def get_indicators(
+@versioned(pair_param="pair_code", window=True)
+async def get_indicators(
+    request: Request,
     pair_code: str,
-    days: int = Query(default=7, ge=1, le=30)
+    days: int = Query(default=7, ge=1, le=30),
+    timeframe: str = Query(default="1h", description="時間足（1h, 4h, 1d）"),
+    max_points: Optional[int] = Query(default=None, ge=MIN_POINTS, description="返す最大行数（超える場合はLTTBで間引く）")
 ):
     """
     通貨ペアのテクニカル指標データをJSON形式で返します。
+    max_pointsを指定すると、行数がそれを超える場合にLTTBで間引いて返します（先頭と末尾の行は必ず含む）。
     """
-    session = SessionLocal()
-    try:
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days)
-
-        query = session.query(TechnicalIndicator).filter(
-            TechnicalIndicator.currency_pair == pair_code,
-            TechnicalIndicator.timestamp >= start_date,
-            TechnicalIndicator.timestamp <= end_date
-        ).order_by(TechnicalIndicator.timestamp)
-
-        results = query.all()
-
-        if not results:
-            raise HTTPException(status_code=404, detail=f"データが見つかりません。通貨ペア: {pair_code}")
-
-        # JSONに変換可能なデータ形式に変換
-        indicators = []
-        for r in results:
-            indicators.append({
-                'timestamp': r.timestamp.isoformat(),
-                'close': r.close,
-                'rsi': r.rsi,
-                'macd': r.macd,
-                'macd_signal': r.macd_signal,
-                'sma_20': r.sma_20,
-                'ema_50': r.ema_50,
-                'bb_upper': r.bb_upper,
-                'bb_lower': r.bb_lower,
-                'adx': r.adx
-            })
-
-        return indicators
-
-    finally:
-        session.close()
+    check_timeframe(timeframe)
+
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=days)
+
+    async with AsyncSessionLocal() as session:
+        rows = await session.run_sync(fetch_indicator_rows, pair_code, timeframe, start=start_date, end=end_date)
+
+    if not rows:
+        raise HTTPException(status_code=404, detail=f"データが見つかりません。通貨ペア: {pair_code}")
+
+    # JSONに変換可能なデータ形式に変換
+    def build():
+        return indicator_records(lttb_frame(rows_to_frame(rows), max_points))
+
+    return await offloaded_json_response(data_executor, request, build)
+
+# 指標のデータを列形式（時刻の配列＋指標ごとの配列）で取得するAPI（ブラウザ描画用）
+@app.get("/api/indicators/{pair_code}/columns")
+@versioned(pair_param="pair_code", window=True)
+async def get_indicator_columns(
+    request: Request,
+    pair_code: str,
+    days: int = Query(default=7, ge=1, le=30),
+    timeframe: str = Query(default="1h", description="時間足（1h, 4h, 1d）"),
+    indicators: Optional[List[str]] = Query(default=None, description="返す列（省略時はclose と全指標）"),
+    max_points: Optional[int] = Query(default=None, ge=MIN_POINTS, description="返す最大行数（超える場合はLTTBで間引く）")
+):
+    """
+    通貨ペアのテクニカル指標データを列ごとの配列で返します。
+    行ごとのdictのリスト（/api/indicators）と違い、列名が1回しか現れないためレスポンスが小さくなります。
+
+    例: {"currency_pair": "USDJPY", "timeframe": "1h", "timestamps": [1719792000000, ...], "columns": {"close": [...], "rsi": [...]}}
+    timestampsはエポックミリ秒（保存されている時刻をUTCとして変換）、値が無い箇所はnullです。
+    """
+    check_timeframe(timeframe)
+    columns = indicators or INDICATOR_FIELDS
+    unknown = [c for c in columns if c not in INDICATOR_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"指標が無効です: {', '.join(unknown)}")
+
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=days)
+
+    columns = list(dict.fromkeys(columns))
+
+    async with AsyncSessionLocal() as session:
+        rows = await session.run_sync(
+            fetch_indicator_rows, pair_code, timeframe, start=start_date, end=end_date, columns=columns
+        )
+
+    if not rows:
+        raise HTTPException(status_code=404, detail=f"データが見つかりません。通貨ペア: {pair_code}")
+
+    def build():
+        return {"currency_pair": pair_code, "timeframe": timeframe, **indicator_columns(lttb_frame(rows_to_frame(rows, columns), max_points))}
+
+    return await offloaded_json_response(data_executor, request, build)
+
+def recent_news(session, since: datetime) -> List[NewsArticle]:
+    """
+    指定日時以降のニュース記事を新しい順に取得する
+    """
+    return session.query(NewsArticle)\
+        .filter(NewsArticle.published >= since)\
+        .order_by(NewsArticle.published.desc())\
+        .all()
 
 @app.get("/api/signal_data/{pair_code}")
-def get_signal_data(pair_code: str, days: int = 3):
+async def get_signal_data(pair_code: str, days: int = 3):
     """
     テクニカル指標と直近ニュースをAIプロンプト用にまとめて返す
     """
-    session= SessionLocal()
-    try:
+    # 同じペア・日数の集計が実行中なら、その結果を待つ
+    return await inflight.do(("signal_data", pair_code, days), build_signal_data, pair_code, days)
+
+async def build_signal_data(pair_code: str, days: int) -> dict:
+    async with AsyncSessionLocal() as session:
         # 最新のテクニカル指標を取得
-        indicator = session.query(TechnicalIndicator)\
-            .filter(TechnicalIndicator.currency_pair == pair_code)\
-            .order_by(TechnicalIndicator.timestamp.desc())\
-            .first()
-        if not indicator:
+        indicator = await session.run_sync(get_latest, pair_code)
+        if indicator is None:
             raise HTTPException(status_code=404, detail="テクニカル指標が見つかりません")
 
         # 直近days日分のニュース記事を取得
         since = datetime.now() - timedelta(days=days)
-        news = session.query(NewsArticle)\
-            .filter(NewsArticle.published >= since)\
-            .order_by(NewsArticle.published.desc())\
-            .all()
+        news = await session.run_sync(recent_news, since)
 
-        # AIプロンプト用の辞書形式で返す
-        return {
-            "technical": {
-                "currency_pair": indicator.currency_pair,
-                "timestamp": indicator.timestamp.isoformat(),
-                "close": indicator.close,
-                "rsi": indicator.rsi,
-                "macd": indicator.macd,
-                "macd_signal": indicator.macd_signal,
-                "sma_20": indicator.sma_20,
-                "ema_50": indicator.ema_50,
-                "bb_upper": indicator.bb_upper,
-                "bb_lower": indicator.bb_lower,
-                "adx": indicator.adx,
-            },
-            "news": [
-                {
-                    "title": n.title,
-                    "summary": n.summary,
-                    "url": n.url,
-                    "published": n.published.isoformat() if n.published else None,
-                    "category": n.category
-                }
-                for n in news
-            ]
-        }
-    finally:
-        session.close()
+    # AIプロンプト用の辞書形式で返す
+    return {
+        "technical": {
+            "currency_pair": pair_code,
+            **indicator,
+            "timestamp": indicator["timestamp"].isoformat(),
+        },
+        "news": [
+            {
+                "title": n.title,
+                "summary": n.summary,
+                "url": n.url,
+                "published": n.published.isoformat() if n.published else None,
+                "category": n.category
+            }
+            for n in news
+        ]
+    }
 
 from transformers import AutoModelForCausalLM, AutoTokenizer
 @app.get("/api/qwen_signal/{pair_code}")
-def qwen_signal(pair_code: str, days: int = 10):
+async def qwen_signal(pair_code: str, days: int = 10):
     """
     テクニカル指標の推移と直近ニュースをAIプロンプト用にまとめ、Qwenで推論した「買い/売り」判断と信頼度を返す
     """
     d.print_ts(f"<<< API: qwen_signal >>> pair_code={pair_code}, days={days}", level='error')
-    session = SessionLocal()
-    try:
+    async with AsyncSessionLocal() as session:
         # 指定期間のテクニカル指標を全件取得
         since = datetime.now() - timedelta(days=days)
-        indicators = session.query(TechnicalIndicator)\
-            .filter(TechnicalIndicator.currency_pair == pair_code)\
-            .filter(TechnicalIndicator.timestamp >= since)\
-            .order_by(TechnicalIndicator.timestamp.asc())\
-            .all()
-        if not indicators:
+        indicators = await session.run_sync(load_indicator_frame, pair_code, start=since)
+        if indicators.empty:
             raise HTTPException(status_code=404, detail="テクニカル指標が見つかりません")
 
         d.print(f"取得したテクニカル指標の件数: {len(indicators)}", level='error')
 
         # 直近days日分のニュース記事を取得
-        news = session.query(NewsArticle)\
-            .filter(NewsArticle.published >= since)\
-            .order_by(NewsArticle.published.desc())\
-            .all()
-    finally:
-        session.close()
+        news = await session.run_sync(recent_news, since)
 
     # テクニカル指標の推移をリスト形式で整形
-    technical_history = [
-        {
-            "timestamp": r.timestamp.isoformat(),
-            "close": r.close,
-            "rsi": r.rsi,
-            "macd": r.macd,
-            "macd_signal": r.macd_signal,
-            "sma_20": r.sma_20,
-            "ema_50": r.ema_50,
-            "bb_upper": r.bb_upper,
-            "bb_lower": r.bb_lower,
-            "adx": r.adx,
-        }
-        for r in indicators
-    ]
+    technical_history = indicator_records(indicators)
 
     # プロンプト生成
     # プロンプト生成部分を修正
@@ -492,7 +640,23 @@ def qwen_signal(pair_code: str, days: int = 10):
 
     d.print(f"Qwenプロンプト: \n{prompt}", output_path="/app/data/qwen_signal.log")
 
-    # Qwenモデルで推論
+    # 推論はLLM用のスレッドプールで実行（同時実行数はLLM_THREADSまで）
+    thinking_content, content = await run_in(llm_executor, qwen_generate, prompt)
+
+    return {
+        "pair_code": pair_code,
+        "prompt": prompt,
+        "thinking_content": thinking_content,
+        "content": content
+    }
+
+def qwen_generate(prompt: str):
+    """
+    Qwenモデルで推論する
+
+    Returns:
+        tuple: (思考部分, 回答部分)
+    """
     model_name = "Qwen/Qwen3-8B"
     tokenizer = AutoTokenizer.from_pretrained(model_name)
     model = AutoModelForCausalLM.from_pretrained(
@@ -532,12 +696,7 @@ def qwen_signal(pair_code: str, days: int = 10):
     torch.cuda.empty_cache()
     gc.collect()
 
-    return {
-        "pair_code": pair_code,
-        "prompt": prompt,
-        "thinking_content": thinking_content,
-        "content": content
-    }
+    return thinking_content, content
 
 
 
@@ -559,96 +718,213 @@ class NewsArticleResponse(BaseModel):
     class Config:
         orm_mode = True
 
+def news_article_dict(n: NewsArticle) -> dict:
+    """
+    記事をNewsArticleResponseと同じ形のdictに変換する
+    """
+    return {
+        "id": n.id,
+        "category": n.category,
+        "title": n.title,
+        "summary": n.summary,
+        "url": n.url,
+        "published": n.published,
+        "currency_tags": n.currency_tags or [],
+    }
+
 # 日時検索結果全体を表すモデル（追加）
 class NewsAtTimeResponse(BaseModel):
-    total: int
+    total: Optional[int] = None  # include_total=false の場合はNone
     end_date: str
     start_date: str
     currency_filter: Optional[List[str]] = None
     articles: List[NewsArticleResponse]
+    next_cursor: Optional[str] = None  # 次のページを取得するときにcursorに渡す値（最後のページならNone）
 
     class Config:
         orm_mode = True
 
 # 日時を指定してニュース記事を取得するAPI
 @app.get("/api/news/at", response_model=NewsAtTimeResponse)  # ここをNewsAtTimeResponseに変更
-def get_news_at_time(
+@versioned(news=True)
+async def get_news_at_time(
+    request: Request,
     date_time: str = Query(..., description="基準日時（ISO形式、例: 2025-07-04T15:30:00）"),
     hours_back: int = Query(24, ge=1, le=72, description="遡る時間（時間単位）"),
     category: Optional[str] = Query(None, description="カテゴリでフィルタ"),
     currencies: List[str] = Query(default=[], description="通貨フィルタ（複数選択可、例: USD,EUR,JPY）"),
-    limit: int = Query(100, ge=1, le=500, description="最大取得件数")
+    currency_match: str = Query("exact", pattern="^(exact|any)$", description="exact: 指定した通貨のみを含む記事 / any: 指定した通貨のいずれかを含む記事"),
+    limit: int = Query(100, ge=1, le=500, description="最大取得件数"),
+    cursor: Optional[str] = Query(None, description="前のレスポンスのnext_cursor（次のページを取得）"),
+    include_total: bool = Query(True, description="falseの場合は総件数を数えない（totalはnull）")
 ):
     """
     指定した日時より前の一定時間以内のニュース記事を取得します。
     例：2025-07-04T15:30:00を指定し、hours_back=24とすると、
     2025-07-03T15:30:00から2025-07-04T15:30:00までのニュースが取得されます。
 
-    通貨フィルタ例（完全一致のみ）:
+    通貨フィルタ例（currency_match=exact、デフォルト）:
     - currencies=USD (USDのみの記事)
     - currencies=USD&currencies=JPY (USDとJPYの両方のみを含む記事)
     - currencies=EUR (EURのみの記事)
 
     注意: 指定した通貨以外が含まれている記事は除外されます。
     例: USD,JPYを指定した場合、USD,JPY,EURのような記事は取得されません。
+    currency_match=any の場合は、指定した通貨のいずれかを含む記事をすべて取得します。
+
+    ページング: 記事は新しい順（同時刻はIDの降順）に並び、次のページがあればnext_cursorが返ります。
+    同じ条件でcursor=next_cursorを指定すると続きを取得できます（何ページ目でも1ページ目と同じコストで読めます）。
+    2ページ目以降はinclude_total=falseにすると総件数の集計を省けます。
     """
-    session = SessionLocal()
+    # 文字列をdatetimeに変換
     try:
-        # 文字列をdatetimeに変換
-        try:
-            end_date = datetime.fromisoformat(date_time)
-        except ValueError:
-            raise HTTPException(status_code=400, detail="日時形式が無効です。ISO形式で指定してください（例: 2025-07-04T15:30:00）")
-
-        # 開始日時を計算
-        start_date = end_date - timedelta(hours=hours_back)
-
-        # クエリ構築
-        query = session.query(NewsArticle).filter(
-            NewsArticle.published >= start_date,
-            NewsArticle.published <= end_date
+        end_date = datetime.fromisoformat(date_time)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="日時形式が無効です。ISO形式で指定してください（例: 2025-07-04T15:30:00）")
+
+    try:
+        after = decode_cursor(cursor)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="cursorが無効です。前のレスポンスのnext_cursorを指定してください")
+
+    # 開始日時を計算
+    start_date = end_date - timedelta(hours=hours_back)
+
+    # 通貨フィルタ（currency_maskのインデックスで絞り込む）
+    masks = None
+    if currencies:
+        mask = currency_mask(currencies)  # 未対応の通貨コードは無視
+        if mask:
+            masks = matching_masks(mask, currency_match)
+
+    # 期間がホット期間より古い場合は、該当する月のアーカイブも含めて取得
+    async with AsyncSessionLocal() as session:
+        total_count, news_articles, next_cursor = await session.run_sync(
+            query_news_window, start_date, end_date, category=category, masks=masks, limit=limit,
+            after=after, include_total=include_total
         )
 
-        # カテゴリフィルタ
-        if category:
-            query = query.filter(NewsArticle.category == category)
+    # レスポンス作成（フィルタ情報も含める）
+    # DBの値から作るdictなので、NewsAtTimeResponseでの検証は省いてそのままJSONにする
+    def build():
+        return {
+            "total": total_count,
+            "end_date": end_date.isoformat(),
+            "start_date": start_date.isoformat(),
+            "currency_filter": currencies if currencies else None,
+            "articles": [news_article_dict(n) for n in news_articles],
+            "next_cursor": next_cursor
+        }
 
-        # 通貨フィルタ（完全一致のみ）
-        if currencies:
-            # 有効な通貨コードのみを受け入れ
-            valid_currencies = ["USD", "EUR", "JPY"]
-            filtered_currencies = [c.upper() for c in currencies if c.upper() in valid_currencies]
+    return await offloaded_json_response(data_executor, request, build)
+
+# キーワード検索結果の記事（関連度スコア付き）
+class NewsSearchResult(NewsArticleResponse):
+    score: Optional[float] = None
+
+class NewsSearchResponse(BaseModel):
+    total: Optional[int] = None  # include_total=false の場合はNone
+    query: str
+    limit: int
+    offset: int
+    articles: List[NewsSearchResult]
+
+# キーワードでニュース記事を検索するAPI
+@app.get("/api/news/search", response_model=NewsSearchResponse)
+async def search_news_articles(
+    q: str = Query(..., min_length=1, max_length=200, description="検索語（空白区切りで複数指定した場合はすべてを含む記事）"),
+    start: Optional[str] = Query(None, description="開始日時（ISO形式、例: 2025-07-01T00:00:00）"),
+    end: Optional[str] = Query(None, description="終了日時（ISO形式）"),
+    category: Optional[str] = Query(None, description="カテゴリでフィルタ"),
+    currencies: List[str] = Query(default=[], description="通貨フィルタ（複数選択可、例: USD,EUR,JPY）"),
+    currency_match: str = Query("exact", pattern="^(exact|any)$", description="exact: 指定した通貨のみを含む記事 / any: 指定した通貨のいずれかを含む記事"),
+    limit: int = Query(20, ge=1, le=100, description="最大取得件数"),
+    offset: int = Query(0, ge=0, le=10000, description="スキップする件数"),
+    include_total: bool = Query(True, description="falseの場合は総件数を数えない（totalはnull）")
+):
+    """
+    タイトルと要約を全文検索し、関連度の高い順に返します（タイトルの一致を優先）。
+    日銀・円のような2文字以下の検索語も全文検索のインデックスで検索します。
+    記号を含む短い検索語（例: "U."）の場合は部分一致で検索し、新しい順に返します。
+    アーカイブに移した古い記事（NEWS_HOT_DAYSより前）は検索対象外です。
+    2ページ目以降はinclude_total=falseにすると総件数の集計を省けます。
 
-            if filtered_currencies:
-                # JSON配列内に指定された通貨のみが含まれている記事を検索（完全一致）
-                from sqlalchemy import and_, func, text
+    例: /api/news/search?q=日銀 利上げ&start=2025-07-01T00:00:00&currencies=JPY&currency_match=any
+    """
+    try:
+        start_date = datetime.fromisoformat(start) if start else None
+        end_date = datetime.fromisoformat(end) if end else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="日時形式が無効です。ISO形式で指定してください（例: 2025-07-04T15:30:00）")
 
-                # 1. 配列の長さが指定された通currency数と一致すること
-                array_length_condition = text(f"json_array_length(news_articles.currency_tags) = {len(filtered_currencies)}")
+    async with AsyncSessionLocal() as session:
+        total, results = await session.run_sync(
+            search_news, q, start=start_date, end=end_date, category=category,
+            currencies=currencies, currency_match=currency_match, limit=limit, offset=offset,
+            include_total=include_total,
+        )
+    return {
+        "total": total,
+        "query": q,
+        "limit": limit,
+        "offset": offset,
+        "articles": [
+            {**news_article_dict(n), "score": score}
+            for n, score in results
+        ],
+    }
 
-                # 2. 指定されたすべての通貨が含まれていること
-                currency_conditions = []
-                for currency in filtered_currencies:
-                    currency_conditions.append(
-                        text(f"EXISTS (SELECT 1 FROM json_each(news_articles.currency_tags) WHERE value = '{currency}')")
-                    )
-                # 両方の条件を満たす記事のみを取得
-                query = query.filter(and_(array_length_condition, *currency_conditions))
+# ============ エクスポート（研究・バックテスト用） ============
 
-        # 日時の降順で並べ替え
-        query = query.order_by(desc(NewsArticle.published))
+def parse_export_range(start: str, end: Optional[str]):
+    try:
+        start_date = datetime.fromisoformat(start)
+        end_date = datetime.fromisoformat(end) if end else datetime.now()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="日時形式が無効です。ISO形式で指定してください（例: 2025-07-04T15:30:00）")
+    if end_date <= start_date:
+        raise HTTPException(status_code=400, detail="endはstartより後の日時を指定してください")
+    return start_date, end_date
+
+def export_response(chunks, name: str, format: str, start_date: datetime, end_date: datetime) -> StreamingResponse:
+    filename = f"{name}_{start_date:%Y%m%d}_{end_date:%Y%m%d}.{format}"
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
-        # 結果の取得
-        total_count = query.count()
-        news_articles = query.limit(limit).all()
+@app.get("/api/export/indicators/{pair_code}")
+async def export_indicator_history(
+    pair_code: str,
+    start: str = Query(..., description="開始日時（ISO形式、この日時を含む）"),
+    end: Optional[str] = Query(None, description="終了日時（ISO形式、この日時を含まない。省略時は現在）"),
+    timeframe: str = Query(default="1h", description="時間足（1h, 4h, 1d）"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="ndjson: 1行1レコードのJSON / csv: ヘッダ付きCSV")
+):
+    """
+    テクニカル指標を期間の上限なしで書き出します（時刻順）。
+    サーバー側カーソルで少しずつ読みながら送るため、期間が長くてもすぐに受信が始まります。
 
-        # レスポンス作成（フィルタ情報も含める）
-        return {
-            "total": total_count,
-            "end_date": end_date.isoformat(),
-            "start_date": start_date.isoformat(),
-            "currency_filter": currencies if currencies else None,
-            "articles": news_articles
-        }
-    finally:
-        session.close()
\ No newline at end of file
+    例: /api/export/indicators/USDJPY?start=2024-01-01T00:00:00&format=csv
+    """
+    check_timeframe(timeframe)
+    start_date, end_date = parse_export_range(start, end)
+    chunks = export_indicators(pair_code, start_date, end_date, timeframe=timeframe, fmt=format)
+    return export_response(chunks, f"{pair_code}_{timeframe}", format, start_date, end_date)
+
+@app.get("/api/export/news")
+async def export_news_history(
+    start: str = Query(..., description="開始日時（ISO形式、この日時を含む）"),
+    end: Optional[str] = Query(None, description="終了日時（ISO形式、この日時を含まない。省略時は現在）"),
+    category: Optional[str] = Query(None, description="カテゴリでフィルタ"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="ndjson: 1行1レコードのJSON / csv: ヘッダ付きCSV（currency_tagsは;区切り）")
+):
+    """
+    ニュース記事を期間の上限なしで書き出します（公開日時順、アーカイブ済みの記事も含む）。
+
+    例: /api/export/news?start=2024-01-01T00:00:00&end=2025-01-01T00:00:00
+    """
+    start_date, end_date = parse_export_range(start, end)
+    chunks = export_news(start_date, end_date, category=category, fmt=format)
+    return export_response(chunks, "news", format, start_date, end_date)
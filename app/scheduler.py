@@ -2,6 +2,7 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from app.script.collect import collect_technical_data
 from app.script.news_collect import fetch_and_store_rss, fetch_and_store_all_news
 from app.script.slack import fetch_signal_and_notify
+from app.script.archive import archive_news
 from datetime import datetime
 
 # 定期実行のためのスケジューラを設定
@@ -10,5 +11,7 @@ def start_scheduler():
     scheduler.add_job(collect_technical_data, 'interval', minutes=30, next_run_time=datetime.now())
     # RSS + Finnhub統合版のニュース収集を使用
     scheduler.add_job(fetch_and_store_all_news, 'interval', minutes=60, next_run_time=datetime.now())
+    # ホット期間より古いニュースを月ごとのアーカイブファイルに移動（1日1回）
+    scheduler.add_job(archive_news, 'cron', hour=4, minute=0)
     # scheduler.add_job(fetch_signal_and_notify, 'interval', minutes=60, next_run_time=datetime.now())
     scheduler.start()
@@ -0,0 +1,243 @@
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import MetaData, and_, bindparam, create_engine, func, or_, select, text, union_all, DateTime
+from app.script.db import engine
+from app.script.models import NewsArticle
+from app.script.migrations import add_column
+from app.script.pagination import encode_cursor
+from app.script.debug import debug_printer as d
+
+# ニュースのホット/コールド分割
+#
+# 直近NEWS_HOT_DAYS日分の記事だけをメインのDB（db/forex.sqlite）に残し、それより古い記事は
+# 月ごとのアーカイブファイル（db/archive/news_YYYY_MM.sqlite）に移す。
+# 期間指定の読み込み（query_news_window）は、期間に重なる月のアーカイブがあれば自動でATTACHして結合する。
+# 全文検索（news_fts, news_fts_bigram、/api/news/search）の対象はメインのDBに残っている記事のみで、アーカイブした月は検索されない。
+# 移した記事のurl_hashはメインのDBのarchived_url_hashesに残し、収集時の重複チェック（url_canon.is_known_url）に使う。
+#
+# 削除した記事のページはPRAGMA incremental_vacuumで解放する（auto_vacuum=INCREMENTALはmigrations.pyで設定）。
+
+NEWS_HOT_DAYS = int(os.getenv("NEWS_HOT_DAYS", 90))
+ARCHIVE_DIR = os.getenv("NEWS_ARCHIVE_DIR", "./db/archive")
+MAX_ATTACHED = 9  # SQLiteのATTACH上限（既定10）からmainの分を除いた数
+
+_news = NewsArticle.__table__
+_columns = ", ".join(c.name for c in _news.columns)
+
+
+def archive_path(month: datetime) -> str:
+    return os.path.join(ARCHIVE_DIR, f"news_{month:%Y_%m}.sqlite")
+
+
+def _month_start(ts: datetime) -> datetime:
+    return datetime(ts.year, ts.month, 1)
+
+
+def _next_month(month: datetime) -> datetime:
+    return datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def archive_months(start: datetime, end: datetime) -> List[Tuple[datetime, str]]:
+    """
+    期間に重なる月のうち、アーカイブファイルが存在する月
+
+    Returns:
+        list: (月初, ファイルパス) のリスト
+    """
+    months = []
+    month = _month_start(start)
+    while month <= end:
+        path = archive_path(month)
+        if os.path.exists(path):
+            months.append((month, path))
+        month = _next_month(month)
+    return months
+
+
+def month_windows(start: datetime, end: datetime) -> List[Tuple[datetime, datetime, Optional[str]]]:
+    """
+    期間 [start, end) を月ごとに区切る
+
+    Returns:
+        list: (区間の開始, 区間の終了（含まない）, その月のアーカイブファイルのパス（無ければNone）) のリスト
+    """
+    windows = []
+    month = _month_start(start)
+    while month < end:
+        path = archive_path(month)
+        windows.append((max(start, month), min(end, _next_month(month)), path if os.path.exists(path) else None))
+        month = _next_month(month)
+    return windows
+
+
+def _create_archive(path: str):
+    # アーカイブにもメインと同じテーブルとインデックスを作る
+    # 既存のアーカイブに、後のマイグレーションで追加されたカラムが無ければ追加する
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    archive_engine = create_engine(f"sqlite:///{path}")
+    try:
+        _news.create(archive_engine, checkfirst=True)
+        with archive_engine.begin() as conn:
+            for column in _news.columns:
+                add_column(conn, _news.name, column.name, column.type.compile(dialect=archive_engine.dialect))
+    finally:
+        archive_engine.dispose()
+
+
+def archive_news(hot_days: int = NEWS_HOT_DAYS, now: Optional[datetime] = None, vacuum: bool = True) -> Dict[str, int]:
+    """
+    hot_days日より古い記事を月ごとのアーカイブファイルに移す
+
+    月ごとに、アーカイブへのコピー（INSERT OR IGNORE）→メインからの削除を1トランザクションで行う。
+    途中で失敗しても、再実行すれば同じ記事が重複せずに移される。
+
+    Returns:
+        dict: アーカイブファイル→移した記事数
+    """
+    cutoff = (now or datetime.now()) - timedelta(days=hot_days)
+    d.print_ts(f"<<< scheduled task: archive_news (before {cutoff}) >>>", level='debug')
+
+    with engine.connect() as conn:
+        months = [
+            datetime.strptime(m, "%Y-%m") for (m,) in conn.execute(
+                select(func.strftime("%Y-%m", _news.c.published)).distinct().where(_news.c.published < cutoff)
+            )
+        ]
+
+    moved = {}
+    for month in sorted(months):
+        path = archive_path(month)
+        _create_archive(path)
+        params = {"start": month, "end": min(_next_month(month), cutoff)}
+        window = "published >= :start AND published < :end"
+        binds = [bindparam("start", type_=DateTime), bindparam("end", type_=DateTime)]
+
+        with engine.connect() as conn:
+            conn.exec_driver_sql("ATTACH DATABASE ? AS archive", (path,))
+            try:
+                conn.execute(text(
+                    f"INSERT OR IGNORE INTO archive.news_articles ({_columns}) "
+                    f"SELECT {_columns} FROM main.news_articles WHERE {window}"
+                ).bindparams(*binds), params)
+                conn.execute(text(
+                    "INSERT OR IGNORE INTO main.archived_url_hashes (url_hash) "
+                    f"SELECT url_hash FROM main.news_articles WHERE {window} AND url_hash IS NOT NULL"
+                ).bindparams(*binds), params)
+                count = conn.execute(
+                    text(f"DELETE FROM main.news_articles WHERE {window}").bindparams(*binds), params
+                ).rowcount
+                conn.commit()
+                moved[path] = count
+                d.print(f"Archived {count} articles to {path}", level='debug')
+            except Exception as e:
+                d.print(f"Error archiving to {path}: {str(e)}", level='error')
+                conn.rollback()
+            finally:
+                conn.exec_driver_sql("DETACH DATABASE archive")
+                conn.commit()
+
+    if vacuum and any(moved.values()):
+        # 削除した分の空きページをファイルから解放して、メインのDBを小さく保つ
+        # （VACUUMと違いDB全体を書き直さないため、稼働中のDBでも読み込みを長く止めない）
+        # incremental_vacuumはステップごとに1ページずつ解放するため、最後まで実行するexecutescriptを使う
+        raw = engine.raw_connection()
+        try:
+            raw.driver_connection.executescript("PRAGMA incremental_vacuum;")
+        finally:
+            raw.close()
+    return moved
+
+
+def _before(table, after: Tuple[datetime, int]):
+    # (published, id) が after より前の行（published <= ? でインデックスの範囲を絞り、同時刻はidで比較）
+    published, article_id = after
+    return and_(table.c.published <= published, or_(table.c.published < published, table.c.id < article_id))
+
+
+def _filtered(table, start, end, category=None, masks=None, after=None):
+    query = select(table).where(table.c.published >= start, table.c.published <= end)
+    if category:
+        query = query.where(table.c.category == category)
+    if masks:
+        query = query.where(table.c.currency_mask.in_(masks))
+    if after is not None:
+        query = query.where(_before(table, after))
+    return query
+
+
+def query_news_window(
+    session,
+    start: datetime,
+    end: datetime,
+    category: Optional[str] = None,
+    masks: Optional[List[int]] = None,
+    limit: int = 100,
+    after: Optional[Tuple[datetime, int]] = None,
+    include_total: bool = True,
+) -> Tuple[Optional[int], List[NewsArticle], Optional[str]]:
+    """
+    期間内のニュースを新しい順（published, idの降順）に取得する（期間がアーカイブに及ぶ場合はアーカイブも含める）
+
+    Args:
+        masks: currency_maskの候補（matching_masksの結果）。Noneなら通貨で絞り込まない
+        after: 前のページの最後の記事の (published, id)（decode_cursorの結果）。これより古い記事から読む
+        include_total: Falseなら総件数を数えない（期間内の全件を数える分の読み込みを省く）
+
+    Returns:
+        tuple: (期間内の総件数（include_total=FalseならNone）, 記事のリスト, 次のページのカーソル（最後のページならNone）)。
+               アーカイブから読んだ記事はセッションに属さないオブジェクト
+    """
+    months = archive_months(start, end)
+    if not months:
+        # 期間がホットな範囲に収まっていれば、メインのDBだけを通常のクエリで読む
+        query = session.query(NewsArticle).filter(NewsArticle.published >= start, NewsArticle.published <= end)
+        if category:
+            query = query.filter(NewsArticle.category == category)
+        if masks:
+            query = query.filter(NewsArticle.currency_mask.in_(masks))
+        total = query.count() if include_total else None
+        if after is not None:
+            query = query.filter(_before(_news, after))
+        # 1件多く読んで次のページがあるかを判定する
+        articles = query.order_by(NewsArticle.published.desc(), NewsArticle.id.desc()).limit(limit + 1).all()
+        return total, articles[:limit], _next_cursor(articles, limit)
+
+    if len(months) > MAX_ATTACHED:
+        raise ValueError(f"Time range spans more than {MAX_ATTACHED} archive files")
+
+    aliases = [f"archive_{month:%Y_%m}" for month, _ in months]
+    tables = [_news] + [_news.to_metadata(MetaData(), schema=alias) for alias in aliases]
+    combined = union_all(*[_filtered(t, start, end, category, masks) for t in tables]).subquery()
+    page = union_all(*[_filtered(t, start, end, category, masks, after) for t in tables]).subquery()
+
+    with session.get_bind().connect() as conn:
+        for alias, (_, path) in zip(aliases, months):
+            conn.exec_driver_sql(f"ATTACH DATABASE ? AS {alias}", (path,))
+        try:
+            total = conn.execute(select(func.count()).select_from(combined)).scalar() if include_total else None
+            rows = conn.execute(
+                select(page).order_by(page.c.published.desc(), page.c.id.desc()).limit(limit + 1)
+            ).all()
+        finally:
+            conn.rollback()
+            for alias in aliases:
+                conn.exec_driver_sql(f"DETACH DATABASE {alias}")
+            conn.commit()
+
+    articles = [NewsArticle(**row._mapping) for row in rows]
+    return total, articles[:limit], _next_cursor(articles, limit)
+
+
+def _next_cursor(articles: List[NewsArticle], limit: int) -> Optional[str]:
+    if len(articles) <= limit:
+        return None
+    last = articles[limit - 1]
+    return encode_cursor(last.published, last.id)
+
+
+if __name__ == "__main__":
+    # 手動実行: python -m app.script.archive [ホット期間の日数]
+    import sys
+    archive_news(hot_days=int(sys.argv[1]) if len(sys.argv) > 1 else NEWS_HOT_DAYS)
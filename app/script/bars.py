@@ -0,0 +1,270 @@
+import yfinance as yf
+import pandas as pd
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.script.models import Candle
+from app.script.data_version import mark_changed
+from app.script.debug import debug_printer as d
+
+BAR_INTERVAL = timedelta(hours=1)
+INITIAL_DAYS = 30  # 指標エンジンの初期化時に読み込む期間、および欠損を探す直近の期間
+SEED_DAYS = 400  # 初回（ストアが空のとき）に取得する期間。日足のEMA50のウォームアップにも足りる長さ
+MAX_HISTORY_DAYS = 729  # yfinanceの1時間足は過去730日まで
+DOWNLOAD_OVERLAP = timedelta(hours=3)  # 最新足は未確定のため、少し前から取り直す
+BATCH_START_TOLERANCE = timedelta(days=1)  # 開始時刻の差がこれ以内のペアは1回のダウンロードにまとめる
+
+BAR_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+# 今回のプロセスで既にバックフィルを試みた欠損 (pair, 欠損開始時刻)
+# 祝日などyfinance側にも足が無い欠損を毎回取り直さないようにする
+_attempted_gaps = set()
+
+
+def normalize_bars(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    yfinanceのDataFrameを Open/High/Low/Close/Volume 列・タイムゾーン無しの時刻インデックスに揃える
+    """
+    if df is None or df.empty:
+        return pd.DataFrame(columns=BAR_COLUMNS)
+
+    # マルチインデックスの列を単一の列に変換
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = [col[0] for col in df.columns]  # 最初のレベルのみを使用
+
+    # 既存データと同じく、yfinanceの時刻からタイムゾーン情報だけを外して保存する
+    if getattr(df.index, "tz", None) is not None:
+        df.index = df.index.tz_localize(None)
+    df.index.name = "timestamp"
+
+    df = df[[c for c in BAR_COLUMNS if c in df.columns]]
+    return df[df["Close"].notna()]
+
+
+def download_bars(pair_code: str, start: datetime, end: Optional[datetime] = None) -> pd.DataFrame:
+    """
+    yfinanceから指定期間の1時間足を取得する
+    """
+    end = end or datetime.today()
+    df = yf.download(pair_code + "=X", start=start, end=end, interval="1h")
+    return normalize_bars(df)
+
+
+def download_bars_batch(pair_codes: List[str], start: datetime, end: Optional[datetime] = None) -> Dict[str, pd.DataFrame]:
+    """
+    複数の通貨ペアの1時間足をyfinanceの1回の呼び出しでまとめて取得する
+
+    Returns:
+        dict: 通貨ペア→DataFrame（取得できなかったペアは含まない）
+    """
+    end = end or datetime.today()
+    tickers = {pair_code + "=X": pair_code for pair_code in pair_codes}
+    df = yf.download(list(tickers), start=start, end=end, interval="1h", group_by="ticker", threads=True)
+
+    frames = {}
+    for ticker, pair_code in tickers.items():
+        if isinstance(df.columns, pd.MultiIndex) and ticker in df.columns.get_level_values(0):
+            frames[pair_code] = normalize_bars(df[ticker].copy())
+        elif not isinstance(df.columns, pd.MultiIndex) and len(tickers) == 1:
+            frames[pair_code] = normalize_bars(df.copy())
+        else:
+            d.print(f"⚠️ No data returned for {pair_code}", level='warning')
+    return frames
+
+
+def last_bar_timestamp(session, pair_code: str) -> Optional[datetime]:
+    """
+    ストアに保存されている最新の足の時刻を返す（無ければNone）
+    """
+    return session.query(func.max(Candle.timestamp)).filter(Candle.currency_pair == pair_code).scalar()
+
+
+def load_bars(session, pair_code: str, start: Optional[datetime] = None, end: Optional[datetime] = None) -> pd.DataFrame:
+    """
+    ストアから足を読み込む
+
+    Returns:
+        pd.DataFrame: Open/High/Low/Close/Volume 列、timestampインデックス（昇順）
+    """
+    query = session.query(
+        Candle.timestamp, Candle.open, Candle.high, Candle.low, Candle.close, Candle.volume
+    ).filter(Candle.currency_pair == pair_code)
+    if start is not None:
+        query = query.filter(Candle.timestamp >= start)
+    if end is not None:
+        query = query.filter(Candle.timestamp <= end)
+    rows = query.order_by(Candle.timestamp).all()
+
+    df = pd.DataFrame.from_records(rows, columns=["timestamp"] + BAR_COLUMNS)
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    return df.set_index("timestamp")
+
+
+def store_bars(session, pair_code: str, df: pd.DataFrame) -> int:
+    """
+    足をストアに保存する。同じ時刻の足が既にあれば値を上書きする（未確定足の更新）
+
+    Returns:
+        int: 書き込んだ行数
+    """
+    if df.empty:
+        return 0
+
+    rows = [
+        {
+            "currency_pair": pair_code,
+            "timestamp": ts.to_pydatetime(),
+            "open": None if pd.isna(o) else float(o),
+            "high": None if pd.isna(h) else float(h),
+            "low": None if pd.isna(l) else float(l),
+            "close": float(c),
+            "volume": None if pd.isna(v) else float(v),
+        }
+        for ts, o, h, l, c, v in zip(
+            df.index, df["Open"], df["High"], df["Low"], df["Close"],
+            df["Volume"] if "Volume" in df else [None] * len(df)
+        )
+    ]
+
+    stmt = sqlite_insert(Candle)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["currency_pair", "timestamp"],
+        set_={c: stmt.excluded[c] for c in ["open", "high", "low", "close", "volume"]},
+    )
+    session.execute(stmt, rows)
+    # 足から作る上位足・指標の応答（ETag）も変わるため、通貨ペアのバージョンを上げる
+    mark_changed(session, pair_code)
+    return len(rows)
+
+
+def _is_market_hour(ts: datetime) -> bool:
+    """
+    為替市場が開いている時間帯か（週末のクローズを大まかに判定）
+    """
+    weekday = ts.weekday()
+    if weekday == 5:
+        return False
+    if weekday == 4 and ts.hour >= 21:
+        return False
+    if weekday == 6 and ts.hour < 23:
+        return False
+    return True
+
+
+def find_gaps(timestamps: List[datetime], interval: timedelta = BAR_INTERVAL) -> List[Tuple[datetime, datetime]]:
+    """
+    連続する足の間で、市場が開いているはずなのに足が無い区間を検出する
+
+    Returns:
+        list: (欠損直前の足の時刻, 欠損直後の足の時刻) のリスト
+    """
+    gaps = []
+    for prev, curr in zip(timestamps, timestamps[1:]):
+        if curr - prev <= interval:
+            continue
+        t = prev + interval
+        while t < curr:
+            if _is_market_hour(t):
+                gaps.append((prev, curr))
+                break
+            t += interval
+    return gaps
+
+
+def plan_download_start(session, pair_code: str, end: datetime) -> datetime:
+    """
+    差分ダウンロードの開始時刻を決める
+
+    ストアが空なら過去SEED_DAYS日分、そうでなければ最新足の少し前から。
+    直近の期間に未試行の欠損があれば、その欠損の開始時刻まで遡る。
+    """
+    last = last_bar_timestamp(session, pair_code)
+    if last is None:
+        return end - timedelta(days=SEED_DAYS)
+
+    start = last - DOWNLOAD_OVERLAP
+
+    window_start = end - timedelta(days=INITIAL_DAYS)
+    timestamps = [
+        ts for (ts,) in session.query(Candle.timestamp)
+        .filter(Candle.currency_pair == pair_code, Candle.timestamp >= window_start)
+        .order_by(Candle.timestamp)
+    ]
+    for gap_start, gap_end in find_gaps(timestamps):
+        if (pair_code, gap_start) in _attempted_gaps:
+            continue
+        _attempted_gaps.add((pair_code, gap_start))
+        d.print(f"Backfilling gap for {pair_code}: {gap_start} - {gap_end}", level='debug')
+        start = min(start, gap_start)
+
+    return max(start, end - timedelta(days=MAX_HISTORY_DAYS))
+
+
+def sync_bars(session, pair_code: str, end: Optional[datetime] = None) -> pd.DataFrame:
+    """
+    ストアの最新足以降（と検出した欠損）だけをyfinanceから取得して保存する
+
+    Returns:
+        pd.DataFrame: 今回ダウンロードした足
+    """
+    end = end or datetime.today()
+    start = plan_download_start(session, pair_code, end)
+
+    df = download_bars(pair_code, start, end)
+    d.print(f"Fetched bars for {pair_code}: {df.shape[0]} rows since {start}", level='debug')
+
+    store_bars(session, pair_code, df)
+    session.commit()
+    return df
+
+
+def group_by_start(starts: Dict[str, datetime], tolerance: timedelta = BATCH_START_TOLERANCE) -> List[Tuple[datetime, List[str]]]:
+    """
+    開始時刻が近いペアをまとめる（グループ内で最も古い開始時刻からtolerance以内のペアを同じグループにする）
+
+    Returns:
+        list: (グループの開始時刻, 通貨ペアのリスト) のリスト
+    """
+    groups = []
+    for pair_code, start in sorted(starts.items(), key=lambda item: item[1]):
+        if groups and start - groups[-1][0] <= tolerance:
+            groups[-1][1].append(pair_code)
+        else:
+            groups.append((start, [pair_code]))
+    return groups
+
+
+def sync_bars_batch(session, pair_codes: List[str], end: Optional[datetime] = None) -> Dict[str, pd.DataFrame]:
+    """
+    sync_barsの複数ペア版。開始時刻が近いペアの差分を1回のダウンロードでまとめて取得して保存する
+
+    開始時刻でペアをグループに分け（group_by_start）、グループごとに最も古い開始時刻から取得する。
+    欠損の埋め直しや新しく追加したペアのために、他のペアまで長い期間を取り直すことはない。
+    各ペアには自分の開始時刻以降の足だけを保存し、取得・保存に失敗したペアは結果に含めず、他のペアの処理は続ける。
+
+    Returns:
+        dict: 通貨ペア→今回ダウンロードした足
+    """
+    end = end or datetime.today()
+    starts = {pair_code: plan_download_start(session, pair_code, end) for pair_code in pair_codes}
+
+    frames = {}
+    for start, group in group_by_start(starts):
+        try:
+            frames.update(download_bars_batch(group, start, end))
+        except Exception as e:
+            d.print(f"Error downloading bars for {', '.join(group)}: {str(e)}", level='error')
+
+    synced = {}
+    for pair_code, df in frames.items():
+        try:
+            df = df[df.index >= starts[pair_code]]
+            store_bars(session, pair_code, df)
+            session.commit()
+            d.print(f"Fetched bars for {pair_code}: {df.shape[0]} rows since {starts[pair_code]}", level='debug')
+            synced[pair_code] = df
+        except Exception as e:
+            d.print(f"Error storing bars for {pair_code}: {str(e)}", level='error')
+            session.rollback()
+    return synced
@@ -0,0 +1,128 @@
+import io
+import json
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from app.script.charts import render_chart, render_indicator_chart, shutdown_pool
+from app.script.debug import debug_printer as d
+
+# /compare の同時読み込みを想定したチャート描画のベンチマーク
+#
+# 以前の描画（pyplotのグローバル状態、スレッドプール内で描画）と、現在の描画（Figure/Agg、プロセスプール）で
+# 描画のスループット、メインプロセスのRSSの推移、描画中のAPIスレッドの応答時間を比較する。
+#
+# 実行: python -m app.script.chart_benchmark
+
+INDICATORS = ["close", "rsi", "macd", "macd_signal", "sma_20", "ema_50", "bb_upper", "bb_lower", "adx"]
+_pyplot_lock = threading.Lock()
+
+
+def _sample_frame(days: int = 30, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    n = days * 24
+    close = 150.0 + np.cumsum(rng.normal(0, 0.1, n))
+    df = pd.DataFrame({"close": close}, index=pd.date_range("2025-01-01", periods=n, freq="h"))
+    df["sma_20"] = df["close"].rolling(20).mean()
+    df["ema_50"] = df["close"].ewm(span=50).mean()
+    std = df["close"].rolling(20).std()
+    df["bb_upper"], df["bb_lower"] = df["sma_20"] + 2 * std, df["sma_20"] - 2 * std
+    df["rsi"] = 50 + 20 * np.sin(np.arange(n) / 10)
+    df["macd"] = df["close"].ewm(span=12).mean() - df["close"].ewm(span=26).mean()
+    df["macd_signal"] = df["macd"].ewm(span=9).mean()
+    df["adx"] = 25.0
+    return df
+
+
+def _render_pyplot(df, pair_code, days, timeframe, width, height, indicators):
+    # 以前の実装（plt.figure と plt.subplots の2枚を作り、閉じない）
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    # pyplotはスレッドセーフではないため、以前の実装をスレッドから呼ぶ場合はロックが必要
+    with _pyplot_lock:
+        plt.figure(figsize=(12, 8))
+        fig, axes = plt.subplots(nrows=3, ncols=1, figsize=(width / 100, height / 100),
+                                 sharex=True, gridspec_kw={'height_ratios': [3, 1, 1]})
+        for ind in ["close", "sma_20", "ema_50", "bb_upper", "bb_lower"]:
+            axes[0].plot(df.index, df[ind], label=ind)
+        axes[0].set_title(f"{pair_code} ({days}, {timeframe})")
+        axes[0].legend()
+        axes[1].plot(df.index, df["rsi"], label="RSI")
+        axes[2].plot(df.index, df["macd"], label="MACD")
+        axes[2].plot(df.index, df["macd_signal"], linestyle="--")
+        axes[2].bar(df.index, df["macd"] - df["macd_signal"], alpha=0.3)
+        plt.tight_layout()
+        buf = io.BytesIO()
+        plt.savefig(buf, format="png", dpi=100)
+        return buf.getvalue()
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _probe(stop, latencies):
+    # APIのリクエスト処理に相当する軽い処理（JSONのシリアライズ）の所要時間を計測し続ける
+    payload = [{"timestamp": i, "close": i * 0.5, "rsi": 50.0} for i in range(500)]
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        json.dumps(payload)
+        latencies.append(time.perf_counter() - t0)
+        time.sleep(0.005)
+
+
+def run_chart_benchmark(render, concurrency: int = 4, rounds: int = 4, charts_per_round: int = 8) -> dict:
+    """
+    concurrency本のスレッドからcharts_per_round枚ずつ描画するラウンドをrounds回繰り返す
+
+    Returns:
+        dict: 描画/秒、ラウンドごとのRSS(MB)、描画中のプローブ処理の中央値・p99(ミリ秒)
+    """
+    df = _sample_frame()
+    args = ("USDJPY", 30, "1h", 600, 500, INDICATORS)
+    render(df, *args)  # ウォームアップ（プロセスの起動やフォントの読み込み）
+
+    stop = threading.Event()
+    latencies = []
+    probe = threading.Thread(target=_probe, args=(stop, latencies))
+    probe.start()
+
+    rss = []
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(rounds):
+            list(executor.map(lambda _: render(df, *args), range(charts_per_round)))
+            rss.append(round(_rss_mb(), 1))
+    elapsed = time.perf_counter() - t0
+
+    stop.set()
+    probe.join()
+    latencies.sort()
+    return {
+        "charts_per_sec": round(rounds * charts_per_round / elapsed, 2),
+        "rss_mb": rss,
+        "probe_p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "probe_p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 3),
+    }
+
+
+if __name__ == "__main__":
+    d.print(f"pyplot (thread): {run_chart_benchmark(_render_pyplot)}", level="debug")
+    d.print(f"Figure/Agg (thread): {run_chart_benchmark(render_indicator_chart)}", level="debug")
+    d.print(f"Figure/Agg (process pool, {os.getenv('CHART_WORKERS', 2)} workers): "
+            f"{run_chart_benchmark(render_chart)}", level="debug")
+    shutdown_pool()
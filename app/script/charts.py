@@ -0,0 +1,240 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.image import imsave
+from app.script.debug import debug_printer as d
+
+# /visualization のチャート描画と、描画済みPNGのキャッシュ
+
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", 2))  # 描画プロセス数（0なら別プロセスを使わない）
+CHART_TIMEOUT = float(os.getenv("CHART_TIMEOUT", 30))  # 1枚の描画を待つ秒数
+CHART_CACHE_ENTRIES = int(os.getenv("CHART_CACHE_ENTRIES", 256))
+CHART_CACHE_BYTES = int(os.getenv("CHART_CACHE_BYTES", 64 * 1024 * 1024))
+
+
+def _draw_indicator_chart(
+    df: pd.DataFrame,
+    pair_code: str,
+    days: int,
+    timeframe: str,
+    width: int,
+    height: int,
+    indicators: List[str],
+) -> Figure:
+    """
+    価格・移動平均・ボリンジャーバンド、RSI、MACDの3段のチャートを描いたFigureを作る
+
+    pyplotのグローバルな状態は使わず、FigureとAggキャンバスを呼び出しごとに作る（呼び出し元でfig.clear()する）。
+    """
+    # figureサイズを動的に設定（ピクセルからインチへ変換）
+    fig = Figure(figsize=(width / 100, height / 100), dpi=100)
+    FigureCanvasAgg(fig)
+    try:
+        # サブプロットの設定
+        axes = fig.subplots(nrows=3, ncols=1, sharex=True, gridspec_kw={'height_ratios': [3, 1, 1]})
+
+        # メインチャート（価格とMA）
+        price_indicators = [i for i in ["close", "sma_20", "ema_50", "bb_upper", "bb_lower"] if i in indicators]
+        for ind in price_indicators:
+            if ind == "close":
+                axes[0].plot(df.index, df[ind], label=f"価格", linewidth=1.5)
+            else:
+                axes[0].plot(df.index, df[ind], label=f"{ind}", linewidth=1)
+
+        axes[0].set_title(f"{pair_code} テクニカル分析 ({days}日間, {timeframe})")
+        axes[0].set_ylabel("価格")
+        axes[0].legend()
+        axes[0].grid(True)
+
+        # RSI
+        if "rsi" in indicators:
+            axes[1].plot(df.index, df["rsi"], label="RSI", color="purple")
+            axes[1].axhline(y=70, color='r', linestyle='-', alpha=0.3)
+            axes[1].axhline(y=30, color='g', linestyle='-', alpha=0.3)
+            axes[1].set_ylabel("RSI")
+            axes[1].set_ylim([0, 100])
+            axes[1].legend()
+            axes[1].grid(True)
+
+        # MACD
+        if "macd" in indicators and "macd_signal" in indicators:
+            hist = df["macd"] - df["macd_signal"]
+            axes[2].plot(df.index, df["macd"], label="MACD")
+            axes[2].plot(df.index, df["macd_signal"], label="シグナル", linestyle="--")
+            axes[2].bar(df.index, hist, color=["green" if val >= 0 else "red" for val in hist], alpha=0.3)
+            axes[2].set_ylabel("MACD")
+            axes[2].legend()
+            axes[2].grid(True)
+
+        fig.tight_layout()
+        return fig
+    except Exception:
+        fig.clear()
+        raise
+
+
+def render_indicator_chart(df: pd.DataFrame, *args) -> bytes:
+    """
+    チャートをPNGで描画する（引数は_draw_indicator_chartと同じ）
+    """
+    fig = _draw_indicator_chart(df, *args)
+    try:
+        # 画像をバイト列に変換
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png", dpi=100)
+        return buf.getvalue()
+    finally:
+        fig.clear()
+
+
+def render_indicator_panel(df: pd.DataFrame, *args) -> np.ndarray:
+    """
+    チャートをRGBAの配列で描画する（合成用。PNGのエンコード・デコードを省く）
+
+    Returns:
+        np.ndarray: (高さ, 幅, 4) のuint8配列
+    """
+    fig = _draw_indicator_chart(df, *args)
+    try:
+        fig.canvas.draw()
+        return np.asarray(fig.canvas.buffer_rgba()).copy()
+    finally:
+        fig.clear()
+
+
+def compose_panels(panels: List[np.ndarray], columns: int = 2) -> bytes:
+    """
+    同じサイズのパネルを格子状に並べて1枚のPNGにする（空いたマスは白）
+    """
+    rows = -(-len(panels) // columns)
+    height, width, depth = panels[0].shape
+    canvas = np.full((rows * height, columns * width, depth), 255, dtype=np.uint8)
+    for i, panel in enumerate(panels):
+        r, c = divmod(i, columns)
+        canvas[r * height:(r + 1) * height, c * width:(c + 1) * width] = panel
+    buf = io.BytesIO()
+    imsave(buf, canvas, format="png")
+    return buf.getvalue()
+
+
+# 描画用のプロセスプール（描画中のGILでAPIのスレッドを止めないよう、別プロセスで描画する）
+_pool = None
+_pool_lock = threading.Lock()
+# 同時に投入する描画の上限（これを超えるリクエストは空きを待つ）
+_slots = threading.BoundedSemaphore(max(1, CHART_WORKERS) * 2)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # forkだとスケジューラやDB接続のスレッドを抱えたまま複製されるため、spawnで起動する
+            _pool = ProcessPoolExecutor(max_workers=CHART_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _run_in_pool(func, df: pd.DataFrame, *args):
+    """
+    描画関数をプロセスプールで実行する（CHART_WORKERS=0なら呼び出し元のスレッドで描画）
+
+    ワーカーが異常終了してプールが壊れた場合は、プールを作り直して今回は呼び出し元で描画する。
+    """
+    if CHART_WORKERS <= 0:
+        return func(df, *args)
+
+    with _slots:
+        try:
+            return _get_pool().submit(func, df, *args).result(timeout=CHART_TIMEOUT)
+        except BrokenProcessPool:
+            d.print("Chart worker pool is broken, restarting", level='error')
+            shutdown_pool()
+            return func(df, *args)
+
+
+def render_chart(df: pd.DataFrame, *args) -> bytes:
+    """
+    render_indicator_chartをプロセスプールで実行する
+    """
+    return _run_in_pool(render_indicator_chart, df, *args)
+
+
+def render_panel(df: pd.DataFrame, *args) -> np.ndarray:
+    """
+    render_indicator_panelをプロセスプールで実行する（/compare の合成画像用）
+    """
+    return _run_in_pool(render_indicator_panel, df, *args)
+
+
+class ChartCache:
+    """
+    描画済みPNGのLRUキャッシュ（件数と合計バイト数の上限付き、スレッドセーフ）
+
+    キーにデータバージョンを含めるため、データが更新されると古い画像は参照されなくなり、いずれ追い出される。
+    """
+
+    def __init__(self, max_entries: int = CHART_CACHE_ENTRIES, max_bytes: int = CHART_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[bytes]:
+        with self._lock:
+            png = self._items.get(key)
+            if png is not None:
+                self._items.move_to_end(key)
+            return png
+
+    def put(self, key, png: bytes):
+        if len(png) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._items[key] = png
+            self._bytes += len(png)
+            while len(self._items) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def __len__(self):
+        return len(self._items)
+
+
+chart_cache = ChartCache()
+
+
+def chart_etag(key) -> str:
+    return '"' + hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:20] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    If-None-Matchヘッダが指定のETagに一致するか（カンマ区切りの複数指定と * に対応）
+    """
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
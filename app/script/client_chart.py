@@ -0,0 +1,187 @@
+# /chart, /compare のブラウザ描画モード
+#
+# /api/indicators/{pair_code}/columns（複数ペアは /api/compare/indicators）の列形式のJSONを取得し、canvasに価格（移動平均・ボリンジャーバンド）、
+# RSI、MACDの3段を描く（/visualizationのPNGと同じ構成）。点数はcanvasの横幅ピクセル数に合わせてサーバー側で間引く。
+
+CLIENT_CHART_SCRIPT = """
+const CHART_COLORS = {
+    close: "#1f77b4", sma_20: "#ff7f0e", ema_50: "#2ca02c", bb_upper: "#9467bd", bb_lower: "#8c564b",
+    rsi: "purple", macd: "#1f77b4", macd_signal: "#ff7f0e",
+};
+
+function paneRange(data, names, fixed) {
+    if (fixed) return fixed;
+    let lo = Infinity, hi = -Infinity;
+    for (const name of names) {
+        for (const v of data.columns[name] || []) {
+            if (v === null) continue;
+            if (v < lo) lo = v;
+            if (v > hi) hi = v;
+        }
+    }
+    if (lo === Infinity) return [0, 1];
+    const pad = (hi - lo) * 0.05 || 1;
+    return [lo - pad, hi + pad];
+}
+
+function drawPane(ctx, data, pane, box) {
+    const ts = data.timestamps;
+    const t0 = ts[0], t1 = ts[ts.length - 1];
+    const [lo, hi] = paneRange(data, pane.lines.concat(pane.bars ? [pane.bars] : []), pane.range);
+    const x = t => box.x + (t1 > t0 ? (t - t0) / (t1 - t0) : 0.5) * box.w;
+    const y = v => box.y + (1 - (v - lo) / (hi - lo)) * box.h;
+
+    ctx.strokeStyle = "#ddd";
+    ctx.lineWidth = 1;
+    ctx.strokeRect(box.x, box.y, box.w, box.h);
+    ctx.fillStyle = "#555";
+    ctx.font = "11px Arial";
+    ctx.textAlign = "right";
+    for (let i = 0; i <= 4; i++) {
+        const v = lo + (hi - lo) * i / 4;
+        ctx.fillText(v.toFixed(Math.abs(hi - lo) < 10 ? 3 : 1), box.x - 4, y(v) + 4);
+    }
+    for (const level of pane.levels || []) {
+        ctx.strokeStyle = level.color;
+        ctx.beginPath();
+        ctx.moveTo(box.x, y(level.value));
+        ctx.lineTo(box.x + box.w, y(level.value));
+        ctx.stroke();
+    }
+
+    if (pane.bars) {
+        const values = data.columns[pane.bars];
+        const bw = Math.max(1, box.w / ts.length);
+        for (let i = 0; i < ts.length; i++) {
+            if (values[i] === null) continue;
+            ctx.fillStyle = values[i] >= 0 ? "rgba(0,128,0,0.3)" : "rgba(255,0,0,0.3)";
+            const top = y(Math.max(values[i], 0)), bottom = y(Math.min(values[i], 0));
+            ctx.fillRect(x(ts[i]) - bw / 2, top, bw, Math.max(1, bottom - top));
+        }
+    }
+
+    let legendX = box.x + 8;
+    for (const name of pane.lines) {
+        const values = data.columns[name];
+        if (!values) continue;
+        ctx.strokeStyle = CHART_COLORS[name] || "#333";
+        ctx.lineWidth = name === "close" ? 1.5 : 1;
+        ctx.beginPath();
+        let drawing = false;
+        for (let i = 0; i < ts.length; i++) {
+            if (values[i] === null) { drawing = false; continue; }
+            if (drawing) ctx.lineTo(x(ts[i]), y(values[i]));
+            else ctx.moveTo(x(ts[i]), y(values[i]));
+            drawing = true;
+        }
+        ctx.stroke();
+        ctx.fillStyle = CHART_COLORS[name] || "#333";
+        ctx.textAlign = "left";
+        ctx.fillText(name, legendX, box.y + 14);
+        legendX += ctx.measureText(name).width + 12;
+    }
+}
+
+function drawChart(canvas, data) {
+    const ctx = canvas.getContext("2d");
+    ctx.clearRect(0, 0, canvas.width, canvas.height);
+    if (!data.timestamps.length) return;
+
+    const left = 60, right = 10, top = 10, bottom = 24, gap = 10;
+    const w = canvas.width - left - right;
+    const h = canvas.height - top - bottom - gap * 2;
+    const panes = [
+        {lines: ["close", "sma_20", "ema_50", "bb_upper", "bb_lower"], ratio: 3},
+        {lines: ["rsi"], ratio: 1, range: [0, 100],
+         levels: [{value: 70, color: "rgba(255,0,0,0.3)"}, {value: 30, color: "rgba(0,128,0,0.3)"}]},
+        {lines: ["macd", "macd_signal"], bars: "macd_hist", ratio: 1},
+    ];
+    const macd = data.columns.macd, signal = data.columns.macd_signal;
+    if (macd && signal) {
+        data.columns.macd_hist = macd.map((v, i) => v === null || signal[i] === null ? null : v - signal[i]);
+    }
+
+    let y = top;
+    for (const pane of panes) {
+        const ph = h * pane.ratio / 5;
+        drawPane(ctx, data, pane, {x: left, y: y, w: w, h: ph});
+        y += ph + gap;
+    }
+
+    // 時刻の目盛り（保存されている時刻をそのまま表示）
+    const ts = data.timestamps;
+    ctx.fillStyle = "#555";
+    ctx.textAlign = "center";
+    for (let i = 0; i <= 4; i++) {
+        const t = ts[0] + (ts[ts.length - 1] - ts[0]) * i / 4;
+        const label = new Date(t).toISOString().slice(5, 16).replace("T", " ");
+        ctx.fillText(label, left + w * i / 4, canvas.height - 6);
+    }
+}
+
+function fitCanvas(canvas) {
+    // 表示サイズに合わせて描画解像度を決める（縦横比はwidth/height属性のまま）
+    const aspect = canvas.height / canvas.width;
+    canvas.width = Math.round(canvas.clientWidth || canvas.width);
+    canvas.height = Math.round(canvas.width * aspect);
+}
+
+function showError(canvas, status) {
+    const ctx = canvas.getContext("2d");
+    ctx.clearRect(0, 0, canvas.width, canvas.height);
+    ctx.fillText(`データが見つかりません (${status})`, 20, 20);
+}
+
+async function loadChart(canvas) {
+    fitCanvas(canvas);
+    const params = new URLSearchParams({
+        days: canvas.dataset.days,
+        timeframe: canvas.dataset.timeframe,
+        max_points: canvas.width,
+    });
+    const response = await fetch(`/api/indicators/${canvas.dataset.pair}/columns?` + params);
+    if (!response.ok) return showError(canvas, response.status);
+    drawChart(canvas, await response.json());
+}
+
+async function loadCharts(canvases) {
+    // 複数ペアは /api/compare/indicators で1回にまとめて取得する
+    canvases.forEach(fitCanvas);
+    const params = new URLSearchParams({
+        days: canvases[0].dataset.days,
+        timeframe: canvases[0].dataset.timeframe,
+        max_points: Math.max(...canvases.map(canvas => canvas.width)),
+    });
+    canvases.forEach(canvas => params.append("pairs", canvas.dataset.pair));
+    const response = await fetch("/api/compare/indicators?" + params);
+    if (!response.ok) return canvases.forEach(canvas => showError(canvas, response.status));
+    const data = await response.json();
+    for (const canvas of canvases) {
+        const pair = data.pairs[canvas.dataset.pair];
+        if (pair) drawChart(canvas, pair);
+        else showError(canvas, 404);
+    }
+}
+
+function loadAllCharts(days) {
+    const canvases = Array.from(document.querySelectorAll("canvas.chart"));
+    if (days) canvases.forEach(canvas => canvas.dataset.days = days);
+    if (canvases.length > 1) loadCharts(canvases);
+    else canvases.forEach(loadChart);
+}
+
+window.addEventListener("load", () => loadAllCharts());
+"""
+
+
+def client_chart_canvas(pair_code: str, days: int, timeframe: str, width: int, height: int) -> str:
+    """
+    ブラウザ描画用のcanvas要素（data属性に取得条件を持たせる）
+    """
+    attrs = {"pair": pair_code, "days": str(days), "timeframe": timeframe}
+    data = " ".join(f'data-{k}="{v}"' for k, v in attrs.items())
+    return f'<canvas class="chart" width="{width}" height="{height}" {data}></canvas>'
+
+
+def client_chart_script() -> str:
+    return f"<script>{CLIENT_CHART_SCRIPT}</script>"
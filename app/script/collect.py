@@ -1,12 +1,76 @@
-import yfinance as yf
-import pandas_ta as ta
 import pandas as pd
 from app.script.db import SessionLocal
-from app.script.models import TechnicalIndicator
+from app.script.models import TechnicalIndicator, ResampledIndicator
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.script.indicators import get_engine, reset_engine, INDICATOR_COLUMNS
+from app.script.indicator_kernels import compute_indicator_frames
+from app.script.latest import update_latest
+from app.script.data_version import mark_changed
+from app.script.timeframes import (
+    BASE_TIMEFRAME, TIMEFRAMES, SUPPORTED_TIMEFRAMES, engine_key, resample_bars, compute_timeframe_indicators,
+)
+from app.script.bars import (
+    sync_bars, sync_bars_batch, download_bars_batch, load_bars, store_bars,
+    INITIAL_DAYS, DOWNLOAD_OVERLAP, MAX_HISTORY_DAYS,
+)
 from datetime import datetime, timedelta
 from app.script.debug import debug_printer as d
 
 CURRENCY_PAIRS = ["USDJPY", "EURUSD", "EURJPY"]  # USD-JPY, USD-EUR, EUR-JPY の3ペアを取得
+WARMUP_DAYS = 5  # 指標のウォームアップ用に余分に読み込む日数
+
+def load_pending_bars(session, pair_code, downloaded=None):
+    """
+    指標エンジンがまだ処理していない足をストアから読み込む
+
+    Args:
+        session: DBセッション
+        pair_code (str): 通貨ペアコード
+        downloaded (pd.DataFrame): 今回ダウンロードした足（過去の欠損を埋めたかの判定に使用）
+    """
+    engine = get_engine(pair_code)
+
+    # 過去の欠損を埋めた場合は、その区間も含めて計算し直す
+    if engine.last_timestamp is not None and downloaded is not None and not downloaded.empty \
+            and downloaded.index.min() < engine.last_timestamp - DOWNLOAD_OVERLAP:
+        for timeframe in SUPPORTED_TIMEFRAMES:
+            reset_engine(engine_key(pair_code, timeframe))
+        engine = get_engine(pair_code)
+
+    # エンジン未初期化なら過去30日分（＋ウォームアップ分）、以降はエンジンが未処理の足だけを読む
+    start = engine.last_timestamp or (datetime.today() - timedelta(days=INITIAL_DAYS + WARMUP_DAYS))
+    df = load_bars(session, pair_code, start=start)
+
+    if df.empty or (engine.last_timestamp is None and len(df) < 50):
+        d.print(f"⚠️ Data too short or empty for {pair_code}, shape: {df.shape}", level='warning')
+        return pd.DataFrame()  # 空のDataFrameを返す
+    return df
+
+def compute_indicators(pair_code, df, return_rows=1):
+    """
+    足を通貨ペアのエンジンに流し込み、指標列を付けたDataFrameを返す
+
+    Args:
+        pair_code (str): 通貨ペアコード
+        df (pd.DataFrame): load_pending_barsで読み込んだ足
+        return_rows (int): 返す行数（Noneなら今回計算した全行）
+    """
+    if df.empty:
+        return df
+
+    # 通貨ペアごとのエンジンに未処理の足だけを流し込み、指標を逐次更新する
+    # RSI / MACD / SMA20 / EMA50 / ボリンジャーバンド / ADX（pandas_taと同じ計算式）
+    indicators = get_engine(pair_code).update_frame(df)
+    if indicators.empty:
+        d.print(f"⚠️ No new bars for {pair_code}", level='warning')
+        return pd.DataFrame()
+
+    # ウォームアップ中（EMA50が出るまで）の足は指標が揃っていないので返さない
+    df = df.join(indicators.dropna(subset=["ema_50"]), how="inner")
+
+    if return_rows is None:
+        return df  # 計算した全行
+    return df.tail(return_rows)  # 指定の行数だけを返す（デフォルト1）
 
 def fetch_technicals(pair_code, return_rows=1):
     """
@@ -17,63 +81,127 @@ def fetch_technicals(pair_code, return_rows=1):
         return_rows (int): Number of rows to return (default is 1).
     """
     d.print(f"fetching... ")
-    
-    # 過去30日間のデータを取得
-    end = datetime.today()
-    start = end - timedelta(days=30)  
-    ticker = pair_code + "=X"
-    
-    # データフレームの取得とクリーニング
-    df = yf.download(ticker, start=start, end=end, interval="1h")
-    debug_info = f"Fetched data for {pair_code}: {df.shape[0]} rows, {df.shape[1]} columns"
-    d.print(debug_info, level='debug')
-    
-    # マルチインデックスの列を単一の列に変換
-    if isinstance(df.columns, pd.MultiIndex):
-        # d.print("Converting MultiIndex columns to simple columns", level='debug')
-        df.columns = [col[0] for col in df.columns]  # 最初のレベルのみを使用
-        # d.print(f"converted columns: {df.columns.tolist()}", level='debug')
-    
-    df.to_csv(f"data/{pair_code}_technical_data.csv")
 
-    if df.empty or len(df) < 50:
-        d.print(f"⚠️ Data too short or empty for {pair_code}, shape: {df.shape}", level='warning')
-        return pd.DataFrame()  # 空のDataFrameを返す
-    
-    # データの最初と最後の日付をログ
-    # d.print(f"Data range for {pair_code}: {df.index[0]} to {df.index[-1]}", level='debug')
+    session = SessionLocal()
+    try:
+        # 保存済みの足以降だけをyfinanceから取得してストアに追記
+        downloaded = sync_bars(session, pair_code)
+        df = load_pending_bars(session, pair_code, downloaded)
+    finally:
+        session.close()
 
-    # 1. RSI（Relative Strength Index）相対力指数
-    df["rsi"] = ta.rsi(df["Close"], length=14)
+    return compute_indicators(pair_code, df, return_rows)
 
-    # 2. MACD（Moving Average Convergence Divergence）移動平均収束発散法
-    macd = ta.macd(df["Close"])
-    if macd is not None and "MACD_12_26_9" in macd and "MACDs_12_26_9" in macd:
-        df["macd"] = macd["MACD_12_26_9"]
-        df["macd_signal"] = macd["MACDs_12_26_9"]
-    else:
-        d.print(f"⚠️ MACD calculation failed for {pair_code}", level='warning')
-        df["macd"] = df["macd_signal"] = None
+def recompute_history(pair_codes=None, start=None, backfill_days=None):
+    """
+    保存済みの足から指標の履歴を全ペアまとめて再計算し、technical_indicatorsを上書きする
+    （指標パラメータを変更したときなど）
 
-    # 3. SMA（Simple Moving Average）単純移動平均
-    df["sma_20"] = ta.sma(df["Close"], length=20)
-    
-    # 4. EMA（Exponential Moving Average）指数移動平均
-    df["ema_50"] = ta.ema(df["Close"], length=50)
-
-    # 5. Bollinger Bands ボリンジャーバンド
-    bb = ta.bbands(df["Close"])
-    if bb is not None:
-        df["bb_upper"] = bb.get("BBU_20_2.0", None)
-        df["bb_lower"] = bb.get("BBL_20_2.0", None)
+    NumPyのベクトル化カーネル（indicator_kernels）で全ペアを1回で計算する。上位足（4h, 1d）も同様に再計算する。
+
+    Args:
+        pair_codes (list): 対象の通貨ペア（デフォルトはCURRENCY_PAIRS）
+        start (datetime): この時刻以降の行だけを書き込む（計算自体は全履歴から行う）
+        backfill_days (int): 指定した場合、先にyfinanceから過去この日数分の足をストアに取り込む
+
+    Returns:
+        dict: 通貨ペア→書き込んだ行数（全時間足の合計）
+    """
+    pair_codes = pair_codes or CURRENCY_PAIRS
+    d.print_ts(f"<<< recompute_history: {pair_codes} >>>", level='debug')
+
+    session = SessionLocal()
+    written = {}
+    try:
+        if backfill_days:
+            end = datetime.today()
+            frames = download_bars_batch(pair_codes, end - timedelta(days=min(backfill_days, MAX_HISTORY_DAYS)), end)
+            for pair, df in frames.items():
+                store_bars(session, pair, df)
+            session.commit()
+
+        bars = {pair: load_bars(session, pair) for pair in pair_codes}
+
+        # 1時間足と、それを集約した上位足をそれぞれ全ペア一括で計算
+        for timeframe in SUPPORTED_TIMEFRAMES:
+            frames = bars if timeframe == BASE_TIMEFRAME else {
+                pair: resample_bars(df, timeframe) for pair, df in bars.items()
+            }
+            results = compute_indicator_frames(frames)
+
+            for pair, df in results.items():
+                # ウォームアップ中（EMA50が出るまで）の行は書き込まない
+                df = df.dropna(subset=["ema_50"])
+                if start is not None:
+                    df = df[df.index >= start]
+                try:
+                    count = store_indicators(session, pair, df, overwrite=True, timeframe=timeframe)
+                    session.commit()
+                    written[pair] = written.get(pair, 0) + count
+                    # ストリーミングエンジンも新しい計算結果に合わせて作り直す
+                    reset_engine(engine_key(pair, timeframe))
+                    d.print(f"✅ Recomputed: {pair} {timeframe} {count} rows", level='debug')
+                except Exception as e:
+                    d.print(f"Error recomputing {pair} {timeframe}: {str(e)}", level='error')
+                    session.rollback()
+    finally:
+        session.close()
+    return written
+
+def indicator_rows(pair_code, df):
+    """
+    指標列付きのDataFrameをTechnicalIndicatorの行（dict）のリストに変換する
+    """
+    columns = {"close": df["Close"]}
+    columns.update({col: df[col] for col in INDICATOR_COLUMNS})
+    return [
+        {
+            "currency_pair": pair_code,
+            "timestamp": ts.to_pydatetime(),
+            **{name: None if pd.isna(v) else float(v) for name, v in zip(columns, values)},
+        }
+        for ts, *values in zip(df.index, *columns.values())
+    ]
+
+def store_indicators(session, pair_code, df, overwrite=False, timeframe=BASE_TIMEFRAME):
+    """
+    指標を一括で保存する（INSERT ... ON CONFLICT、uq_pair_time / uq_pair_timeframe_time制約を利用）
+
+    Args:
+        session: DBセッション
+        pair_code (str): 通貨ペアコード
+        df (pd.DataFrame): compute_indicatorsの結果
+        overwrite (bool): Trueなら既存の行を上書き、Falseなら既存の行はそのまま残す
+        timeframe (str): 時間足（1h以外はresampled_indicatorsに保存）。1hの場合はlatest_indicatorsも同じトランザクションで更新
+
+    Returns:
+        int: 書き込んだ行数（ON CONFLICTでスキップされた行を含む）
+    """
+    rows = indicator_rows(pair_code, df)
+    if not rows:
+        return 0
+
+    if timeframe == BASE_TIMEFRAME:
+        model, keys = TechnicalIndicator, ["currency_pair", "timestamp"]
+        update_latest(session, pair_code, max(rows, key=lambda row: row["timestamp"]))
     else:
-        df["bb_upper"] = df["bb_lower"] = None
+        model, keys = ResampledIndicator, ["currency_pair", "timeframe", "timestamp"]
+        for row in rows:
+            row["timeframe"] = timeframe
 
-    # 6. ADX（Average Directional Index）平均方向性指数
-    adx = ta.adx(df["High"], df["Low"], df["Close"])
-    df["adx"] = adx["ADX_14"] if adx is not None and "ADX_14" in adx else None
+    # コミット時にデータバージョンを上げる（チャート画像のキャッシュを無効化）
+    mark_changed(session, pair_code)
 
-    return df.tail(return_rows)  # 指定の行数だけを返す（デフォルト1）
+    stmt = sqlite_insert(model)
+    if overwrite:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={col: stmt.excluded[col] for col in ["close"] + INDICATOR_COLUMNS},
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=keys)
+    session.execute(stmt, rows)
+    return len(rows)
 
 def collect_technical_data():
     session = SessionLocal()
@@ -81,52 +209,128 @@ def collect_technical_data():
     d.print_ts(f"<<< scheduled task: collect_technical_data >>>", level='debug')
     
     try:
+        # 全ペアの差分を1回のダウンロードでまとめて取得
+        try:
+            downloaded = sync_bars_batch(session, CURRENCY_PAIRS)
+        except Exception as e:
+            d.print(f"Batch download failed: {str(e)}", level='error')
+            session.rollback()
+            downloaded = {}
+
+        pending = {}
+        for pair in CURRENCY_PAIRS:
+            try:
+                pending[pair] = load_pending_bars(session, pair, downloaded.get(pair))
+            except Exception as e:
+                d.print(f"Error loading bars for {pair}: {str(e)}", level='error')
+
+        # 指標計算はペアごとに順に行う（エンジンは未処理の足だけを計算するため、1回の実行では数本分で済む）
+        results = {}
+        for pair, df in pending.items():
+            try:
+                results[pair] = compute_indicators(pair, df, None)
+            except Exception as e:
+                d.print(f"Error computing indicators for {pair}: {str(e)}", level='error')
+
         for pair in CURRENCY_PAIRS:
             d.print(f"{pair})", level='debug')
-            # APIでデータ取得・テクニカル指標計算
-            df = fetch_technicals(pair, return_rows=1)
+            df = results.get(pair, pd.DataFrame())
             
             if df.empty:
                 d.print(f"Skipping {pair} due to empty dataframe", level='error')
                 continue
             
-            # d.print(f"{df.tail(1)}", level='debug')
-            df.tail(1).to_csv(f"data/{pair}_technical.csv", index=True)
-            
-                
-            for _, row in df.iterrows():
-                timestamp = row.name.to_pydatetime()
-                # データベースに保存する前に、すでに存在するか確認
-                exists = session.query(TechnicalIndicator).filter_by(
-                    currency_pair=pair, timestamp=timestamp
-                ).first()
-                # 存在するならスキップ
-                if exists:
-                    d.print(f"⏩ Skip: {pair} @ {timestamp}")
-                    continue
-                    
-                # スカラー値を使用するように修正
-                ti = TechnicalIndicator(
-                    currency_pair=pair,
-                    timestamp=timestamp,
-                    close=None if pd.isna(row["Close"]) else float(row["Close"]),
-                    rsi=None if pd.isna(row["rsi"]) else float(row["rsi"]),
-                    macd=None if pd.isna(row["macd"]) else float(row["macd"]),
-                    macd_signal=None if pd.isna(row["macd_signal"]) else float(row["macd_signal"]),
-                    sma_20=None if pd.isna(row["sma_20"]) else float(row["sma_20"]),
-                    ema_50=None if pd.isna(row["ema_50"]) else float(row["ema_50"]),
-                    bb_upper=None if pd.isna(row["bb_upper"]) else float(row["bb_upper"]),
-                    bb_lower=None if pd.isna(row["bb_lower"]) else float(row["bb_lower"]),
-                    adx=None if pd.isna(row["adx"]) else float(row["adx"])
-                )
-                session.add(ti)
-                d.print(f"✅ Added: {pair} @ {timestamp}")
-                
-                
-                
-        session.commit()
+            try:
+                # d.print(f"{df.tail(1)}", level='debug')
+                df.tail(1).to_csv(f"data/{pair}_technical.csv", index=True)
+
+                # 計算済みの全行を1ステートメントで保存
+                # 前回は未確定だった最新足も再計算されて含まれるため、既存の行は確定後の値で上書きする
+                store_indicators(session, pair, df, overwrite=True)
+                session.commit()
+                d.print(f"✅ Saved: {pair} {len(df)} rows ({df.index[0]} - {df.index[-1]})")
+            except Exception as e:
+                d.print(f"Error storing indicators for {pair}: {str(e)}", level='error')
+                session.rollback()
+                continue
+
+            # 保存済みの1時間足から上位足（4h, 1d）を差分更新
+            for timeframe in TIMEFRAMES:
+                try:
+                    tf_df = compute_timeframe_indicators(session, pair, timeframe)
+                    store_indicators(session, pair, tf_df, overwrite=True, timeframe=timeframe)
+                    session.commit()
+                except Exception as e:
+                    d.print(f"Error updating {timeframe} indicators for {pair}: {str(e)}", level='error')
+                    session.rollback()
     except Exception as e:
         d.print(f"Error in collect_technical_data: {str(e)}", level='error')
         session.rollback()
     finally:
-        session.close()
\ No newline at end of file
+        session.close()
+
+
+def check_revised_bar(bars=80):
+    """
+    未確定だった最新足が確定値に差し替わったとき、保存済みの行も確定後の値になり、
+    latest_indicatorsが履歴の最後の行と一致することを確認する（一時ファイルのDBを使う）
+
+    Returns:
+        dict: 差し替えた足の保存済みの行
+    """
+    import tempfile
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.script.models import Base, LatestIndicator
+    from app.script.latest import LATEST_FIELDS
+
+    pair = "CHECK_REVISED_BAR"
+    index = pd.date_range(datetime(2025, 1, 6), periods=bars, freq="h")
+    close = pd.Series([147.0 + 0.01 * (i % 17) for i in range(bars)], index=index)
+    df = pd.DataFrame({"Open": close, "High": close + 0.05, "Low": close - 0.05, "Close": close, "Volume": 0.0})
+
+    reset_engine(pair)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = create_engine(f"sqlite:///{tmp}/check.sqlite")
+        Base.metadata.create_all(bind=db)
+        session = sessionmaker(autocommit=False, autoflush=False, bind=db)()
+        try:
+            # 1回目: 最新足は未確定の値で保存される
+            store_indicators(session, pair, compute_indicators(pair, df, None))
+            session.commit()
+
+            # 2回目: 同じ時刻の最新足が確定値（+1.0）で再取得される
+            revised = df.copy()
+            revised.loc[index[-1], ["High", "Close"]] += 1.0
+            expected = compute_indicators(pair, revised.loc[index[-1]:], None)
+            store_indicators(session, pair, expected, overwrite=True)
+            session.commit()
+
+            stored = session.query(TechnicalIndicator).filter_by(currency_pair=pair, timestamp=index[-1].to_pydatetime()).one()
+            row = indicator_rows(pair, expected)[-1]
+            for field in ["close"] + INDICATOR_COLUMNS:
+                if getattr(stored, field) != row[field]:
+                    raise AssertionError(f"{field} of the revised bar is {getattr(stored, field)}, expected {row[field]}")
+
+            # 最新の指標（/api/signal_data）と履歴（/api/indicators）が同じ足について同じ値を返すこと
+            latest = session.get(LatestIndicator, pair)
+            last = session.query(TechnicalIndicator).filter_by(currency_pair=pair)\
+                .order_by(TechnicalIndicator.timestamp.desc()).first()
+            for field in LATEST_FIELDS:
+                if getattr(latest, field) != getattr(last, field):
+                    raise AssertionError(f"latest {field} is {getattr(latest, field)}, history has {getattr(last, field)}")
+        finally:
+            session.close()
+            db.dispose()
+            reset_engine(pair)
+    return row
+
+
+if __name__ == "__main__":
+    # 履歴の再計算: python -m app.script.collect [バックフィル日数]
+    # 検証実行: python -m app.script.collect check
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "check":
+        d.print(f"revised bar stored: {check_revised_bar()}", level="debug")
+    else:
+        recompute_history(backfill_days=int(sys.argv[1]) if len(sys.argv) > 1 else None)
@@ -0,0 +1,116 @@
+import hashlib
+from typing import List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders, QueryParams
+from starlette.responses import Response
+from starlette.routing import Match
+from app.script.db import AsyncSessionLocal
+from app.script.data_version import data_version, news_version, window_bucket
+from app.script.responses import choose_encoding
+from app.script.charts import etag_matches
+
+# データバージョンによるETagと条件付きGET（If-None-Match → 304）
+#
+# @versioned を付けたエンドポイントについて、ミドルウェアがルーティングの前にデータバージョン
+# （通貨ペア・ニュースごとの書き込み回数とニュースの最大ID、app.script.data_version）とリクエストのパス・クエリからETagを作る。
+# If-None-Matchが一致すればエンドポイントを実行せずに304を返し、そうでなければ200のレスポンスにETagを付ける。
+# データが変わらない限り同じURLのレスポンスは同じになるエンドポイントにだけ付けること。
+# 現在時刻から遡る期間（days=...）の足を読むエンドポイントは window=True とし、ETagに時刻の区切り（正時）も含める。
+# 足以外（ニュースの公開時刻など）で期間の境界が正時に揃わないエンドポイントには付けないこと。
+#
+# 使い方:
+#     app.add_middleware(DataVersionETagMiddleware)
+#
+#     @app.get("/api/indicators/{pair_code}")
+#     @versioned(pair_param="pair_code", window=True)
+#     async def get_indicators(...): ...
+
+_ATTR = "__data_versioned__"
+
+
+def versioned(pair_param: Optional[str] = None, news: bool = False, window: bool = False):
+    """
+    エンドポイントをデータバージョンによるETagの対象にする（@app.get の下に付ける）
+
+    Args:
+        pair_param: 通貨ペアコードを受け取るパスパラメータ名またはクエリパラメータ名（クエリは複数指定可）。
+                    クエリパラメータの既定値は見ないため、省略時に既定のペアを使うエンドポイントには付けないこと
+        news: ニュースのバージョンもETagに含めるか
+        window: 現在時刻から遡る期間の足を読むか（ETagにwindow_bucketを含め、正時を過ぎたら別のETagにする）
+    """
+    def decorator(endpoint):
+        setattr(endpoint, _ATTR, (pair_param, news, window))
+        return endpoint
+    return decorator
+
+
+async def versions_for(pair_codes: List[str], news: bool) -> List[str]:
+    async with AsyncSessionLocal() as session:
+        versions = [await session.run_sync(data_version, pair) for pair in pair_codes]
+        if news:
+            versions.append(await session.run_sync(news_version))
+    return versions
+
+
+def data_etag(path: str, query: str, encoding: Optional[str], versions: List[str]) -> str:
+    # 圧縮方式が異なるとレスポンスのバイト列も異なるため、強いETagには圧縮方式も含める
+    query = "&".join(sorted(query.split("&"))) if query else ""
+    key = "\n".join([path, query, encoding or "identity", *versions])
+    return '"' + hashlib.sha1(key.encode("utf-8")).hexdigest()[:20] + '"'
+
+
+class DataVersionETagMiddleware:
+    """
+    @versioned を付けたエンドポイントのGET/HEADにETagを付け、If-None-Matchが一致すれば304を返すASGIミドルウェア
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _match(self, scope):
+        # ルーティングと同じ方法でエンドポイントとパスパラメータを求める
+        for route in scope["app"].router.routes:
+            match, child_scope = route.matches(scope)
+            if match == Match.FULL:
+                spec = getattr(getattr(route, "endpoint", None), _ATTR, None)
+                return spec, child_scope.get("path_params", {})
+        return None, {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        spec, path_params = self._match(scope)
+        if spec is None:
+            await self.app(scope, receive, send)
+            return
+
+        pair_param, news, window = spec
+        query = scope.get("query_string", b"").decode("latin-1")
+        pair_codes = []
+        if pair_param:
+            pair_codes = [path_params[pair_param]] if pair_param in path_params \
+                else list(dict.fromkeys(QueryParams(query).getlist(pair_param)))
+        request_headers = Headers(scope=scope)
+        versions = await versions_for(pair_codes, news)
+        if window:
+            versions.append(window_bucket())
+        etag = data_etag(
+            scope["path"], query, choose_encoding(request_headers.get("accept-encoding")), versions
+        )
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+        if etag_matches(request_headers.get("if-none-match"), etag):
+            await Response(status_code=304, headers=headers)(scope, receive, send)
+            return
+
+        async def send_with_etag(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                response_headers = MutableHeaders(scope=message)
+                for name, value in headers.items():
+                    if name not in response_headers:
+                        response_headers[name] = value
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
@@ -0,0 +1,77 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.script.models import DataVersion, NewsArticle
+
+# 通貨ペアごとのデータのバージョン（チャート画像のキャッシュやETagに使用）
+#
+# data_versionsテーブルに、通貨ペアごとの書き込み回数を保持する。指標・足・最新の指標を書き込むときに
+# mark_changedを呼ぶと、同じトランザクションのコミット直前にバージョンが1上がる。
+# DBに保存するため、別のプロセス（recompute_historyの手動実行など）が書き込んだ場合もバージョンが変わる。
+#
+# ニュースは通貨ペアに依らない1つのバージョン（記事IDの最大値と、記事を書き込んだ回数）。
+
+_PENDING_KEY = "data_version_pending"
+NEWS_KEY = "__news__"  # ニュースのバージョンのキー（通貨ペアコードと重ならない名前）
+
+
+def mark_changed(session, pair_code: str):
+    """
+    通貨ペアのデータを変更したことを記録する（コミットされた時点でバージョンが上がる）
+    """
+    session.info.setdefault(_PENDING_KEY, set()).add(pair_code)
+
+
+def mark_news_changed(session):
+    """
+    ニュース記事を追加・変更したことを記録する（コミットされた時点でニュースのバージョンが上がる）
+    """
+    mark_changed(session, NEWS_KEY)
+
+
+@event.listens_for(Session, "before_commit")
+def _bump(session):
+    # 書き込みと同じトランザクションで上げる（コミットが失敗すればバージョンも戻る）
+    keys = session.info.pop(_PENDING_KEY, None)
+    if keys:
+        stmt = sqlite_insert(DataVersion).values([{"key": key, "version": 1} for key in sorted(keys)])
+        stmt = stmt.on_conflict_do_update(index_elements=["key"], set_={"version": DataVersion.version + 1})
+        session.execute(stmt)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _stored_version(session, key: str) -> int:
+    version: Optional[int] = session.execute(select(DataVersion.version).where(DataVersion.key == key)).scalar()
+    return version or 0
+
+
+def data_version(session, pair_code: str) -> str:
+    """
+    通貨ペアの現在のデータバージョン（data_versionsの主キー検索）
+    """
+    return str(_stored_version(session, pair_code))
+
+
+def news_version(session) -> str:
+    """
+    ニュースの現在のバージョン（IDの最大値は主キーのB-treeの末尾を読むだけで求まる）
+    """
+    high_water = session.query(func.max(NewsArticle.id)).scalar()
+    return f"{high_water or 0}.{_stored_version(session, NEWS_KEY)}"
+
+
+def window_bucket(now: Optional[datetime] = None) -> str:
+    """
+    現在時刻から遡る期間（days=...）を読むエンドポイント用の時刻の区切り（時単位）
+
+    足の時刻は正時のため、データバージョンが同じでも期間に含まれる足は正時ごとに変わる。
+    キャッシュのキーやETagにデータバージョンと一緒に含める。
+    """
+    return (now or datetime.now()).strftime("%Y%m%d%H")
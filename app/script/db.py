@@ -1,6 +1,8 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
-from app.script.models import Base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import QueuePool
+from app.script.migrations import run_migrations
 import os
 
 # .envファイルから環境変数を読み込み
@@ -26,7 +28,116 @@ def load_env_if_exists():
 load_env_if_exists()
 
 DB_PATH = os.getenv("DB_PATH", "sqlite:///./db/forex.sqlite")
-engine = create_engine(DB_PATH, connect_args={"check_same_thread": False})
+
+# SQLiteの接続ごとに設定するPRAGMA（環境変数で上書き可能）
+# WALモードにすることで、ニュース収集などの書き込み中もチャート等の読み込みがブロックされない
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),  # WALではNORMALでもコミット済みデータは失われない
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", -64000)),  # 負の値はKiB単位（約64MB）
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT", 5000)),  # ミリ秒
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+
+# コネクションプール（スケジューラ・WebSocketスレッド・FastAPIのスレッドプールで共有）
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+
+
+def set_sqlite_pragmas(dbapi_connection, pragmas):
+    """
+    DBAPI接続にPRAGMAを設定する
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def create_db_engine(url=DB_PATH, pragmas=None, **kwargs):
+    """
+    設定済みのエンジンを作成する
+
+    SQLiteの場合は接続ごとにPRAGMAを設定し、ファイルDBではQueuePoolを使う。
+
+    Args:
+        url: データベースURL
+        pragmas: SQLiteのPRAGMA（省略時はSQLITE_PRAGMAS）
+        kwargs: create_engineにそのまま渡す引数
+    """
+    is_sqlite = url.startswith("sqlite")
+    in_memory = is_sqlite and (":memory:" in url or url.rstrip("/") in ("sqlite:", "sqlite+pysqlite:"))
+
+    options = {}
+    if is_sqlite:
+        options["connect_args"] = {"check_same_thread": False}
+    if not in_memory:
+        options.update(
+            poolclass=QueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+    options.update(kwargs)
+
+    new_engine = create_engine(url, **options)
+
+    if is_sqlite:
+        pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+
+        @event.listens_for(new_engine, "connect")
+        def _on_connect(dbapi_connection, connection_record):
+            set_sqlite_pragmas(dbapi_connection, pragmas)
+
+    return new_engine
+
+
+def async_url(url):
+    """
+    同期ドライバのURLを非同期ドライバのURLに変換する（sqlite:/// → sqlite+aiosqlite:///）
+    """
+    if url.startswith("sqlite+") or not url.startswith("sqlite:"):
+        return url
+    return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+
+
+def create_async_db_engine(url=DB_PATH, pragmas=None, **kwargs):
+    """
+    読み込み専用のAPI用に非同期エンジン（aiosqlite）を作成する
+
+    PRAGMAとプールの設定はcreate_db_engineと同じ。テーブル作成やマイグレーションは同期エンジンで行う。
+    """
+    url = async_url(url)
+    is_sqlite = url.startswith("sqlite")
+    in_memory = is_sqlite and ":memory:" in url
+
+    options = {}
+    if not in_memory:
+        options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    options.update(kwargs)
+
+    new_engine = create_async_engine(url, **options)
+
+    if is_sqlite:
+        pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+
+        @event.listens_for(new_engine.sync_engine, "connect")
+        def _on_connect(dbapi_connection, connection_record):
+            set_sqlite_pragmas(dbapi_connection, pragmas)
+
+    return new_engine
+
+
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base.metadata.create_all(bind=engine)
+# 非同期エンドポイント用（ORMのクエリは AsyncSession.run_sync で既存の同期関数をそのまま使う）
+async_engine = create_async_db_engine()
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# テーブル作成と未適用のマイグレーション（インデックス追加など）
+run_migrations(engine)
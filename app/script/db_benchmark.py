@@ -0,0 +1,197 @@
+import itertools
+import os
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pandas as pd
+from sqlalchemy.orm import sessionmaker
+from app.script.db import create_db_engine, SQLITE_PRAGMAS
+from app.script.timeframes import load_indicator_frame, INDICATOR_FIELDS
+from app.script.models import Base, TechnicalIndicator, NewsArticle
+from app.script.debug import debug_printer as d
+
+# DBアクセスのベンチマーク
+# - run_benchmark: 書き込みスレッド（ニュースのバッチ保存）と読み込みスレッド（チャート用の指標取得）を
+#   同時に動かし、読み込みのレイテンシを比較する
+# - run_read_path_benchmark: 指標の読み込みをORMオブジェクト経由とload_indicator_frameで比較する
+#
+# 実行: python -m app.script.db_benchmark
+
+
+def _seed(session_factory, pairs=3, days=30):
+    session = session_factory()
+    try:
+        start = datetime.now() - timedelta(days=days)
+        session.bulk_insert_mappings(TechnicalIndicator, [
+            {"currency_pair": f"PAIR{p}", "timestamp": start + timedelta(hours=h), "close": 100.0 + h * 0.01,
+             "rsi": 50.0, "macd": 0.0, "macd_signal": 0.0, "sma_20": 100.0, "ema_50": 100.0,
+             "bb_upper": 101.0, "bb_lower": 99.0, "adx": 20.0}
+            for p in range(pairs) for h in range(days * 24)
+        ])
+        session.commit()
+    finally:
+        session.close()
+
+
+_article_ids = itertools.count()  # 記事ごとに異なるタイトル・URLにする（uq_news_articles_url_hash）
+
+
+def _writer(session_factory, stop, batch_size, hold_seconds, idle_seconds, commits, write_errors):
+    while not stop.is_set():
+        session = session_factory()
+        try:
+            # 書き込み中はロックを保持し続ける（ロールバックジャーナルでは読み込みも待たされ、WALでは待たされない）
+            session.connection().exec_driver_sql("BEGIN EXCLUSIVE")
+            for _ in range(batch_size):
+                i = next(_article_ids)
+                session.add(NewsArticle(category="bench", title=f"title {i}", summary="x" * 500,
+                                        url=f"https://example.com/{i}", published=datetime.now(), currency_tags=["USD"]))
+            session.flush()
+            # 要約生成などで書き込みトランザクションが長引く状況を再現
+            time.sleep(hold_seconds)
+            session.commit()
+            commits.append(1)
+        except Exception as e:
+            session.rollback()
+            write_errors.append(e)
+        finally:
+            session.close()
+        # 次のバッチまでの間隔（この間は読み込みがロックを取れる）
+        time.sleep(idle_seconds)
+
+
+def _reader(session_factory, stop, latencies, errors):
+    since = datetime.now() - timedelta(days=7)
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        session = session_factory()
+        try:
+            session.query(TechnicalIndicator).filter(
+                TechnicalIndicator.currency_pair == "PAIR0",
+                TechnicalIndicator.timestamp >= since,
+            ).order_by(TechnicalIndicator.timestamp).all()
+            latencies.append(time.perf_counter() - t0)
+        except Exception:
+            errors.append(1)
+        finally:
+            session.close()
+
+
+def run_benchmark(pragmas, readers=8, writers=2, duration=5.0, batch_size=50, hold_seconds=0.05, idle_seconds=0.1,
+                  **engine_kwargs):
+    """
+    一時ファイルのDBで読み書きを同時に実行して計測する
+
+    書き込みスレッドはBEGIN EXCLUSIVEでhold_seconds秒ロックを保持し、idle_seconds秒休む。
+    ロールバックジャーナルではロック中の読み込みが待たされ、WALでは待たされない差がレイテンシに現れる。
+
+    Returns:
+        dict: 読み込み回数・レイテンシ（p50/p99, ミリ秒）・エラー数・書き込みコミット数
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(f"sqlite:///{os.path.join(tmp, 'bench.sqlite')}", pragmas=pragmas, **engine_kwargs)
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        _seed(session_factory)
+
+        stop = threading.Event()
+        latencies, errors, commits, write_errors = [], [], [], []
+        threads = [threading.Thread(target=_writer, args=(session_factory, stop, batch_size, hold_seconds, idle_seconds, commits, write_errors))
+                   for _ in range(writers)]
+        threads += [threading.Thread(target=_reader, args=(session_factory, stop, latencies, errors))
+                    for _ in range(readers)]
+        for t in threads:
+            t.start()
+        time.sleep(duration)
+        stop.set()
+        for t in threads:
+            t.join()
+        engine.dispose()
+
+    # 書き込みが失敗していると読み込みとの競合を測れていないため、結果を返さずに失敗させる
+    if write_errors:
+        raise RuntimeError(f"{len(write_errors)} write transactions failed: {write_errors[0]!r}") from write_errors[0]
+
+    latencies.sort()
+    return {
+        "reads": len(latencies),
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else None,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else None,
+        "read_errors": len(errors),
+        "write_commits": len(commits),
+    }
+
+
+def _orm_read(session, pair_code, since):
+    # 従来のエンドポイントの読み込み方（ORMオブジェクト→列ごとのリスト→DataFrame）
+    results = session.query(TechnicalIndicator).filter(
+        TechnicalIndicator.currency_pair == pair_code,
+        TechnicalIndicator.timestamp >= since,
+    ).order_by(TechnicalIndicator.timestamp).all()
+    data = {"timestamp": [r.timestamp for r in results]}
+    data.update({c: [getattr(r, c) for r in results] for c in INDICATOR_FIELDS})
+    return pd.DataFrame(data).set_index("timestamp")
+
+
+def _columnar_read(session, pair_code, since):
+    return load_indicator_frame(session, pair_code, start=since)
+
+
+def _measure(session_factory, read, pairs, since, repeat):
+    def read_all():
+        session = session_factory()
+        try:
+            for p in range(pairs):
+                read(session, f"PAIR{p}", since)
+        finally:
+            session.close()
+
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        read_all()
+        timings.append(time.perf_counter() - t0)
+
+    # tracemallocは処理を遅くするため、メモリは時間とは別に計測する
+    tracemalloc.start()
+    read_all()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"seconds": statistics.median(timings), "peak_mb": peak / 1e6}
+
+
+def run_read_path_benchmark(pairs=20, days=30, repeat=3):
+    """
+    days日分×pairsペアの指標を読み込む時間とメモリのピークを、ORM経由と列指向の読み込みで比較する
+
+    Returns:
+        dict: {"orm": {...}, "columnar": {...}}（秒はrepeat回の中央値、メモリは全ペア読み込み中のピーク）
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(f"sqlite:///{os.path.join(tmp, 'bench.sqlite')}")
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        _seed(session_factory, pairs=pairs, days=days)
+        since = datetime.now() - timedelta(days=days + 1)
+
+        result = {
+            "orm": _measure(session_factory, _orm_read, pairs, since, repeat),
+            "columnar": _measure(session_factory, _columnar_read, pairs, since, repeat),
+        }
+        engine.dispose()
+    return result
+
+
+if __name__ == "__main__":
+    # 従来の設定（ロールバックジャーナル・PRAGMAなし）と、現在の設定を比較
+    baseline = run_benchmark({"journal_mode": "DELETE"})
+    d.print(f"rollback journal: {baseline}", level="debug")
+    tuned = run_benchmark(SQLITE_PRAGMAS)
+    d.print(f"configured ({SQLITE_PRAGMAS['journal_mode']}): {tuned}", level="debug")
+
+    for pairs in [1, 20, 100]:
+        d.print(f"read path, {pairs} pairs x 30 days: {run_read_path_benchmark(pairs=pairs)}", level="debug")
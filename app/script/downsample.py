@@ -0,0 +1,159 @@
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.script.debug import debug_printer as d
+
+# 時系列の間引き（Largest-Triangle-Three-Buckets）
+#
+# チャートの横幅（ピクセル数）やmax_pointsに合わせて点数を減らし、描画時間とJSONのサイズを
+# 履歴の長さではなく出力の幅に比例させる。複数の列は1つの行の選び方を共有する（行の対応を崩さない）。
+
+MIN_POINTS = 3  # 先頭・末尾と、少なくとも1つのバケット
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    LTTBで残す行の位置を返す
+
+    先頭と末尾の点は必ず残し、間の点をn_out-2個のバケットに分けて、各バケットから
+    「前のバケットで選んだ点」「次のバケットの平均」と作る三角形の面積が最大の点を1つ選ぶ。
+    yが複数列の場合は、列ごとに0〜1に正規化した面積の合計で選ぶ（NaNの列は無視）。
+
+    バケットを固定長に詰めた配列で面積の各項を先にまとめて計算し、
+    前の選択に依存する部分（バケット数回の小さな演算とargmax）だけを逐次に行う。
+
+    Args:
+        x: 横軸の値（昇順）
+        y: (行数,) または (行数, 列数) の値
+        n_out: 残す点数
+
+    Returns:
+        np.ndarray: 残す行の位置（昇順）
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if y.ndim == 1:
+        y = y[:, None]
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < MIN_POINTS:
+        raise ValueError(f"n_out must be at least {MIN_POINTS}")
+
+    # 横軸と各列を0〜1に正規化（スケールの違う列の面積を合計できるように）
+    x = (x - x[0]) / ((x[-1] - x[0]) or 1.0)
+    lo = np.fmin.reduce(y, axis=0)
+    span = np.fmax.reduce(y, axis=0) - lo
+    lo = np.where(np.isnan(lo), 0.0, lo)
+    span = np.where(span > 0, span, 1.0)
+    y = (y - lo) / span
+
+    # バケットの境界（1〜n-2の点をn_buckets個に分ける）
+    n_buckets = n_out - 2
+    edges = (np.arange(n_buckets + 1) * ((n - 2) / n_buckets)).astype(np.int64) + 1
+    edges[-1] = n - 1
+    starts = edges[:-1]
+    sizes = np.diff(edges)
+    width = int(sizes.max())
+    offsets = np.arange(width)
+    valid = offsets < sizes[:, None]
+    members = np.where(valid, starts[:, None] + offsets, starts[:, None])  # (バケット, 幅)
+
+    # 各バケットの平均（NaNを除く）。最後のバケットの「次」は末尾の点
+    missing = np.isnan(y)
+    inner = slice(1, n - 1)
+    counts = np.add.reduceat((~missing[inner]).astype(np.float64), starts - 1, axis=0)
+    sums = np.add.reduceat(np.where(missing, 0.0, y)[inner], starts - 1, axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        y_mean = sums / counts
+    x_mean = np.add.reduceat(x[inner], starts - 1) / sizes
+    xc = np.append(x_mean[1:], x[-1])
+    yc = np.vstack([y_mean[1:], y[-1:]])
+
+    # 面積（の2倍）= |xa * (yb - yc) + ya * (xc - xb) + (xb * yc - xc * yb)|
+    # a（前の選択）以外の項はバケットごとにまとめて計算しておく
+    xb = x[members]
+    yb = y[members]
+    term_x = yb - yc[:, None, :]
+    term_y = (xc[:, None] - xb)[:, :, None]
+    term_c = xb[:, :, None] * yc[:, None, :] - xc[:, None, None] * yb
+
+    selected = np.empty(n_buckets, dtype=np.int64)
+    xa, ya = x[0], y[0]
+    with np.errstate(invalid="ignore"):
+        for i in range(n_buckets):
+            area = np.nansum(np.abs(xa * term_x[i] + ya * term_y[i] + term_c[i]), axis=1)
+            area[~valid[i]] = -1.0
+            j = members[i, int(np.argmax(area))]
+            selected[i] = j
+            xa, ya = x[j], y[j]
+
+    return np.concatenate([[0], selected, [n - 1]])
+
+
+def lttb_frame(df: pd.DataFrame, max_points: Optional[int], columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    時刻インデックスのDataFrameをLTTBでmax_points行以下に間引く（行数が収まっていればそのまま返す）
+
+    Args:
+        df: load_indicator_frameの結果など（インデックスは時刻）
+        max_points: 残す最大行数（Noneなら間引かない）
+        columns: 行の選択に使う列（省略時は全列）
+    """
+    if max_points is None or len(df) <= max_points:
+        return df
+    index = df.index
+    x = index.asi8 if isinstance(index, pd.DatetimeIndex) else np.arange(len(df))
+    y = df[columns or list(df.columns)].to_numpy(dtype=np.float64)
+    return df.iloc[lttb_indices(x, y, max_points)]
+
+
+def _lttb_reference(x, y, n_out):
+    """
+    教科書どおりの逐次LTTB（1列、検証用）
+    """
+    n = len(x)
+    every = (n - 2) / (n_out - 2)
+    out = [0]
+    a = 0
+    for i in range(n_out - 2):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        next_start, next_end = end, min(int((i + 2) * every) + 1, n - 1)
+        if i == n_out - 3:
+            xc, yc = x[n - 1], y[n - 1]
+        else:
+            xc, yc = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        area = np.abs((x[a] - xc) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (yc - y[a]))
+        a = start + int(np.argmax(area))
+        out.append(a)
+    out.append(n - 1)
+    return np.array(out)
+
+
+if __name__ == "__main__":
+    # 検証・ベンチマーク実行: python -m app.script.downsample
+    import time
+
+    rng = np.random.default_rng(0)
+    for n, n_out in [(1000, 100), (8760, 1000), (8761, 997)]:
+        x = np.arange(n, dtype=np.float64)
+        y = 150.0 + np.cumsum(rng.normal(0, 0.2, n))
+        expected = _lttb_reference((x - x[0]) / (x[-1] - x[0]), (y - y.min()) / (y.max() - y.min()), n_out)
+        actual = lttb_indices(x, y, n_out)
+        assert (actual == expected).all(), f"mismatch for n={n}, n_out={n_out}"
+    d.print("lttb_indices matches the reference implementation", level="debug")
+
+    # 1時間足1年分・9列を横幅1000pxに間引く
+    n = 365 * 24
+    close = 150.0 + np.cumsum(rng.normal(0, 0.2, n))
+    frame = pd.DataFrame(
+        {f"col{i}": close + rng.normal(0, 0.1, n) for i in range(9)},
+        index=pd.date_range("2024-01-01", periods=n, freq="h"),
+    )
+    for max_points in [300, 1000, 2000]:
+        t0 = time.perf_counter()
+        reduced = lttb_frame(frame, max_points)
+        elapsed = time.perf_counter() - t0
+        d.print(f"{n} rows x 9 cols -> {len(reduced)} rows: {elapsed * 1000:.1f} ms", level="debug")
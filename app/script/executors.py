@@ -0,0 +1,34 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from app.script.charts import CHART_WORKERS
+
+# 重い処理用の専用スレッドプール
+#
+# 非同期エンドポイントから、チャート描画やLLM推論のように時間のかかる処理を投入する。
+# DataFrameへの変換・間引き・JSONの変換と圧縮のようなCPU処理も、イベントループ上ではなくdata_executorで行う。
+# Starletteの共有スレッドプール（約40スレッド）とは別に上限を設けることで、重い処理が詰まっても
+# /api/news/at のような軽い読み込みは待たされない（上限を超えた分はスレッドを占有せずキューで待つ）。
+
+CHART_THREADS = int(os.getenv("CHART_THREADS", max(1, CHART_WORKERS) * 2))  # 描画プロセスの結果を待つスレッド数
+LLM_THREADS = int(os.getenv("LLM_THREADS", 1))  # 同時に実行するLLM推論の数
+DATA_THREADS = int(os.getenv("DATA_THREADS", min(4, os.cpu_count() or 1)))  # レスポンスの組み立てを行うスレッド数
+
+chart_executor = ThreadPoolExecutor(max_workers=CHART_THREADS, thread_name_prefix="chart")
+llm_executor = ThreadPoolExecutor(max_workers=LLM_THREADS, thread_name_prefix="llm")
+data_executor = ThreadPoolExecutor(max_workers=DATA_THREADS, thread_name_prefix="data")
+
+
+async def run_in(executor: ThreadPoolExecutor, func, *args, **kwargs):
+    """
+    同期関数を指定したスレッドプールで実行し、結果を待つ
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+
+def shutdown_executors():
+    for executor in (chart_executor, llm_executor, data_executor):
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,119 @@
+import csv
+import io
+import os
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+
+from sqlalchemy import MetaData, select, union_all
+from app.script.db import async_engine
+from app.script.models import NewsArticle, ResampledIndicator
+from app.script.timeframes import BASE_TIMEFRAME, INDICATOR_FIELDS, indicator_model
+from app.script.archive import month_windows
+from app.script.responses import dumps
+
+# 研究用のストリーミングエクスポート（NDJSON / CSV）
+#
+# 期間の上限なしで指標・ニュースを書き出す。サーバー側カーソル（yield_per）で一定件数ずつ読み、
+# 読んだ分だけをエンコードして送るため、期間の長さに関わらずメモリ使用量は一定で、最初のバイトもすぐに届く。
+# 期間は [start, end)（endを含まない）。
+
+_news = NewsArticle.__table__
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 2000))
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+INDICATOR_EXPORT_FIELDS = ["currency_pair", "timestamp"] + INDICATOR_FIELDS
+NEWS_EXPORT_FIELDS = ["id", "category", "title", "summary", "url", "published", "currency_tags"]
+
+
+def _encode(rows, fields: List[str], fmt: str) -> bytes:
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for row in rows:
+            writer.writerow([
+                ";".join(v) if isinstance(v, list) else v.isoformat() if isinstance(v, datetime) else v
+                for v in row
+            ])
+        return buf.getvalue().encode("utf-8")
+    return b"".join(dumps(dict(zip(fields, row))) + b"\n" for row in rows)
+
+
+def _header(fields: List[str]) -> bytes:
+    return (",".join(fields) + "\r\n").encode("utf-8")
+
+
+async def _stream(conn, stmt, fields: List[str], fmt: str, batch_size: int) -> AsyncIterator[bytes]:
+    result = await conn.stream(stmt.execution_options(yield_per=batch_size))
+    async for partition in result.partitions():
+        yield _encode(partition, fields, fmt)
+
+
+async def export_indicators(
+    pair_code: str,
+    start: datetime,
+    end: datetime,
+    timeframe: str = BASE_TIMEFRAME,
+    fmt: str = "ndjson",
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> AsyncIterator[bytes]:
+    """
+    指標を時刻順に書き出す（(currency_pair, timestamp) のインデックスの順に読む）
+    """
+    model = indicator_model(timeframe)
+    stmt = select(*[getattr(model, c) for c in INDICATOR_EXPORT_FIELDS])\
+        .where(model.currency_pair == pair_code, model.timestamp >= start, model.timestamp < end)
+    if model is ResampledIndicator:
+        stmt = stmt.where(model.timeframe == timeframe)
+    stmt = stmt.order_by(model.timestamp)
+
+    if fmt == "csv":
+        yield _header(INDICATOR_EXPORT_FIELDS)
+    async with async_engine.connect() as conn:
+        async for chunk in _stream(conn, stmt, INDICATOR_EXPORT_FIELDS, fmt, batch_size):
+            yield chunk
+
+
+def _news_select(table, start: datetime, end: datetime, category: Optional[str]):
+    stmt = select(*[table.c[c] for c in NEWS_EXPORT_FIELDS])\
+        .where(table.c.published >= start, table.c.published < end)
+    if category:
+        stmt = stmt.where(table.c.category == category)
+    return stmt
+
+
+async def export_news(
+    start: datetime,
+    end: datetime,
+    category: Optional[str] = None,
+    fmt: str = "ndjson",
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> AsyncIterator[bytes]:
+    """
+    ニュースを公開日時順に書き出す（アーカイブ済みの月も含む）
+
+    1か月ずつ読み、その月のアーカイブファイルがあればATTACHしてメインのDBと結合する。
+    ATTACHするのは常に1ファイルだけなので、期間の長さに関わらずATTACHの上限に当たらない。
+    """
+    if fmt == "csv":
+        yield _header(NEWS_EXPORT_FIELDS)
+    async with async_engine.connect() as conn:
+        for lo, hi, path in month_windows(start, end):
+            if path is None:
+                stmt = _news_select(_news, lo, hi, category).order_by(_news.c.published, _news.c.id)
+                async for chunk in _stream(conn, stmt, NEWS_EXPORT_FIELDS, fmt, batch_size):
+                    yield chunk
+                continue
+
+            alias = f"archive_{lo:%Y_%m}"
+            archived = _news.to_metadata(MetaData(), schema=alias)
+            combined = union_all(_news_select(_news, lo, hi, category), _news_select(archived, lo, hi, category)).subquery()
+            stmt = select(combined).order_by(combined.c.published, combined.c.id)
+            await conn.exec_driver_sql(f"ATTACH DATABASE ? AS {alias}", (path,))
+            try:
+                async for chunk in _stream(conn, stmt, NEWS_EXPORT_FIELDS, fmt, batch_size):
+                    yield chunk
+            finally:
+                await conn.rollback()
+                await conn.exec_driver_sql(f"DETACH DATABASE {alias}")
+                await conn.commit()
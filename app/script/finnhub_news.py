@@ -8,6 +8,8 @@ from app.script.debug import debug_printer as d
 from app.script.summarizer import summarize_text
 # 修正：detect_currency_tagsをインポート
 from app.script.utils_scraper import detect_currency_tags
+from app.script.url_canon import is_known_url
+from app.script.data_version import mark_news_changed
 
 class FinnhubNewsCollector:
     """
@@ -236,6 +238,7 @@ class FinnhubNewsCollector:
         new_articles_count = 0
         batch_size = 5  # Finnhubは処理が重いので小さめのバッチサイズ
         current_batch = 0
+        seen_hashes = set()  # 今回処理したURL（未コミット分の重複防止）
 
         try:
             d.print(f"Starting Finnhub news collection (limit: {limit}, last {minutes_back} minutes)", level="info")
@@ -252,15 +255,14 @@ class FinnhubNewsCollector:
             for article_data in finnhub_news:
                 try:
                     # is_currency_related を使った判定は get_forex_news 内で行われているので、ここでは不要
-                    existing = session.query(NewsArticle).filter_by(
-                        url=article_data.get("url")
-                    ).first()
-                    if existing:
+                    # 正規化したURLで重複を判定（要約を生成する前に確認）
+                    if is_known_url(session, article_data.get("url"), seen_hashes):
                         d.print(f"⏩ Article already exists: {article_data.get('headline', 'No title')[:50]}...", level="debug")
                         continue
                     news_article = self.convert_to_news_article(article_data)
                     if news_article:
                         session.add(news_article)
+                        mark_news_changed(session)
                         new_articles_count += 1
                         current_batch += 1
                         d.print(f"✅ New Finnhub article: {news_article.title[:50]}...", level="info")
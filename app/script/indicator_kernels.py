@@ -0,0 +1,277 @@
+import math
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.script.indicators import (
+    INDICATOR_COLUMNS, RSI_LENGTH, MACD_FAST, MACD_SLOW, MACD_SIGNAL,
+    SMA_LENGTH, EMA_LENGTH, BB_LENGTH, BB_STD, ADX_LENGTH,
+)
+from app.script.debug import debug_printer as d
+
+# 履歴再計算用のベクトル化カーネル
+#
+# 入力は (通貨ペア数, 足の本数) のfloat64配列。各ペアの系列は先頭（列0）から詰めて並べ、
+# 長さが足りない分は末尾をNaNで埋める。すべてのカーネルは全ペアを1回で処理する。
+
+_MAX_GROWTH = 1e4  # ブロック内で許容する重みの拡大率（桁落ち防止）
+_WINDOW_CHUNK = 4096  # ローリング計算の累積和をリセットする間隔（誤差の蓄積を抑える）
+
+
+def _linear_recurrence(u: np.ndarray, decay: float) -> np.ndarray:
+    """
+    y[t] = decay * y[t-1] + u[t]（y[-1] = 0）を時間方向にブロック単位でベクトル化して解く
+
+    ブロック内は y[s+j] = decay^j * (decay * y[s-1] + Σ_{i<=j} decay^-i * u[s+i]) を累積和で計算し、
+    ブロック間だけ逐次に繰り越す。decay^-i が大きくなりすぎないようにブロック長を決める。
+    """
+    n_pairs, n_bars = u.shape
+    block = int(math.log(_MAX_GROWTH) / -math.log(decay)) if 0 < decay < 1 else n_bars
+    block = max(1, min(block, 256, n_bars))
+
+    powers = decay ** np.arange(block)
+    inverse = 1.0 / powers
+
+    out = np.empty_like(u)
+    carry = np.zeros(n_pairs)
+    for s in range(0, n_bars, block):
+        e = min(s + block, n_bars)
+        n = e - s
+        y = powers[:n] * (np.cumsum(u[:, s:e] * inverse[:n], axis=1) + decay * carry[:, None])
+        out[:, s:e] = y
+        carry = y[:, -1]
+    return out
+
+
+def rma(x: np.ndarray, length: int) -> np.ndarray:
+    """
+    pandas_ta.rma互換（ewm(alpha=1/length, adjust=True, min_periods=length)）
+    """
+    decay = 1.0 - 1.0 / length
+    valid = ~np.isnan(x)
+    num = _linear_recurrence(np.where(valid, x, 0.0), decay)
+    den = _linear_recurrence(valid.astype(np.float64), decay)
+    count = np.cumsum(valid, axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count >= length, num / den, np.nan)
+
+
+def ema(x: np.ndarray, length: int, start: int = 0) -> np.ndarray:
+    """
+    pandas_ta.ema互換（x[start:start+length]のSMAを初期値にしたewm(adjust=False)）
+
+    Args:
+        start: 系列の最初の有効な列（MACDシグナルのように先頭がNaNの系列用）
+    """
+    alpha = 2.0 / (length + 1)
+    seed = start + length - 1
+    if seed >= x.shape[1]:
+        return np.full_like(x, np.nan)  # 初期値のSMAを計算できるだけの本数が無い
+    u = alpha * x
+    u[:, :seed] = 0.0
+    u[:, seed] = x[:, start:seed + 1].mean(axis=1)
+    out = _linear_recurrence(u, 1.0 - alpha)
+    out[:, :seed] = np.nan
+    return out
+
+
+def rolling_mean_std(x: np.ndarray, length: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    ローリング平均と標準偏差（ddof=0）
+
+    時間方向に分割し、各区間の先頭の値を引いて桁を落とした上で累積和からウィンドウ和を求める。
+    """
+    n_pairs, n_bars = x.shape
+    mean = np.full_like(x, np.nan)
+    std = np.full_like(x, np.nan)
+    for s in range(length - 1, n_bars, _WINDOW_CHUNK):
+        e = min(s + _WINDOW_CHUNK, n_bars)
+        segment = x[:, s - length + 1:e]
+        ref = segment[:, :1]
+        centered = segment - ref
+
+        sums = np.zeros((n_pairs, segment.shape[1] + 1))
+        squares = np.zeros_like(sums)
+        np.cumsum(centered, axis=1, out=sums[:, 1:])
+        np.cumsum(centered * centered, axis=1, out=squares[:, 1:])
+
+        m = (sums[:, length:] - sums[:, :-length]) / length
+        var = (squares[:, length:] - squares[:, :-length]) / length - m * m
+        mean[:, s:e] = m + ref
+        std[:, s:e] = np.sqrt(np.maximum(var, 0.0))
+    return mean, std
+
+
+def _shift(x: np.ndarray) -> np.ndarray:
+    out = np.empty_like(x)
+    out[:, 0] = np.nan
+    out[:, 1:] = x[:, :-1]
+    return out
+
+
+def compute_indicator_arrays(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    全ペア分のテクニカル指標をまとめて計算する
+
+    Args:
+        high, low, close: (ペア数, 本数) のfloat64配列（先頭詰め・末尾NaN埋め）
+
+    Returns:
+        dict: 指標名→(ペア数, 本数) の配列
+    """
+    high, low, close = (np.ascontiguousarray(a, dtype=np.float64) for a in (high, low, close))
+    prev_high, prev_low, prev_close = _shift(high), _shift(low), _shift(close)
+    out = {}
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # 1. RSI
+        delta = close - prev_close
+        pos = rma(np.where(np.isnan(delta), np.nan, np.maximum(delta, 0.0)), RSI_LENGTH)
+        neg = rma(np.where(np.isnan(delta), np.nan, np.maximum(-delta, 0.0)), RSI_LENGTH)
+        out["rsi"] = 100.0 * pos / (pos + neg)
+
+        # 2. MACD
+        macd = ema(close, MACD_FAST) - ema(close, MACD_SLOW)
+        out["macd"] = macd
+        out["macd_signal"] = ema(macd, MACD_SIGNAL, start=MACD_SLOW - 1)
+
+        # 3. SMA / 5. ボリンジャーバンド
+        mean, std = rolling_mean_std(close, SMA_LENGTH)
+        out["sma_20"] = mean
+        if BB_LENGTH != SMA_LENGTH:
+            mean, std = rolling_mean_std(close, BB_LENGTH)
+        out["bb_upper"] = mean + BB_STD * std
+        out["bb_lower"] = mean - BB_STD * std
+
+        # 4. EMA
+        out["ema_50"] = ema(close, EMA_LENGTH)
+
+        # 6. ADX
+        up = high - prev_high
+        dn = prev_low - low
+        missing = np.isnan(up)
+        tr = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(prev_close - low)))
+        tr[missing] = np.nan
+        atr = rma(tr, ADX_LENGTH)
+        dmp = 100.0 * rma(np.where(missing, np.nan, np.where((up > dn) & (up > 0), up, 0.0)), ADX_LENGTH) / atr
+        dmn = 100.0 * rma(np.where(missing, np.nan, np.where((dn > up) & (dn > 0), dn, 0.0)), ADX_LENGTH) / atr
+        dx = 100.0 * np.abs(dmp - dmn) / (dmp + dmn)
+        dx[~np.isfinite(dx)] = np.nan
+        out["adx"] = rma(dx, ADX_LENGTH)
+
+    return out
+
+
+def stack_frames(frames: Dict[str, pd.DataFrame]) -> Tuple[List[str], Dict[str, np.ndarray], np.ndarray]:
+    """
+    ペアごとのDataFrame（High/Low/Close列）を先頭詰めの2次元配列に並べる
+
+    Returns:
+        tuple: (ペアの並び, {"High"/"Low"/"Close": 配列}, ペアごとの本数)
+    """
+    pairs = list(frames)
+    lengths = np.array([len(frames[p]) for p in pairs], dtype=np.int64)
+    n_bars = int(lengths.max()) if len(pairs) else 0
+
+    arrays = {}
+    for col in ["High", "Low", "Close"]:
+        a = np.full((len(pairs), n_bars), np.nan)
+        for i, p in enumerate(pairs):
+            a[i, :lengths[i]] = frames[p][col].to_numpy(dtype=np.float64)
+        arrays[col] = a
+    return pairs, arrays, lengths
+
+
+def compute_indicator_frames(frames: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+    """
+    複数ペアの足から全期間の指標を1回で計算し、ペアごとのDataFrameに戻す
+
+    Returns:
+        dict: 通貨ペア→入力DataFrameに指標列を加えたDataFrame
+    """
+    frames = {p: df for p, df in frames.items() if not df.empty}
+    if not frames:
+        return {}
+
+    pairs, arrays, lengths = stack_frames(frames)
+    values = compute_indicator_arrays(arrays["High"], arrays["Low"], arrays["Close"])
+
+    result = {}
+    for i, p in enumerate(pairs):
+        df = frames[p].copy()
+        for col in INDICATOR_COLUMNS:
+            df[col] = values[col][i, :lengths[i]]
+        result[p] = df
+    return result
+
+
+def check_parity(df: pd.DataFrame, tolerance: float = 1e-6) -> Dict[str, float]:
+    """
+    カーネルの出力をpandas_taと比較する
+
+    Returns:
+        dict: 指標ごとの最大絶対誤差
+    """
+    from app.script.indicators import compute_pandas_ta
+
+    expected = compute_pandas_ta(df)
+    # 長さの違うペアと一緒に計算しても結果が変わらないことも確認する
+    actual = compute_indicator_frames({"target": df, "shorter": df.iloc[: len(df) // 2]})["target"]
+
+    errors = {}
+    for col in INDICATOR_COLUMNS:
+        a, e = actual[col], expected[col]
+        if not (a.isna() == e.isna()).all():
+            raise AssertionError(f"NaN positions differ for {col}")
+        errors[col] = float((a - e).abs().max()) if e.notna().any() else 0.0
+        if errors[col] > tolerance:
+            raise AssertionError(f"{col} differs from pandas_ta: max error {errors[col]}")
+    return errors
+
+
+def benchmark(n_pairs: int = 20, n_bars: int = 2 * 365 * 24, seed: int = 0) -> Dict[str, float]:
+    """
+    ランダムウォークの合成データで、pandas_ta（1ペアずつ）とカーネル（全ペア一括）の処理時間を比較する
+
+    Returns:
+        dict: {"pandas_ta": 秒, "kernels": 秒}
+    """
+    import time
+    from app.script.indicators import compute_pandas_ta
+
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2020-01-01", periods=n_bars, freq="h")
+    frames = {}
+    for i in range(n_pairs):
+        close = 100.0 + np.cumsum(rng.normal(0, 0.1, n_bars))
+        spread = rng.random(n_bars) * 0.2
+        frames[f"PAIR{i}"] = pd.DataFrame({"High": close + spread, "Low": close - spread, "Close": close}, index=index)
+
+    t0 = time.perf_counter()
+    for df in frames.values():
+        compute_pandas_ta(df)
+    t1 = time.perf_counter()
+    compute_indicator_frames(frames)
+    t2 = time.perf_counter()
+    return {"pandas_ta": t1 - t0, "kernels": t2 - t1}
+
+
+if __name__ == "__main__":
+    # 検証・ベンチマーク実行: python -m app.script.indicator_kernels
+    rng = np.random.default_rng(1)
+    close = 150.0 + np.cumsum(rng.normal(0, 0.2, 5000))
+    spread = rng.random(5000) * 0.3
+    sample = pd.DataFrame(
+        {"High": close + spread, "Low": close - spread, "Close": close},
+        index=pd.date_range("2023-01-01", periods=5000, freq="h"),
+    )
+    d.print(f"parity: {check_parity(sample)}", level="debug")
+
+    for n_pairs in [1, 20, 100]:
+        timing = benchmark(n_pairs=n_pairs)
+        d.print(
+            f"{n_pairs} pairs x {2 * 365 * 24} bars: pandas_ta {timing['pandas_ta']:.3f}s, "
+            f"kernels {timing['kernels']:.3f}s ({timing['pandas_ta'] / timing['kernels']:.1f}x)",
+            level="debug",
+        )
@@ -0,0 +1,324 @@
+import copy
+import math
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+import pandas as pd
+from app.script.debug import debug_printer as d
+
+# ストリーミング計算で出力する指標列（TechnicalIndicatorのカラム名と一致）
+INDICATOR_COLUMNS = ["rsi", "macd", "macd_signal", "sma_20", "ema_50", "bb_upper", "bb_lower", "adx"]
+
+# 指標パラメータ（ストリーミングエンジンと履歴再計算カーネルで共通）
+RSI_LENGTH = 14
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+SMA_LENGTH = 20
+EMA_LENGTH = 50
+BB_LENGTH, BB_STD = 20, 2.0
+ADX_LENGTH = 14
+
+NAN = float("nan")
+
+
+def _isnan(x) -> bool:
+    return x is None or x != x
+
+
+class _Rma:
+    """
+    Wilder平滑化（pandas_ta.rma互換: ewm(alpha=1/length, adjust=True, min_periods=length)）
+    """
+
+    def __init__(self, length: int):
+        self.length = length
+        self.decay = 1.0 - 1.0 / length
+        self.num = 0.0
+        self.den = 0.0
+        self.count = 0
+
+    def update(self, x: float) -> float:
+        if _isnan(x):
+            # pandasのignore_na=Falseと同様、欠損でも過去の重みは減衰させる
+            if self.count:
+                self.num *= self.decay
+                self.den *= self.decay
+        else:
+            self.num = self.num * self.decay + x
+            self.den = self.den * self.decay + 1.0
+            self.count += 1
+        return self.num / self.den if self.count >= self.length else NAN
+
+
+class _Ema:
+    """
+    指数移動平均（pandas_ta.ema互換: 最初のlength本のSMAを初期値にしたewm(adjust=False)）
+    """
+
+    def __init__(self, length: int):
+        self.length = length
+        self.alpha = 2.0 / (length + 1)
+        self.seed = []
+        self.value = NAN
+
+    def update(self, x: float) -> float:
+        if _isnan(x):
+            return self.value
+        if self.seed is not None:
+            self.seed.append(x)
+            if len(self.seed) == self.length:
+                self.value = sum(self.seed) / self.length
+                self.seed = None
+            return self.value
+        self.value = self.alpha * x + (1.0 - self.alpha) * self.value
+        return self.value
+
+
+class _Window:
+    """
+    SMA・ボリンジャーバンド用の固定長ローリングウィンドウ
+    """
+
+    def __init__(self, length: int):
+        self.length = length
+        self.values = deque(maxlen=length)
+
+    def update(self, x: float):
+        """
+        Returns:
+            tuple: (平均, 標準偏差(ddof=0))。ウィンドウが埋まるまでは (nan, nan)
+        """
+        if not _isnan(x):
+            self.values.append(x)
+        if len(self.values) < self.length:
+            return NAN, NAN
+        mean = sum(self.values) / self.length
+        var = sum((v - mean) ** 2 for v in self.values) / self.length
+        return mean, math.sqrt(var)
+
+
+class IndicatorEngine:
+    """
+    1通貨ペア分のテクニカル指標を逐次計算するエンジン
+
+    RSI(14)のWilder平均、MACD(12,26,9)とEMA50のEMA状態、SMA20・BB(20,2)のウィンドウ、
+    ADX(14)の平滑化状態を保持し、新しい足ごとにO(1)で指標を更新する。
+    計算結果はpandas_taの同名関数と一致する（check_parityで検証）。
+    """
+
+    def __init__(self):
+        self.last_timestamp = None
+        self._prev = None  # 直前の足 (high, low, close)
+        self._snapshot = None  # 最新足を適用する前の状態（未確定足の再計算用）
+
+        self._rsi_pos = _Rma(RSI_LENGTH)
+        self._rsi_neg = _Rma(RSI_LENGTH)
+        self._ema_fast = _Ema(MACD_FAST)
+        self._ema_slow = _Ema(MACD_SLOW)
+        self._macd_signal = _Ema(MACD_SIGNAL)
+        self._ema_50 = _Ema(EMA_LENGTH)
+        self._sma_window = _Window(SMA_LENGTH)
+        self._bb_window = self._sma_window if BB_LENGTH == SMA_LENGTH else _Window(BB_LENGTH)
+        self._atr = _Rma(ADX_LENGTH)
+        self._dm_pos = _Rma(ADX_LENGTH)
+        self._dm_neg = _Rma(ADX_LENGTH)
+        self._adx = _Rma(ADX_LENGTH)
+
+    def _state(self):
+        return {k: v for k, v in self.__dict__.items() if k not in ("_snapshot", "last_timestamp")}
+
+    def _restore(self, state):
+        self.__dict__.update(state)
+
+    def update(self, timestamp, high: float, low: float, close: float, revisable: bool = True) -> Optional[Dict[str, float]]:
+        """
+        足を1本追加して指標を更新する
+
+        Args:
+            timestamp: 足の時刻
+            high, low, close: 高値・安値・終値
+            revisable: Trueの場合、同じ時刻の足が再度来たときに差し替えられるよう状態を保存する
+                       （yfinanceの最新足は確定前の値のため）
+
+        Returns:
+            dict: 指標名→値。既に処理済みの古い足の場合はNone
+        """
+        if self.last_timestamp is not None:
+            if timestamp < self.last_timestamp:
+                return None
+            if timestamp == self.last_timestamp:
+                if self._snapshot is None:
+                    return None
+                # 未確定だった最新足を差し替える
+                self._restore(copy.deepcopy(self._snapshot))
+            else:
+                self._snapshot = None
+        if revisable:
+            self._snapshot = copy.deepcopy(self._state())
+        self.last_timestamp = timestamp
+
+        values = {}
+
+        # 1. RSI
+        if self._prev is not None:
+            delta = close - self._prev[2]
+            pos_avg = self._rsi_pos.update(delta if delta > 0 else 0.0)
+            neg_avg = self._rsi_neg.update(-delta if delta < 0 else 0.0)
+        else:
+            pos_avg = neg_avg = NAN
+        values["rsi"] = 100.0 * pos_avg / (pos_avg + neg_avg) if (pos_avg + neg_avg) else NAN
+
+        # 2. MACD
+        macd = self._ema_fast.update(close) - self._ema_slow.update(close)
+        values["macd"] = macd
+        values["macd_signal"] = self._macd_signal.update(macd)
+
+        # 3. SMA / 5. ボリンジャーバンド
+        mean, std = self._sma_window.update(close)
+        values["sma_20"] = mean
+        if self._bb_window is not self._sma_window:
+            mean, std = self._bb_window.update(close)
+        values["bb_upper"] = mean + BB_STD * std
+        values["bb_lower"] = mean - BB_STD * std
+
+        # 4. EMA
+        values["ema_50"] = self._ema_50.update(close)
+
+        # 6. ADX
+        if self._prev is not None:
+            prev_high, prev_low, prev_close = self._prev
+            up = high - prev_high
+            dn = prev_low - low
+            tr = max(high - low, abs(high - prev_close), abs(prev_close - low))
+            atr = self._atr.update(tr)
+            dmp = self._dm_pos.update(up if (up > dn and up > 0) else 0.0)
+            dmn = self._dm_neg.update(dn if (dn > up and dn > 0) else 0.0)
+            if _isnan(atr) or atr == 0:
+                dx = NAN
+            else:
+                dmp, dmn = 100.0 * dmp / atr, 100.0 * dmn / atr
+                dx = 100.0 * abs(dmp - dmn) / (dmp + dmn) if (dmp + dmn) else NAN
+            values["adx"] = self._adx.update(dx)
+        else:
+            values["adx"] = NAN
+
+        self._prev = (high, low, close)
+        return values
+
+    def update_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        DataFrame（High/Low/Close列、時刻インデックス）のうち未処理の足だけを処理する
+
+        Returns:
+            pd.DataFrame: 今回処理した足の指標（インデックスはdfと同じ時刻）
+        """
+        if self.last_timestamp is not None:
+            df = df[df.index >= self.last_timestamp]
+
+        index = []
+        rows = []
+        last = len(df) - 1
+        for i, (ts, high, low, close) in enumerate(zip(df.index, df["High"], df["Low"], df["Close"])):
+            # 途中の足は確定済みなので、最新足の前の状態だけを保存すれば十分
+            values = self.update(ts, float(high), float(low), float(close), revisable=(i == last))
+            if values is not None:
+                index.append(ts)
+                rows.append(values)
+
+        return pd.DataFrame(rows, index=pd.Index(index, name=df.index.name), columns=INDICATOR_COLUMNS)
+
+
+# 通貨ペアごとのエンジン（プロセス内で保持）
+_engines: Dict[str, IndicatorEngine] = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(key: str) -> IndicatorEngine:
+    """
+    キー（通貨ペアなど）に対応するエンジンを取得する。無ければ作成する
+    """
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = _engines[key] = IndicatorEngine()
+        return engine
+
+
+def reset_engine(key: str):
+    """
+    エンジンの状態を破棄する（次回は全期間から再計算される）
+    """
+    with _engines_lock:
+        _engines.pop(key, None)
+
+
+def compute_pandas_ta(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    pandas_taで全期間の指標を計算する（エンジンの検証用リファレンス）
+    """
+    import pandas_ta as ta
+
+    out = pd.DataFrame(index=df.index)
+    out["rsi"] = ta.rsi(df["Close"], length=RSI_LENGTH)
+    macd = ta.macd(df["Close"], fast=MACD_FAST, slow=MACD_SLOW, signal=MACD_SIGNAL)
+    out["macd"] = macd.iloc[:, 0]
+    out["macd_signal"] = macd.iloc[:, 2]
+    out["sma_20"] = ta.sma(df["Close"], length=SMA_LENGTH)
+    out["ema_50"] = ta.ema(df["Close"], length=EMA_LENGTH)
+    bb = ta.bbands(df["Close"], length=BB_LENGTH, std=BB_STD)
+    out["bb_upper"] = bb.iloc[:, 2]
+    out["bb_lower"] = bb.iloc[:, 0]
+    out["adx"] = ta.adx(df["High"], df["Low"], df["Close"], length=ADX_LENGTH).iloc[:, 0]
+    return out
+
+
+def check_parity(df: pd.DataFrame, split: int = 24, tolerance: float = 1e-6) -> Dict[str, float]:
+    """
+    エンジンの出力をpandas_taと比較する
+
+    最後のsplit本を除いた足でエンジンを初期化し、残りを1本ずつ（最新足の差し替えも含めて）
+    流し込んだ結果を、全期間をpandas_taで計算した結果と比較する。
+
+    Args:
+        df: High/Low/Close列を持つDataFrame
+        split: 逐次投入する足の本数
+        tolerance: 許容する最大誤差
+
+    Returns:
+        dict: 指標ごとの最大絶対誤差
+    """
+    expected = compute_pandas_ta(df)
+
+    engine = IndicatorEngine()
+    parts = [engine.update_frame(df.iloc[:-split])]
+    for i in range(len(df) - split, len(df)):
+        # 確定前の値で一度処理してから、確定値で差し替える
+        provisional = df.iloc[i:i + 1].copy()
+        provisional["Close"] = provisional["Close"] * 1.001
+        engine.update_frame(provisional)
+        parts.append(engine.update_frame(df.iloc[i:i + 1]))
+    actual = pd.concat(parts)
+
+    errors = {}
+    for col in INDICATOR_COLUMNS:
+        a, e = actual[col], expected[col]
+        if not (a.isna() == e.isna()).all():
+            raise AssertionError(f"NaN positions differ for {col}")
+        errors[col] = float((a - e).abs().max()) if e.notna().any() else 0.0
+        if errors[col] > tolerance:
+            raise AssertionError(f"{col} differs from pandas_ta: max error {errors[col]}")
+    return errors
+
+
+if __name__ == "__main__":
+    # 検証実行: python -m app.script.indicators
+    import yfinance as yf
+    from datetime import datetime, timedelta
+
+    for pair in ["USDJPY", "EURUSD", "EURJPY"]:
+        end = datetime.today()
+        df = yf.download(pair + "=X", start=end - timedelta(days=30), end=end, interval="1h")
+        if isinstance(df.columns, pd.MultiIndex):
+            df.columns = [col[0] for col in df.columns]
+        errors = check_parity(df)
+        d.print(f"{pair}: {len(df)} bars, max errors {errors}", level="debug")
@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.script.models import LatestIndicator
+from app.script.indicators import INDICATOR_COLUMNS
+
+# 通貨ペアごとの最新の指標
+#
+# latest_indicatorsテーブル（1ペア1行）と、プロセス内のミラーで保持する。
+# テーブルは指標の保存と同じトランザクションで更新し、ミラーはそのコミットが成功した後に更新する。
+# 別のプロセス（recompute_historyの手動実行など）が更新した場合に備え、ミラーの値はLATEST_TTL秒で読み直す。
+
+LATEST_TTL = float(os.getenv("LATEST_TTL", 60))
+LATEST_FIELDS = ["timestamp", "close"] + INDICATOR_COLUMNS
+
+_mirror: Dict[str, tuple] = {}  # 通貨ペア→(値のdict, 期限)
+_mirror_lock = threading.Lock()
+_PENDING_KEY = "latest_indicators_pending"
+
+
+def _remember(pair_code: str, values: dict):
+    with _mirror_lock:
+        current = _mirror.get(pair_code)
+        # 古い足で上書きしない（テーブル側のON CONFLICT条件と同じ）
+        if current is not None and current[0]["timestamp"] > values["timestamp"]:
+            return
+        _mirror[pair_code] = (values, time.monotonic() + LATEST_TTL)
+
+
+def update_latest(session, pair_code: str, row: dict):
+    """
+    最新の指標を更新する（コミットは呼び出し側。既に新しい時刻の行がある場合は何もしない）
+
+    Args:
+        row: TechnicalIndicatorの1行分のdict（collect.indicator_rowsの要素）
+    """
+    values = {field: row.get(field) for field in LATEST_FIELDS}
+    stmt = sqlite_insert(LatestIndicator).values(currency_pair=pair_code, **values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["currency_pair"],
+        set_={field: stmt.excluded[field] for field in LATEST_FIELDS},
+        where=stmt.excluded.timestamp >= LatestIndicator.timestamp,
+    )
+    session.execute(stmt)
+    # ミラーへの反映はコミット後（after_commit）
+    session.info.setdefault(_PENDING_KEY, {})[pair_code] = values
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session):
+    for pair_code, values in session.info.pop(_PENDING_KEY, {}).items():
+        _remember(pair_code, values)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def get_latest(session, pair_code: str) -> Optional[dict]:
+    """
+    通貨ペアの最新の指標を返す（ミラー→latest_indicatorsの主キー検索の順）
+
+    Returns:
+        dict: timestamp・close・各指標の値。無ければNone
+    """
+    with _mirror_lock:
+        cached = _mirror.get(pair_code)
+    if cached is not None and cached[1] > time.monotonic():
+        return cached[0]
+
+    latest = session.get(LatestIndicator, pair_code)
+    if latest is None:
+        return None
+    values = {field: getattr(latest, field) for field in LATEST_FIELDS}
+    with _mirror_lock:
+        _mirror[pair_code] = (values, time.monotonic() + LATEST_TTL)
+    return values
+
+
+def clear_mirror():
+    with _mirror_lock:
+        _mirror.clear()
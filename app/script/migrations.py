@@ -0,0 +1,301 @@
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import or_, select, text
+from sqlalchemy.exc import OperationalError
+from app.script.models import Base, NewsArticle, TechnicalIndicator, CURRENCY_BITS, bigram_text, matching_masks
+from app.script.url_canon import url_hash
+from app.script.debug import debug_printer as d
+
+# スキーマのマイグレーション
+#
+# テーブル自体はBase.metadata.create_allで作成し（新しいテーブルはそのまま追加される）、
+# 既存のDBに対する変更（インデックスやカラムの追加など）は番号付きのマイグレーションとして適用する。
+# 適用済みの番号はschema_migrationsテーブルに記録し、各マイグレーションは1回だけ実行される。
+# 新しいDBではcreate_allで既に作成済みの場合もあるため、各ステップは冪等に書くこと。
+
+
+def _column_exists(conn, table: str, column: str) -> bool:
+    return any(row[1] == column for row in conn.exec_driver_sql(f"PRAGMA table_info({table})"))
+
+
+def add_column(conn, table: str, column: str, ddl: str):
+    """
+    カラムが無ければ追加する（ALTER TABLE ... ADD COLUMN）
+    """
+    if not _column_exists(conn, table, column):
+        conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+
+def _news_article_indexes(conn):
+    # /api/news/at, /api/signal_data, /api/qwen_signal の期間絞り込み
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_news_articles_published ON news_articles (published)")
+    # Finnhubニュースの重複チェック
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_news_articles_url ON news_articles (url)")
+    # RSSニュースの重複チェック
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_news_articles_title_published ON news_articles (title, published)"
+    )
+
+
+def _news_currency_mask(conn):
+    add_column(conn, "news_articles", "currency_mask", "INTEGER DEFAULT 0")
+    # 既存の行はcurrency_tags（JSON配列）から埋める
+    bits = " + ".join(
+        f"(CASE WHEN EXISTS (SELECT 1 FROM json_each(news_articles.currency_tags) WHERE value = '{code}') "
+        f"THEN {bit} ELSE 0 END)"
+        for code, bit in CURRENCY_BITS.items()
+    )
+    conn.exec_driver_sql(
+        f"UPDATE news_articles SET currency_mask = CASE WHEN json_valid(currency_tags) THEN {bits} ELSE 0 END"
+    )
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_news_articles_currency_mask_published "
+        "ON news_articles (currency_mask, published)"
+    )
+
+
+def _fts_triggers(conn, table: str, columns: List[str]):
+    # news_articlesの変更をトリガーで全文検索インデックスに反映する
+    names = ", ".join(columns)
+    new = ", ".join(f"new.{c}" for c in columns)
+    old = ", ".join(f"old.{c}" for c in columns)
+    conn.exec_driver_sql(
+        f"CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON news_articles BEGIN "
+        f"INSERT INTO {table} (rowid, {names}) VALUES (new.id, {new}); END"
+    )
+    conn.exec_driver_sql(
+        f"CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON news_articles BEGIN "
+        f"INSERT INTO {table} ({table}, rowid, {names}) VALUES ('delete', old.id, {old}); END"
+    )
+    conn.exec_driver_sql(
+        f"CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE OF {names} ON news_articles BEGIN "
+        f"INSERT INTO {table} ({table}, rowid, {names}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {table} (rowid, {names}) VALUES (new.id, {new}); END"
+    )
+    # 既存の記事をインデックスに登録
+    conn.exec_driver_sql(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+
+
+def _news_fts(conn):
+    # 日本語の要約も検索できるよう、分かち書き不要のtrigramトークナイザを優先する（SQLite 3.34以降）
+    for tokenizer in ["trigram", "unicode61"]:
+        try:
+            conn.exec_driver_sql(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS news_fts USING fts5("
+                f"title, summary, content='news_articles', content_rowid='id', tokenize='{tokenizer}')"
+            )
+            break
+        except OperationalError as e:
+            if "no such module" in str(e):
+                d.print("SQLite was built without FTS5, skipping news_fts", level='warning')
+                return
+            d.print(f"FTS5 tokenizer {tokenizer} is not available: {str(e)}", level='warning')
+    else:
+        return
+    _fts_triggers(conn, "news_fts", ["title", "summary"])
+
+    # trigramでは検索できない2文字以下の語（日銀、円など）用に、2文字ずつのトークン（bigram_text）を別に索引する
+    add_column(conn, "news_articles", "title_bigrams", "VARCHAR")
+    add_column(conn, "news_articles", "summary_bigrams", "VARCHAR")
+    updates = [
+        (bigram_text(title), bigram_text(summary), article_id)
+        for article_id, title, summary in conn.exec_driver_sql("SELECT id, title, summary FROM news_articles")
+    ]
+    if updates:
+        conn.exec_driver_sql("UPDATE news_articles SET title_bigrams = ?, summary_bigrams = ? WHERE id = ?", updates)
+    # 1文字の語は前方一致で検索するため、1文字の接頭辞も索引する
+    conn.exec_driver_sql(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS news_fts_bigram USING fts5("
+        "title_bigrams, summary_bigrams, content='news_articles', content_rowid='id', "
+        "tokenize='unicode61', prefix='1')"
+    )
+    _fts_triggers(conn, "news_fts_bigram", ["title_bigrams", "summary_bigrams"])
+
+
+def _incremental_vacuum(conn):
+    # archive.pyで古い記事を移した後、DB全体を書き直すVACUUMの代わりにPRAGMA incremental_vacuumで空きページを解放する
+    # auto_vacuumの変更はテーブル作成後のDBでは次のVACUUMで反映されるため、ここで1回だけVACUUMする
+    # （VACUUMはトランザクション内では実行できないため、このマイグレーションでは他の書き込みより先に実行すること）
+    conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+    if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+        conn.exec_driver_sql("VACUUM")
+
+
+def _news_url_hash(conn):
+    add_column(conn, "news_articles", "url_hash", "VARCHAR")
+    # 既存の行は正規化したURLから埋める。同じURLの記事が既に複数ある場合は、最初の記事だけにハッシュを設定する
+    seen = set()
+    updates = []
+    for article_id, url in conn.exec_driver_sql("SELECT id, url FROM news_articles ORDER BY id"):
+        value = url_hash(url)
+        if value in seen:
+            value = None
+        elif value is not None:
+            seen.add(value)
+        updates.append((value, article_id))
+    if updates:
+        conn.exec_driver_sql("UPDATE news_articles SET url_hash = ? WHERE id = ?", updates)
+    conn.exec_driver_sql("CREATE UNIQUE INDEX IF NOT EXISTS uq_news_articles_url_hash ON news_articles (url_hash)")
+
+
+def _latest_indicators(conn):
+    # テーブルはcreate_allで作成済み。既存の指標から各ペアの最新行を写す
+    conn.exec_driver_sql(
+        "INSERT OR REPLACE INTO latest_indicators "
+        "(currency_pair, timestamp, close, rsi, macd, macd_signal, sma_20, ema_50, bb_upper, bb_lower, adx) "
+        "SELECT t.currency_pair, t.timestamp, t.close, t.rsi, t.macd, t.macd_signal, t.sma_20, t.ema_50, "
+        "t.bb_upper, t.bb_lower, t.adx FROM technical_indicators t "
+        "JOIN (SELECT currency_pair, max(timestamp) AS timestamp FROM technical_indicators GROUP BY currency_pair) m "
+        "ON t.currency_pair = m.currency_pair AND t.timestamp = m.timestamp"
+    )
+
+
+# (番号, 名前, 処理) のリスト。番号は昇順に追加し、適用済みのものは変更しないこと
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, "news_article_indexes", _news_article_indexes),
+    (2, "news_currency_mask", _news_currency_mask),
+    (3, "news_fts", _news_fts),
+    (4, "incremental_vacuum", _incremental_vacuum),
+    (5, "news_url_hash", _news_url_hash),
+    (6, "latest_indicators", _latest_indicators),
+]
+
+
+def applied_versions(conn) -> set:
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, name VARCHAR NOT NULL, applied_at DATETIME NOT NULL)"
+    )
+    return {row[0] for row in conn.exec_driver_sql("SELECT version FROM schema_migrations")}
+
+
+def run_migrations(engine) -> List[int]:
+    """
+    テーブルを作成し、未適用のマイグレーションを順に適用する
+
+    Returns:
+        list: 今回適用したマイグレーションの番号
+    """
+    Base.metadata.create_all(bind=engine)
+
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+
+    applied = []
+    for version, name, migrate in MIGRATIONS:
+        if version in done:
+            continue
+        # マイグレーションごとに1トランザクション（途中で失敗した場合は次回やり直す）
+        with engine.begin() as conn:
+            migrate(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:version, :name, :applied_at)"),
+                {"version": version, "name": name, "applied_at": datetime.now().isoformat(sep=" ")},
+            )
+        d.print(f"Applied migration {version}: {name}", level='debug')
+        applied.append(version)
+    return applied
+
+
+def hot_queries() -> Dict[str, Tuple[object, str]]:
+    """
+    インデックスが必要な主要クエリと、使われるべきインデックス名
+
+    Returns:
+        dict: クエリ名→(SELECT文, インデックス名)
+    """
+    now = datetime.now()
+    return {
+        # /api/signal_data, /api/qwen_signal
+        "recent_news": (
+            select(NewsArticle).where(NewsArticle.published >= now - timedelta(hours=24))
+            .order_by(NewsArticle.published.desc()).limit(20),
+            "ix_news_articles_published",
+        ),
+        # /api/news/at
+        "news_at": (
+            select(NewsArticle).where(NewsArticle.published >= now - timedelta(hours=24), NewsArticle.published <= now)
+            .order_by(NewsArticle.published.desc(), NewsArticle.id.desc()).limit(10),
+            "ix_news_articles_published",
+        ),
+        # /api/news/at の2ページ目以降（cursorの位置からインデックスを読み始める）
+        "news_at_keyset": (
+            select(NewsArticle).where(
+                NewsArticle.published >= now - timedelta(hours=24), NewsArticle.published <= now - timedelta(hours=1),
+                or_(NewsArticle.published < now - timedelta(hours=1), NewsArticle.id < 1000),
+            ).order_by(NewsArticle.published.desc(), NewsArticle.id.desc()).limit(10),
+            "ix_news_articles_published",
+        ),
+        # /api/news/at の通貨フィルタ（any）
+        "news_at_currencies": (
+            select(NewsArticle).where(
+                NewsArticle.currency_mask.in_(matching_masks(CURRENCY_BITS["USD"], "any")),
+                NewsArticle.published >= now - timedelta(hours=24), NewsArticle.published <= now,
+            ).order_by(NewsArticle.published.desc()).limit(10),
+            "ix_news_articles_currency_mask_published",
+        ),
+        # FinnhubNewsCollector.fetch_and_store_finnhub_news, fetch_and_store_rss（スクレイピング前の重複チェック）
+        "url_hash_dedup": (
+            select(NewsArticle.id).where(NewsArticle.url_hash == url_hash("https://example.com/news")).limit(1),
+            "uq_news_articles_url_hash",
+        ),
+        # /api/compare/indicators, /compare/visualization（複数ペアを1回で読み込む）
+        "indicators_multi_pair": (
+            select(TechnicalIndicator.timestamp, TechnicalIndicator.close).where(
+                TechnicalIndicator.currency_pair.in_(["USDJPY", "EURJPY"]),
+                TechnicalIndicator.timestamp >= now - timedelta(days=7), TechnicalIndicator.timestamp <= now,
+            ).order_by(TechnicalIndicator.currency_pair, TechnicalIndicator.timestamp),
+            "sqlite_autoindex_technical_indicators_1",  # uq_pair_time
+        ),
+        # fetch_and_store_rss
+        "rss_dedup": (
+            select(NewsArticle).where(NewsArticle.title == "title", NewsArticle.published == now).limit(1),
+            "ix_news_articles_title_published",
+        ),
+    }
+
+
+def explain_query_plan(conn, stmt) -> List[str]:
+    """
+    SELECT文のEXPLAIN QUERY PLANの各行（detail列）を返す
+    """
+    compiled = stmt.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    params = [compiled.params[name] for name in compiled.positiontup]
+    params = [str(p) if isinstance(p, datetime) else p for p in params]
+    return [row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), tuple(params))]
+
+
+def check_query_plans(engine) -> Dict[str, List[str]]:
+    """
+    主要クエリがフルスキャンにならず、想定したインデックスを使うことを確認する
+
+    Returns:
+        dict: クエリ名→クエリプラン
+    """
+    plans = {}
+    with engine.connect() as conn:
+        for name, (stmt, index) in hot_queries().items():
+            plan = explain_query_plan(conn, stmt)
+            plans[name] = plan
+            if not any(index in line for line in plan):
+                raise AssertionError(f"{name} does not use {index}: {plan}")
+            if any(line.startswith("SCAN") and "INDEX" not in line for line in plan):
+                raise AssertionError(f"{name} scans a table: {plan}")
+    return plans
+
+
+if __name__ == "__main__":
+    # 検証実行: python -m app.script.migrations
+    # 空のDBにマイグレーションを適用し、主要クエリのクエリプランを確認する
+    import os
+    import tempfile
+    from app.script.db import create_db_engine
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(f"sqlite:///{os.path.join(tmp, 'migrations.sqlite')}")
+        d.print(f"applied: {run_migrations(engine)}", level="debug")
+        d.print(f"re-run applied: {run_migrations(engine)}", level="debug")
+        for name, plan in check_query_plans(engine).items():
+            d.print(f"{name}: {plan}", level="debug")
+        engine.dispose()
@@ -1,8 +1,55 @@
+import re
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, Float, String, DateTime, UniqueConstraint, JSON
+from sqlalchemy.orm import validates
+from app.script.url_canon import url_hash
+from sqlalchemy import Column, Integer, Float, String, DateTime, UniqueConstraint, Index, JSON
 
 Base = declarative_base()
 
+# ニュースの通貨タグのビット（news_articles.currency_maskに保存）
+CURRENCY_BITS = {"USD": 1, "EUR": 2, "JPY": 4}
+
+
+def currency_mask(tags) -> int:
+    """
+    通貨タグのリストをビットマスクに変換する（未対応の通貨は無視）
+    """
+    mask = 0
+    for tag in tags or []:
+        mask |= CURRENCY_BITS.get(str(tag).upper(), 0)
+    return mask
+
+
+_WORD_RUN = re.compile(r"[^\W_]+")
+
+
+def bigram_text(text) -> str:
+    """
+    文字列を2文字ずつのトークン（空白区切り）に変換する（news_articles.title_bigrams, summary_bigramsに保存）
+
+    記号や空白で区切られた各部分について、重なりのある2文字の組と最後の1文字をトークンにする。
+    2文字の語はトークンとの完全一致、1文字の語は前方一致で検索できる（分かち書き不要）。
+    例: "日銀の利上げ" → "日銀 銀の の利 利上 上げ げ"
+    """
+    tokens = []
+    for run in _WORD_RUN.findall((text or "").lower()):
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        tokens.append(run[-1])
+    return " ".join(tokens)
+
+
+def matching_masks(mask: int, match: str = "exact") -> list:
+    """
+    通貨フィルタに一致するcurrency_maskの値の一覧
+
+    Args:
+        mask: 指定された通貨のビットマスク
+        match: "exact"（指定した通貨のみを含む）または "any"（指定した通貨のいずれかを含む）
+    """
+    if match == "exact":
+        return [mask]
+    return [m for m in range(1, 1 << len(CURRENCY_BITS)) if m & mask]
+
 class TechnicalIndicator(Base):
     __tablename__ = 'technical_indicators'
     id = Column(Integer, primary_key=True)
@@ -22,6 +69,67 @@ class TechnicalIndicator(Base):
         UniqueConstraint('currency_pair', 'timestamp', name='uq_pair_time'),
     )
 
+# 1時間足から集約した上位足（4h, 1d）のテクニカル指標
+class ResampledIndicator(Base):
+    __tablename__ = 'resampled_indicators'
+    id = Column(Integer, primary_key=True)
+    currency_pair = Column(String)
+    timeframe = Column(String)
+    timestamp = Column(DateTime)
+    close = Column(Float)
+    rsi = Column(Float)
+    macd = Column(Float)
+    macd_signal = Column(Float)
+    sma_20 = Column(Float)
+    ema_50 = Column(Float)
+    bb_upper = Column(Float)
+    bb_lower = Column(Float)
+    adx = Column(Float)
+
+    __table_args__ = (
+        UniqueConstraint('currency_pair', 'timeframe', 'timestamp', name='uq_pair_timeframe_time'),
+    )
+
+# 通貨ペアごとの最新の指標（technical_indicatorsの最新行の写し、collect.store_indicatorsで更新）
+class LatestIndicator(Base):
+    __tablename__ = 'latest_indicators'
+    currency_pair = Column(String, primary_key=True)
+    timestamp = Column(DateTime)
+    close = Column(Float)
+    rsi = Column(Float)
+    macd = Column(Float)
+    macd_signal = Column(Float)
+    sma_20 = Column(Float)
+    ema_50 = Column(Float)
+    bb_upper = Column(Float)
+    bb_lower = Column(Float)
+    adx = Column(Float)
+
+# アーカイブ（archive.py）に移した記事のurl_hash（メインのDBから消えた記事も重複として判定するため）
+class ArchivedUrlHash(Base):
+    __tablename__ = 'archived_url_hashes'
+    url_hash = Column(String, primary_key=True)
+
+class DataVersion(Base):
+    __tablename__ = 'data_versions'
+    key = Column(String, primary_key=True)  # 通貨ペアコード、またはニュース（data_version.NEWS_KEY）
+    version = Column(Integer, nullable=False, default=0)  # 書き込みをコミットするたびに1ずつ増える
+
+class Candle(Base):
+    __tablename__ = 'candles'
+    id = Column(Integer, primary_key=True)
+    currency_pair = Column(String)
+    timestamp = Column(DateTime)
+    open = Column(Float)
+    high = Column(Float)
+    low = Column(Float)
+    close = Column(Float)
+    volume = Column(Float)
+
+    __table_args__ = (
+        UniqueConstraint('currency_pair', 'timestamp', name='uq_candle_pair_time'),
+    )
+
 class NewsArticle(Base):
     __tablename__ = 'news_articles'
     id = Column(Integer, primary_key=True)
@@ -29,5 +137,39 @@ class NewsArticle(Base):
     title = Column(String)
     summary = Column(String)
     url = Column(String)
+    url_hash = Column(String)  # 正規化したURLのハッシュ（重複記事の判定用）
     published = Column(DateTime)
     currency_tags = Column(JSON, default=[])
+    currency_mask = Column(Integer, default=0)  # currency_tagsのビットマスク（通貨フィルタ用）
+    title_bigrams = Column(String)  # bigram_text(title)（2文字以下の語の全文検索用）
+    summary_bigrams = Column(String)  # bigram_text(summary)
+
+    # 既存のDBにはmigrations.pyで追加する
+    __table_args__ = (
+        Index('ix_news_articles_published', 'published'),
+        Index('ix_news_articles_url', 'url'),
+        Index('ix_news_articles_title_published', 'title', 'published'),
+        Index('ix_news_articles_currency_mask_published', 'currency_mask', 'published'),
+        Index('uq_news_articles_url_hash', 'url_hash', unique=True),
+    )
+
+    @validates('title')
+    def _set_title_bigrams(self, key, title):
+        self.title_bigrams = bigram_text(title)
+        return title
+
+    @validates('summary')
+    def _set_summary_bigrams(self, key, summary):
+        self.summary_bigrams = bigram_text(summary)
+        return summary
+
+    @validates('url')
+    def _set_url_hash(self, key, url):
+        self.url_hash = url_hash(url)
+        return url
+
+    @validates('currency_tags')
+    def _set_currency_mask(self, key, tags):
+        # 収集側はcurrency_tagsを設定するだけで、currency_maskも常に一致する
+        self.currency_mask = currency_mask(tags)
+        return tags
@@ -9,6 +9,8 @@ from app.script.models import NewsArticle
 from app.script.debug import debug_printer as d
 from app.script.utils_scraper import extract_article_text, detect_currency_tags
 from app.script.summarizer import summarize_text
+from app.script.url_canon import is_known_url
+from app.script.data_version import mark_news_changed
 # Finnhub APIの追加
 from app.script.finnhub_news import fetch_finnhub_forex_news
 
@@ -109,6 +111,7 @@ def fetch_and_store_rss():
     total_added = 0
     batch_size = 10  # バッチサイズを設定
     current_batch = 0
+    seen_hashes = set()  # 今回処理したURL（未コミット分・フィード間の重複防止）
 
     try:
         # 1. 時間フィルタリング対応フィードを先に処理（効率的）
@@ -144,7 +147,9 @@ def fetch_and_store_rss():
                             total_processed += 1
                             
                             published = datetime(*entry.published_parsed[:6]) if entry.get("published_parsed") else datetime.now()
-                            exists = session.query(NewsArticle).filter_by(title=entry.title, published=published).first()
+                            # 正規化したURL、またはタイトルと公開日時で重複を判定（スクレイピングの前に確認）
+                            exists = is_known_url(session, entry.link, seen_hashes) or \
+                                session.query(NewsArticle).filter_by(title=entry.title, published=published).first()
                             if exists:
                                 d.print(f"⏩ skip article: {entry.title[:50]}... (already exists)", output_path="./data/fetch_and_store_rss.log")
                                 continue
@@ -192,6 +197,7 @@ def fetch_and_store_rss():
                                 currency_tags=currency_tags
                             )
                             session.add(article)
+                            mark_news_changed(session)
                             total_added += 1
                             current_batch += 1
                             d.print(f"✅ Added time-filtered RSS article: {entry.title[:50]}...", level="debug")
@@ -235,7 +241,9 @@ def fetch_and_store_rss():
                                 continue
                             
                             published = datetime(*entry.published_parsed[:6]) if entry.get("published_parsed") else datetime.now()
-                            exists = session.query(NewsArticle).filter_by(title=entry.title, published=published).first()
+                            # 正規化したURL、またはタイトルと公開日時で重複を判定（スクレイピングの前に確認）
+                            exists = is_known_url(session, entry.link, seen_hashes) or \
+                                session.query(NewsArticle).filter_by(title=entry.title, published=published).first()
                             if exists:
                                 d.print(f"⏩ skip article: {entry.title[:50]}... (already exists)", output_path="./data/fetch_and_store_rss.log")
                                 continue
@@ -283,6 +291,7 @@ def fetch_and_store_rss():
                                 currency_tags=currency_tags
                             )
                             session.add(article)
+                            mark_news_changed(session)
                             total_added += 1
                             current_batch += 1
                             d.print(f"✅ Added standard RSS article: {entry.title[:50]}...", level="debug")
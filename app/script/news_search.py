@@ -0,0 +1,151 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import bindparam, text
+from app.script.models import NewsArticle, bigram_text, currency_mask, matching_masks
+
+# ニュースの全文検索（FTS5、テーブルとトリガーはmigrations.pyで作成）
+NEWS_FTS_TABLE = "news_fts"
+NEWS_BIGRAM_TABLE = "news_fts_bigram"  # 2文字以下の語用（title_bigrams, summary_bigrams）
+MIN_TERM_LENGTH = 3  # trigramトークナイザで検索できる最短の語の長さ
+TITLE_WEIGHT, SUMMARY_WEIGHT = 2.0, 1.0  # bm25の列ごとの重み（タイトルの一致を優先）
+
+
+def fts_available(session, name: str = NEWS_FTS_TABLE) -> bool:
+    """
+    FTS5のテーブルが作成済みか（SQLiteがFTS5無しでビルドされている場合は作成されない）
+    """
+    return session.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": name}
+    ).first() is not None
+
+
+def split_terms(query: str) -> List[str]:
+    return [term for term in query.split() if term]
+
+
+def fts_query(terms: List[str]) -> str:
+    """
+    検索語をFTS5のクエリに変換する（各語をフレーズとして扱い、すべてを含む記事に一致）
+
+    FTS5の演算子（AND/OR/NEAR、*、"など）は解釈せず、入力された文字列そのものを検索する。
+    """
+    return " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def bigram_query(terms: List[str]) -> Optional[str]:
+    """
+    MIN_TERM_LENGTH文字未満の語をnews_fts_bigramのクエリに変換する
+
+    2文字の語はbigram_textのトークンとの完全一致、1文字の語は前方一致（"円"*）で検索する。
+    記号などを含み、1つのトークンにならない語があればNone（LIKEで検索する）。
+    """
+    phrases = []
+    for term in terms:
+        token = bigram_text(term).split(" ")[0]
+        if token != term.lower():
+            return None
+        phrases.append(f'"{token}"*' if len(token) == 1 else f'"{token}"')
+    return " ".join(phrases)
+
+
+def _filters(start, end, category, currencies, currency_match):
+    clauses, params = [], {}
+    if start is not None:
+        clauses.append("a.published >= :start")
+        params["start"] = start
+    if end is not None:
+        clauses.append("a.published <= :end")
+        params["end"] = end
+    if category:
+        clauses.append("a.category = :category")
+        params["category"] = category
+    mask = currency_mask(currencies)
+    if mask:
+        clauses.append("a.currency_mask IN :masks")
+        params["masks"] = matching_masks(mask, currency_match)
+    return clauses, params
+
+
+def search_news(
+    session,
+    query: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    category: Optional[str] = None,
+    currencies: Optional[List[str]] = None,
+    currency_match: str = "exact",
+    limit: int = 20,
+    offset: int = 0,
+    include_total: bool = True,
+) -> Tuple[Optional[int], List[Tuple[NewsArticle, Optional[float]]]]:
+    """
+    タイトルと要約をキーワードで検索する
+
+    FTS5のインデックスで一致する記事を絞り込み、bm25の関連度順に返す。
+    MIN_TERM_LENGTH文字以上の語はtrigramのnews_fts、それより短い語はnews_fts_bigramで検索する（両方あれば両方に一致する記事）。
+    FTS5が使えない場合や、短い語が記号などを含む場合は、LIKEで検索して新しい順に返す。
+    アーカイブ（archive.py）に移した記事は検索されない。
+
+    Args:
+        include_total: Falseなら総件数を数えない（一致する記事の多い語で、全件を数える分の読み込みを省く）
+
+    Returns:
+        tuple: (一致した総件数（include_total=FalseならNone）, [(記事, スコア)])。
+               スコアは小さいほど関連度が高い（LIKE検索ではNone）
+    """
+    terms = split_terms(query)
+    if not terms:
+        return (0 if include_total else None), []
+
+    clauses, params = _filters(start, end, category, currencies or [], currency_match)
+
+    long_terms = [term for term in terms if len(term) >= MIN_TERM_LENGTH]
+    short_terms = [term for term in terms if len(term) < MIN_TERM_LENGTH]
+    short_match = bigram_query(short_terms) if short_terms else None
+    use_fts = fts_available(session) and (
+        not short_terms or (short_match is not None and fts_available(session, NEWS_BIGRAM_TABLE))
+    )
+
+    if use_fts:
+        # 長い語があればnews_fts、無ければnews_fts_bigramの一致で絞り込み、そのbm25で並べる
+        table = NEWS_FTS_TABLE if long_terms else NEWS_BIGRAM_TABLE
+        source = f"{table} JOIN news_articles a ON a.id = {table}.rowid"
+        clauses.insert(0, f"{table} MATCH :match")
+        params["match"] = fts_query(long_terms) if long_terms else short_match
+        if long_terms and short_terms:
+            clauses.insert(
+                1, f"a.id IN (SELECT rowid FROM {NEWS_BIGRAM_TABLE} WHERE {NEWS_BIGRAM_TABLE} MATCH :bigram_match)"
+            )
+            params["bigram_match"] = short_match
+        score = f"bm25({table}, {TITLE_WEIGHT}, {SUMMARY_WEIGHT})"
+        order = "score"
+    else:
+        source = "news_articles a"
+        for i, term in enumerate(terms):
+            clauses.append(f"(a.title LIKE :term{i} ESCAPE '\\' OR a.summary LIKE :term{i} ESCAPE '\\')")
+            escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            params[f"term{i}"] = f"%{escaped}%"
+        score = "NULL"
+        order = "a.published DESC"
+
+    where = " AND ".join(clauses) if clauses else "1"
+    binds = [bindparam("masks", expanding=True)] if "masks" in params else []
+
+    total = None
+    if include_total:
+        # 絞り込みがFTSの一致だけなら、件数は全文検索インデックスだけで数える（記事テーブルとの結合を省く）
+        count_source = table if use_fts and len(clauses) == 1 else source
+        total = session.execute(
+            text(f"SELECT count(*) FROM {count_source} WHERE {where}").bindparams(*binds), params
+        ).scalar()
+    rows = session.execute(
+        text(
+            f"SELECT a.id, {score} AS score FROM {source} WHERE {where} "
+            f"ORDER BY {order}, a.id DESC LIMIT :limit OFFSET :offset"
+        ).bindparams(*binds),
+        {**params, "limit": limit, "offset": offset},
+    ).all()
+
+    articles = {a.id: a for a in session.query(NewsArticle).filter(NewsArticle.id.in_([r.id for r in rows]))}
+    return total, [(articles[r.id], r.score) for r in rows if r.id in articles]
@@ -0,0 +1,35 @@
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+
+# キーセットページング用のカーソル
+#
+# 前のページの最後の行の (published, id) を不透明な文字列にして返し、次のページは
+# 「その行より古いもの」をインデックスの順にlimit件読む。OFFSETと違い、何ページ目でも読む行数は同じ。
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(published: datetime, article_id: int) -> str:
+    raw = f"{published.isoformat()}|{article_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """
+    Returns:
+        tuple: (published, id)。cursorが空ならNone
+
+    Raises:
+        InvalidCursor: 形式が不正な場合
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        published, article_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(published), int(article_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
@@ -0,0 +1,132 @@
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from sqlalchemy.orm import sessionmaker
+from app.script.db import create_db_engine
+from app.script.db_benchmark import _seed
+from app.script.models import Base, NewsArticle
+from app.script.timeframes import load_indicator_frames, indicator_records, indicator_columns
+from app.script.responses import dumps, compress, brotli
+from app.script.debug import debug_printer as d
+
+# JSONレスポンスのベンチマーク
+# 30日分×複数ペアの指標と30日分のニュースについて、FastAPIの既定の経路（jsonable_encoder、response_modelでの検証）と
+# orjsonでの変換を比較し、変換時間と転送サイズ（無圧縮・gzip・brotli）を出す
+#
+# 実行: python -m app.script.response_benchmark
+
+
+class _ArticleModel(BaseModel):
+    # app.main.NewsArticleResponse と同じ定義（app.mainはモデル読み込みなどが重いためimportしない）
+    id: int
+    category: str
+    title: str
+    summary: str
+    url: str
+    published: datetime
+    currency_tags: List[str]
+
+
+class _NewsModel(BaseModel):
+    total: int
+    articles: List[_ArticleModel]
+
+
+def _fastapi_dumps(content) -> bytes:
+    # JSONResponse.render と同じ引数
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def _validated_dumps(content) -> bytes:
+    # response_model を指定した場合の経路（検証してからJSON用の値に変換）
+    return _fastapi_dumps(_NewsModel.model_validate(content).model_dump(mode="json"))
+
+
+def _seed_news(session_factory, days=30, per_day=200):
+    session = session_factory()
+    try:
+        start = datetime.now() - timedelta(days=days)
+        session.bulk_insert_mappings(NewsArticle, [
+            {"category": "market", "title": f"ドル円 ニュース {i}", "summary": "日銀の金融政策と米国の雇用統計を受けてドル円は上昇。" * 4,
+             "url": f"https://example.com/news/{i}", "published": start + timedelta(minutes=i * 1440 // per_day),
+             "currency_tags": ["USD", "JPY"]}
+            for i in range(days * per_day)
+        ])
+        session.commit()
+    finally:
+        session.close()
+
+
+def _time(func, content, repeat):
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        body = func(content)
+        timings.append(time.perf_counter() - t0)
+    return statistics.median(timings), body
+
+
+def _report(name, content, baseline, repeat):
+    base_seconds, base_body = _time(baseline, content, repeat)
+    fast_seconds, fast_body = _time(dumps, content, repeat)
+    if json.loads(base_body) != json.loads(fast_body):
+        raise AssertionError(f"{name}: fast path differs from the default path")
+    sizes = {"raw": len(fast_body), "gzip": len(compress(fast_body, "gzip"))}
+    if brotli is not None:
+        sizes["br"] = len(compress(fast_body, "br"))
+    return {
+        "default_ms": round(base_seconds * 1000, 1),
+        "orjson_ms": round(fast_seconds * 1000, 1),
+        "speedup": round(base_seconds / fast_seconds, 1),
+        "bytes": sizes,
+    }
+
+
+def run_response_benchmark(pairs=10, days=30, repeat=5):
+    """
+    Returns:
+        dict: ペイロードの種類→{"default_ms", "orjson_ms", "speedup", "bytes": {"raw", "gzip", "br"}}
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(f"sqlite:///{os.path.join(tmp, 'bench.sqlite')}")
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        _seed(session_factory, pairs=pairs, days=days)
+        _seed_news(session_factory, days=days)
+
+        session = session_factory()
+        try:
+            since = datetime.now() - timedelta(days=days + 1)
+            frames = load_indicator_frames(session, [f"PAIR{p}" for p in range(pairs)], start=since)
+            articles = session.query(NewsArticle).filter(NewsArticle.published >= since).all()
+        finally:
+            session.close()
+        engine.dispose()
+
+    rows = {pair: indicator_records(df) for pair, df in frames.items()}
+    columns = {pair: indicator_columns(df) for pair, df in frames.items()}
+    news = {
+        "total": len(articles),
+        "articles": [
+            {"id": n.id, "category": n.category, "title": n.title, "summary": n.summary, "url": n.url,
+             "published": n.published, "currency_tags": n.currency_tags or []}
+            for n in articles
+        ],
+    }
+    return {
+        "indicators_rows": _report("indicators_rows", rows, _fastapi_dumps, repeat),
+        "indicators_columns": _report("indicators_columns", columns, _fastapi_dumps, repeat),
+        "news": _report("news", news, _validated_dumps, repeat),
+    }
+
+
+if __name__ == "__main__":
+    for name, result in run_response_benchmark().items():
+        d.print(f"{name} (pairs=10, days=30): {result}", level="debug")
@@ -0,0 +1,127 @@
+import asyncio
+import gzip
+import json
+import os
+from datetime import date, datetime
+from concurrent.futures import Executor
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+from fastapi import Request
+from fastapi.responses import Response
+
+# 件数の多いAPI用の高速なJSONレスポンス
+#
+# FastAPIの既定の経路（jsonable_encoderで値を1つずつ変換し、response_modelで1行ずつ検証）を通さず、
+# 信頼できるdict/listをorjsonで直接バイト列にする。Accept-Encodingに応じてbrotli/gzipで圧縮する。
+# orjson・brotliが無い環境では標準のjson・gzipを使う。
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 1024))  # これより小さいレスポンスは圧縮しない
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 4))  # 動的なレスポンス向け（11は遅すぎる）
+
+
+def _default(obj):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    """
+    JSONのバイト列に変換する（datetimeはISO形式、numpyの配列・数値にも対応）
+    """
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Accept-Encodingから使う圧縮方式を選ぶ（br > gzip。q=0 は受け付けない扱い）
+    """
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    for name in (["br"] if brotli is not None else []) + ["gzip"]:
+        if accepted.get(name, accepted.get("*", 0.0)) > 0:
+            return name
+    return None
+
+
+def compress(body: bytes, encoding: Optional[str]) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL)
+    return body
+
+
+def encode_json(content, accept_encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """
+    contentをJSONに変換し、Accept-Encodingに応じて圧縮する
+
+    Returns:
+        tuple: (本文, 圧縮方式（圧縮しなかった場合はNone）)
+    """
+    body = dumps(content)
+    encoding = choose_encoding(accept_encoding) if len(body) >= COMPRESS_MIN_BYTES else None
+    return compress(body, encoding), encoding
+
+
+def _json_response(body: bytes, encoding: Optional[str], status_code: int, headers: Optional[dict]) -> Response:
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept-Encoding"
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
+
+
+def fast_json_response(request: Request, content, status_code: int = 200, headers: Optional[dict] = None) -> Response:
+    """
+    contentをorjsonで変換し、クライアントが対応していれば圧縮して返す
+
+    response_modelの検証は行わないため、contentは信頼できるデータ（DBから作ったdictなど）に限る。
+    """
+    body, encoding = encode_json(content, request.headers.get("accept-encoding"))
+    return _json_response(body, encoding, status_code, headers)
+
+
+async def offloaded_json_response(
+    executor: Executor, request: Request, build: Callable, *args, status_code: int = 200, headers: Optional[dict] = None
+) -> Response:
+    """
+    build(*args)でレスポンスの内容を作り、JSONへの変換・圧縮までをexecutorで実行する（fast_json_responseの非同期版）
+
+    DataFrameの変換やorjson・brotliはCPUを使うため、イベントループ上で実行すると他のリクエストを止めてしまう。
+    """
+    accept_encoding = request.headers.get("accept-encoding")
+
+    def run():
+        return encode_json(build(*args), accept_encoding)
+
+    body, encoding = await asyncio.get_running_loop().run_in_executor(executor, run)
+    return _json_response(body, encoding, status_code, headers)
@@ -0,0 +1,68 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable
+
+from app.script.debug import debug_printer as d
+
+# 同時に届いた同じリクエストの処理を1回にまとめる（single-flight）
+#
+# /compare を複数人が同時に開いたときなどに、同じキーの処理が実行中であれば新たに実行せず、
+# 実行中の処理の結果（または例外）を全員で受け取る。負荷はリクエスト数ではなく、異なるリクエストの数に比例する。
+# 結果は保持しない（処理が終わればキーは消え、次のリクエストは再び実行する）。キャッシュはChartCacheなどで行う。
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, func: Callable[..., Awaitable], *args, **kwargs):
+        """
+        keyの処理が実行中ならその結果を待ち、なければfunc(*args, **kwargs)を実行する
+
+        Args:
+            key: 同じ結果になるリクエストを識別する値（データバージョンなども含める）
+            func: 結果を返すコルーチン関数
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        # 先に来たクライアントが切断しても、待っている他のリクエストのために処理は止めない
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # 全員が切断していても「例外が取得されなかった」警告を出さない
+
+
+if __name__ == "__main__":
+    # 動作確認: python -m app.script.singleflight
+    async def _check():
+        flight = SingleFlight()
+        calls = []
+
+        async def work(n):
+            calls.append(n)
+            await asyncio.sleep(0.05)
+            return n * 2
+
+        results = await asyncio.gather(*[flight.do(("work", i % 2), work, i % 2) for i in range(10)])
+        assert results == [0, 2] * 5 and sorted(calls) == [0, 1] and len(flight) == 0
+        await flight.do(("work", 0), work, 0)  # 終わった処理は再び実行される
+        assert len(calls) == 3
+
+        async def fail():
+            calls.append("fail")
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        errors = await asyncio.gather(*[flight.do("fail", fail) for _ in range(5)], return_exceptions=True)
+        assert all(isinstance(e, ValueError) for e in errors) and calls.count("fail") == 1
+        d.print(f"singleflight ok: {len(calls)} calls for 16 requests", level="debug")
+
+    asyncio.run(_check())
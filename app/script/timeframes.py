@@ -0,0 +1,228 @@
+import pandas as pd
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import String, select, type_coerce
+from app.script.models import TechnicalIndicator, ResampledIndicator
+from app.script.indicators import get_engine, INDICATOR_COLUMNS
+from app.script.bars import load_bars, SEED_DAYS
+from app.script.debug import debug_printer as d
+
+BASE_TIMEFRAME = "1h"
+
+# 上位足: 足の長さと、エンジン初期化時に読み込む1時間足の期間
+TIMEFRAMES = {
+    "4h": {"interval": timedelta(hours=4), "history": timedelta(days=60)},
+    "1d": {"interval": timedelta(days=1), "history": timedelta(days=SEED_DAYS)},
+}
+
+SUPPORTED_TIMEFRAMES = [BASE_TIMEFRAME] + list(TIMEFRAMES)
+
+# 指標テーブルから読み込む値の列（timestamp以外）
+INDICATOR_FIELDS = ["close"] + INDICATOR_COLUMNS
+
+# SQLAlchemyがSQLiteのDateTimeを保存する形式
+_SQLITE_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def engine_key(pair_code: str, timeframe: str) -> str:
+    return pair_code if timeframe == BASE_TIMEFRAME else f"{pair_code}@{timeframe}"
+
+
+def resample_bars(df: pd.DataFrame, timeframe: str) -> pd.DataFrame:
+    """
+    1時間足を上位足に集約する（時刻は足の開始時刻）
+    """
+    if df.empty:
+        return df
+    buckets = df.index.floor(pd.Timedelta(TIMEFRAMES[timeframe]["interval"]))
+    resampled = df.groupby(buckets).agg(
+        {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+    )
+    resampled.index.name = df.index.name
+    return resampled
+
+
+def compute_timeframe_indicators(session, pair_code: str, timeframe: str) -> pd.DataFrame:
+    """
+    保存済みの1時間足から上位足の指標を差分更新する（ダウンロードは行わない）
+
+    エンジンが最後に処理した上位足（まだ確定していない可能性がある）の開始時刻以降の1時間足だけを読み込み、
+    集約してエンジンに流し込む。最後の上位足は次回、確定した値で差し替えられる。
+
+    Returns:
+        pd.DataFrame: 今回計算した上位足（Close列と指標列）。ウォームアップ中の足は含まない
+    """
+    engine = get_engine(engine_key(pair_code, timeframe))
+    start = engine.last_timestamp or (datetime.today() - TIMEFRAMES[timeframe]["history"])
+
+    bars = resample_bars(load_bars(session, pair_code, start=start), timeframe)
+    if bars.empty:
+        return bars
+
+    indicators = engine.update_frame(bars)
+    df = bars.join(indicators.dropna(subset=["ema_50"]), how="inner")
+    d.print(f"{pair_code} {timeframe}: {len(df)} bars updated", level='debug')
+    return df
+
+
+def indicator_model(timeframe: str = BASE_TIMEFRAME):
+    return TechnicalIndicator if timeframe == BASE_TIMEFRAME else ResampledIndicator
+
+
+def load_indicator_frame(
+    session,
+    pair_code: str,
+    timeframe: str = BASE_TIMEFRAME,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    columns: Optional[List[str]] = None,
+    last: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    指標をORMオブジェクトを経由せずにDataFrameとして読み込む
+
+    必要な列だけをCoreのSELECTで取得し、カーソルの行から直接DataFrameを作る。
+    時刻は文字列のまま受け取り、pandasでまとめて変換する（行ごとのdatetime変換を省く）。
+
+    Args:
+        columns: 読み込む列（省略時はINDICATOR_FIELDSすべて）
+        last: 指定した場合、新しい方からこの本数だけを読み込む
+
+    Returns:
+        pd.DataFrame: timestampインデックス（昇順）、値の列はfloat64（NULLはNaN）
+    """
+    return rows_to_frame(fetch_indicator_rows(session, pair_code, timeframe, start, end, columns, last), columns)
+
+
+def fetch_indicator_rows(
+    session,
+    pair_code: str,
+    timeframe: str = BASE_TIMEFRAME,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    columns: Optional[List[str]] = None,
+    last: Optional[int] = None,
+) -> list:
+    """
+    load_indicator_frameのうちDBから行を読むところまで（DataFrameへの変換はrows_to_frame）
+
+    非同期エンドポイントでは、この関数だけをイベントループ上（AsyncSession.run_sync）で実行し、
+    DataFrameへの変換はスレッドプールで行う。
+
+    Returns:
+        list: (timestamp文字列, 値...) の行（時刻の昇順）
+    """
+    model = indicator_model(timeframe)
+    columns = columns or INDICATOR_FIELDS
+
+    stmt = _filter_range(
+        select(type_coerce(model.timestamp, String), *[getattr(model, c) for c in columns])
+        .where(model.currency_pair == pair_code),
+        model, timeframe, start, end,
+    )
+    if last is not None:
+        stmt = stmt.order_by(model.timestamp.desc()).limit(last)
+    else:
+        stmt = stmt.order_by(model.timestamp)
+
+    rows = session.execute(stmt).all()
+    if last is not None:
+        rows.reverse()
+    return rows
+
+
+def load_indicator_frames(
+    session,
+    pair_codes: List[str],
+    timeframe: str = BASE_TIMEFRAME,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    columns: Optional[List[str]] = None,
+) -> Dict[str, pd.DataFrame]:
+    """
+    複数の通貨ペアの指標を1回のクエリ（currency_pair IN (...)）で読み込む
+
+    (currency_pair, timestamp) のユニークインデックスの順に読むため、並べ替えは発生しない。
+
+    Returns:
+        dict: 通貨ペア→load_indicator_frameと同じ形式のDataFrame（データが無いペアは含まない）
+    """
+    return rows_to_frames(fetch_indicator_rows_multi(session, pair_codes, timeframe, start, end, columns), columns)
+
+
+def fetch_indicator_rows_multi(
+    session,
+    pair_codes: List[str],
+    timeframe: str = BASE_TIMEFRAME,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    columns: Optional[List[str]] = None,
+) -> Dict[str, list]:
+    """
+    load_indicator_framesのうちDBから行を読むところまで（DataFrameへの変換はrows_to_frames）
+
+    Returns:
+        dict: 通貨ペア→fetch_indicator_rowsと同じ形式の行（指定した順。データが無いペアは含まない）
+    """
+    model = indicator_model(timeframe)
+    columns = columns or INDICATOR_FIELDS
+    pair_codes = list(dict.fromkeys(pair_codes))
+
+    stmt = _filter_range(
+        select(model.currency_pair, type_coerce(model.timestamp, String), *[getattr(model, c) for c in columns])
+        .where(model.currency_pair.in_(pair_codes)),
+        model, timeframe, start, end,
+    ).order_by(model.currency_pair, model.timestamp)
+
+    groups: Dict[str, list] = {}
+    for row in session.execute(stmt):
+        groups.setdefault(row[0], []).append(row[1:])
+    return {pair: groups[pair] for pair in pair_codes if pair in groups}
+
+
+def _filter_range(stmt, model, timeframe: str, start: Optional[datetime], end: Optional[datetime]):
+    if model is ResampledIndicator:
+        stmt = stmt.where(model.timeframe == timeframe)
+    if start is not None:
+        stmt = stmt.where(model.timestamp >= start)
+    if end is not None:
+        stmt = stmt.where(model.timestamp <= end)
+    return stmt
+
+
+def rows_to_frame(rows, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    fetch_indicator_rowsの行をload_indicator_frameと同じ形式のDataFrameにする
+    """
+    columns = columns or INDICATOR_FIELDS
+    df = pd.DataFrame.from_records(rows, columns=["timestamp"] + columns, coerce_float=True)
+    df["timestamp"] = pd.to_datetime(df["timestamp"], format=_SQLITE_DATETIME_FORMAT)
+    df[columns] = df[columns].astype("float64")
+    return df.set_index("timestamp")
+
+
+def rows_to_frames(groups: Dict[str, list], columns: Optional[List[str]] = None) -> Dict[str, pd.DataFrame]:
+    return {pair: rows_to_frame(rows, columns) for pair, rows in groups.items()}
+
+
+def indicator_records(df: pd.DataFrame) -> List[dict]:
+    """
+    load_indicator_frameの結果をJSON用のdictのリストに変換する（timestampはISO形式、NaNはNone）
+    """
+    values = df.astype(object).where(df.notna(), None)
+    values.insert(0, "timestamp", [ts.isoformat() for ts in df.index])
+    return values.to_dict("records")
+
+
+def indicator_columns(df: pd.DataFrame) -> dict:
+    """
+    load_indicator_frameの結果を列ごとの配列に変換する（行ごとのdictよりキーの繰り返しが無い分小さい）
+
+    Returns:
+        dict: {"timestamps": [エポックミリ秒, ...], "columns": {列名: [値, ...]}}（NaNはNone）
+    """
+    values = df.astype(object).where(df.notna(), None)
+    return {
+        "timestamps": df.index.values.astype("datetime64[ms]").astype("int64").tolist(),
+        "columns": {col: values[col].tolist() for col in df.columns},
+    }
@@ -0,0 +1,158 @@
+import base64
+import hashlib
+import re
+from urllib.parse import parse_qsl, unquote, urlencode, urlsplit, urlunsplit
+
+# ニュースURLの正規化（重複記事の判定用）
+#
+# 同じ記事でもトラッキングパラメータやリダイレクト用のラッパーでURLが変わるため、
+# 正規化したURLのハッシュ（news_articles.url_hash）で重複を判定する。
+
+# 除去するトラッキング用パラメータ（小文字で比較）
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid", "ocid", "cmpid", "cmp",
+    "ncid", "smid", "sref", "ref", "ref_src", "referrer", "rss", "taid", "yptr", "guccounter", "ito",
+    "_ga", "_gl", "__twitter_impression", "s_cid", "wt.mc_id",
+}
+TRACKING_PREFIXES = ("utm_", "guce_", "pk_", "mtm_")
+
+# リダイレクト用のラッパー: ホスト→実際のURLが入っているパラメータ
+REDIRECT_PARAMS = {
+    "google.com": ["url", "q"],
+    "news.google.com": ["url"],
+    "l.facebook.com": ["u"],
+    "t.umblr.com": ["z"],
+    "feedproxy.google.com": ["url"],
+    "finnhub.io": ["url"],
+}
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+_URL_IN_BYTES = re.compile(rb"https?://[\x21-\x7e]+")
+
+
+def _unwrap_google_news(parts) -> str:
+    """
+    Google NewsのRSSリンク（/rss/articles/<base64>）から元記事のURLを取り出す
+
+    旧形式はbase64の中に元のURLがそのまま入っている。取り出せない形式の場合は空文字を返す。
+    """
+    match = re.search(r"/(?:rss/)?articles/([A-Za-z0-9_-]+)", parts.path)
+    if not match:
+        return ""
+    encoded = match.group(1)
+    try:
+        decoded = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+    except (ValueError, TypeError):
+        return ""
+    found = _URL_IN_BYTES.search(decoded)
+    return found.group(0).decode("ascii") if found else ""
+
+
+def unwrap_redirect(url: str, max_depth: int = 3) -> str:
+    """
+    リダイレクト用のラッパーURLから実際のURLを取り出す（ラッパーでなければそのまま返す）
+    """
+    for _ in range(max_depth):
+        parts = urlsplit(url)
+        host = (parts.hostname or "").lower()
+        if host.startswith("www."):
+            host = host[4:]
+
+        target = ""
+        if host == "news.google.com":
+            target = _unwrap_google_news(parts)
+        if not target:
+            params = dict(parse_qsl(parts.query))
+            for name in REDIRECT_PARAMS.get(host, []):
+                value = unquote(params.get(name, ""))
+                if value.startswith(("http://", "https://")):
+                    target = value
+                    break
+        if not target:
+            return url
+        url = target
+    return url
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    URLを正規化する
+
+    - リダイレクト用のラッパーを外す
+    - スキームとホストを小文字にし、httpはhttpsに、www.と既定のポートを除去
+    - トラッキング用パラメータとフラグメントを除去し、残りのパラメータを並べ替える
+    - 末尾のスラッシュを除去
+    """
+    if not url:
+        return ""
+    url = unwrap_redirect(url.strip())
+    parts = urlsplit(url)
+
+    scheme = parts.scheme.lower()
+    if scheme == "http":
+        scheme = "https"
+    host = (parts.hostname or "").lower().rstrip(".")
+    if host.startswith("www."):
+        host = host[4:]
+    netloc = host
+    if parts.port and parts.port != _DEFAULT_PORTS.get(parts.scheme.lower()):
+        netloc = f"{host}:{parts.port}"
+
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in TRACKING_PARAMS and not k.lower().startswith(TRACKING_PREFIXES)
+    )
+    path = re.sub(r"/{2,}", "/", parts.path).rstrip("/") or "/"
+
+    return urlunsplit((scheme, netloc, path, urlencode(query), ""))
+
+
+def url_hash(url: str) -> str:
+    """
+    正規化したURLのハッシュ（SHA-256の先頭32桁）。URLが空ならNone
+    """
+    canonical = canonicalize_url(url)
+    if not canonical:
+        return None
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32]
+
+
+def is_known_url(session, url: str, seen: set = None) -> bool:
+    """
+    同じ記事（正規化したURLが同じ）が既に保存済みか（スクレイピングや要約の前に確認する）
+
+    アーカイブに移した記事もarchived_url_hashesで確認する。
+
+    Args:
+        seen: 今回の収集で処理済みのハッシュ（未コミットの記事との重複も防ぐ）。判定したURLは追加される
+    """
+    from app.script.models import ArchivedUrlHash, NewsArticle  # models.pyがこのモジュールを使うため、ここで読み込む
+
+    value = url_hash(url)
+    if value is None:
+        return False
+    if seen is not None:
+        if value in seen:
+            return True
+        seen.add(value)
+    if session.query(NewsArticle.id).filter(NewsArticle.url_hash == value).first() is not None:
+        return True
+    return session.get(ArchivedUrlHash, value) is not None
+
+
+if __name__ == "__main__":
+    # 確認用: python -m app.script.url_canon
+    from app.script.debug import debug_printer as d
+
+    samples = [
+        ("https://www.Reuters.com/markets/currencies/yen-falls/?utm_source=rss&utm_medium=feed#top",
+         "http://reuters.com/markets/currencies/yen-falls"),
+        ("https://www.google.com/url?q=https%3A%2F%2Fwww.bloomberg.com%2Fnews%2Fa%3Fcmpid%3Dx&sa=U",
+         "https://bloomberg.com/news/a"),
+        ("https://news.google.com/rss/articles/"
+         + base64.urlsafe_b64encode(b"\x08\x13\x22\x1dhttps://example.com/fx/news?b=2&a=1\xd2\x01\x00").decode().rstrip("="),
+         "https://example.com:443/fx/news?a=1&b=2&fbclid=abc"),
+    ]
+    for a, b in samples:
+        assert url_hash(a) == url_hash(b), (canonicalize_url(a), canonicalize_url(b))
+        d.print(f"{canonicalize_url(a)}", level="debug")
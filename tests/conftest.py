@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# app.script.db はimport時にDB_PATHのDBへ接続してテーブルを作成するため、テスト用の一時ファイルに向ける
+os.environ["DB_PATH"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="news_db_test_"), "test.sqlite")
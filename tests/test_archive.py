@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.script import archive
+from app.script.db import SessionLocal, engine
+from app.script.models import ArchivedUrlHash, NewsArticle
+from app.script.url_canon import is_known_url
+
+# ニュースのアーカイブ（app.script.archive）のテスト
+
+NOW = datetime(2025, 7, 1)
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    session = SessionLocal()
+    session.query(NewsArticle).delete()
+    session.query(ArchivedUrlHash).delete()
+    session.add_all([
+        NewsArticle(category="market", title=f"記事 {i}", summary="ドル円" * 200, url=f"https://example.com/news/{i}",
+                    published=NOW - timedelta(days=i), currency_tags=["USD", "JPY"])
+        for i in range(120)
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_old_articles_are_moved_to_monthly_files(session):
+    moved = archive.archive_news(hot_days=90, now=NOW)
+
+    assert sum(moved.values()) == 29  # cutoffちょうどの記事はメインに残る
+    assert session.query(NewsArticle).count() == 91
+    total, articles, _ = archive.query_news_window(session, NOW - timedelta(days=200), NOW, limit=200)
+    assert total == 120 and len(articles) == 120
+
+
+def test_freed_pages_are_released(session):
+    archive.archive_news(hot_days=10, now=NOW)
+
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2  # INCREMENTAL
+        assert conn.exec_driver_sql("PRAGMA freelist_count").scalar() == 0
+
+
+def test_archived_urls_are_still_known(session):
+    archive.archive_news(hot_days=90, now=NOW)
+
+    assert is_known_url(session, "https://www.example.com/news/100?utm_source=rss")
+    assert is_known_url(session, "https://example.com/news/0")
+    assert not is_known_url(session, "https://example.com/news/999")
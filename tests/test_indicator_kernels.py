@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.script.indicators import IndicatorEngine, INDICATOR_COLUMNS
+from app.script.indicator_kernels import compute_indicator_arrays, compute_indicator_frames, stack_frames, check_parity
+
+# 履歴再計算用カーネル（app.script.indicator_kernels）のテスト
+# 長さの違う複数ペアを一括で計算した結果が、ペアごとのストリーミングエンジンと一致することを確認する
+
+
+def synthetic_frames(lengths=(3000, 1200, 60, 10), seed=0):
+    rng = np.random.default_rng(seed)
+    frames = {}
+    for i, n in enumerate(lengths):
+        close = 100.0 * (i + 1) + np.cumsum(rng.normal(0, 0.2, n))
+        spread = rng.random(n) * 0.3
+        frames[f"PAIR{i}"] = pd.DataFrame(
+            {"High": close + spread, "Low": close - spread, "Close": close},
+            index=pd.date_range("2024-01-01", periods=n, freq="h", name="timestamp"),
+        )
+    return frames
+
+
+def assert_close(actual, expected, col, tolerance=1e-6):
+    actual, expected = np.asarray(actual, dtype=np.float64), np.asarray(expected, dtype=np.float64)
+    assert (np.isnan(actual) == np.isnan(expected)).all(), f"NaN positions differ for {col}"
+    valid = ~np.isnan(expected)
+    assert np.allclose(actual[valid], expected[valid], rtol=0, atol=tolerance), f"{col} differs"
+
+
+def test_arrays_match_streaming_engine():
+    frames = synthetic_frames()
+    pairs, arrays, lengths = stack_frames(frames)
+    values = compute_indicator_arrays(arrays["High"], arrays["Low"], arrays["Close"])
+
+    for i, pair in enumerate(pairs):
+        expected = IndicatorEngine().update_frame(frames[pair])
+        for col in INDICATOR_COLUMNS:
+            assert_close(values[col][i, :lengths[i]], expected[col], col)
+
+
+def test_frames_do_not_depend_on_other_pairs():
+    frames = synthetic_frames()
+    together = compute_indicator_frames(frames)
+    for pair, df in frames.items():
+        alone = compute_indicator_frames({pair: df})[pair]
+        for col in INDICATOR_COLUMNS:
+            assert_close(together[pair][col], alone[col], col, tolerance=1e-9)
+
+
+def test_all_pairs_shorter_than_warmup():
+    # 上位足（日足）など、どのペアもEMAの期間に満たない場合は指標がNaNになる（例外にならない）
+    frames = synthetic_frames(lengths=(30, 10))
+    result = compute_indicator_frames(frames)
+    for pair, df in frames.items():
+        expected = IndicatorEngine().update_frame(df)
+        for col in INDICATOR_COLUMNS:
+            assert_close(result[pair][col], expected[col], col)
+    assert result["PAIR0"]["ema_50"].isna().all()
+
+
+def test_empty_frames_are_dropped():
+    frames = synthetic_frames(lengths=(100,))
+    frames["EMPTY"] = frames["PAIR0"].iloc[:0]
+    assert list(compute_indicator_frames(frames)) == ["PAIR0"]
+
+
+def test_matches_pandas_ta():
+    pytest.importorskip("pandas_ta")
+    errors = check_parity(synthetic_frames(lengths=(3000,))["PAIR0"])
+    assert set(errors) == set(INDICATOR_COLUMNS)
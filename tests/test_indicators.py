@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.script.indicators import IndicatorEngine, INDICATOR_COLUMNS, check_parity, compute_pandas_ta
+
+# ストリーミングエンジン（app.script.indicators）のテスト
+# 全期間の一括計算・1本ずつの逐次計算・未確定足の差し替えで同じ値になることを確認する
+
+
+def synthetic_bars(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 150.0 + np.cumsum(rng.normal(0, 0.2, n))
+    spread = rng.random(n) * 0.3
+    return pd.DataFrame(
+        {"High": close + spread, "Low": close - spread, "Close": close},
+        index=pd.date_range("2025-01-06", periods=n, freq="h", name="timestamp"),
+    )
+
+
+def assert_frames_close(actual, expected, tolerance=1e-9):
+    assert list(actual.index) == list(expected.index)
+    for col in INDICATOR_COLUMNS:
+        a, e = actual[col], expected[col]
+        assert (a.isna() == e.isna()).all(), f"NaN positions differ for {col}"
+        assert np.allclose(a[e.notna()], e[e.notna()], rtol=0, atol=tolerance), f"{col} differs"
+
+
+def test_incremental_ticks_match_full_run():
+    df = synthetic_bars()
+    expected = IndicatorEngine().update_frame(df)
+
+    engine = IndicatorEngine()
+    parts = [engine.update_frame(df.iloc[:100])]
+    for i in range(100, len(df)):
+        parts.append(engine.update_frame(df.iloc[i:i + 1]))
+
+    assert_frames_close(pd.concat(parts), expected)
+    assert engine.last_timestamp == df.index[-1]
+
+
+def test_already_processed_bars_are_skipped():
+    df = synthetic_bars()
+    engine = IndicatorEngine()
+    engine.update_frame(df)
+
+    # 最新足（未確定の可能性がある）以外の古い足は再計算しない
+    again = engine.update_frame(df)
+    assert list(again.index) == [df.index[-1]]
+
+
+def test_revised_last_bar_replaces_provisional_values():
+    df = synthetic_bars()
+    expected = IndicatorEngine().update_frame(df)
+
+    engine = IndicatorEngine()
+    engine.update_frame(df.iloc[:-1])
+    # 最新足を未確定の値で処理してから、同じ時刻の確定値で差し替える
+    provisional = df.iloc[-1:].copy()
+    provisional[["High", "Close"]] += 1.0
+    engine.update_frame(provisional)
+    revised = engine.update_frame(df.iloc[-1:])
+
+    assert_frames_close(revised, expected.iloc[-1:])
+
+    # 差し替えた後の足も、最初から確定値で計算した場合と同じになる
+    more = synthetic_bars(n=len(df) + 20)
+    more.iloc[:len(df)] = df
+    assert_frames_close(engine.update_frame(more.iloc[len(df):]), IndicatorEngine().update_frame(more).iloc[len(df):])
+
+
+def test_warmup_rows_are_nan():
+    result = IndicatorEngine().update_frame(synthetic_bars(n=60))
+    assert result["ema_50"].iloc[:49].isna().all()
+    assert result["ema_50"].iloc[49:].notna().all()
+    assert result["rsi"].iloc[0:1].isna().all()
+
+
+def test_full_run_matches_pandas_ta():
+    pytest.importorskip("pandas_ta")
+    df = synthetic_bars(n=500)
+    assert_frames_close(IndicatorEngine().update_frame(df), compute_pandas_ta(df), tolerance=1e-6)
+
+
+def test_ticks_with_revisions_match_pandas_ta():
+    pytest.importorskip("pandas_ta")
+    # 最後の24本を1本ずつ、未確定の値→確定値の順に流し込んでpandas_taと比較する
+    errors = check_parity(synthetic_bars(n=500), split=24)
+    assert set(errors) == set(INDICATOR_COLUMNS)
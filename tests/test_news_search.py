@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.script.migrations import run_migrations
+from app.script.models import NewsArticle, bigram_text
+from app.script.news_search import search_news
+
+# ニュースの全文検索（app.script.news_search）のテスト
+
+ARTICLES = [
+    ("日銀が利上げを決定", "円相場は円高に振れた。"),
+    ("米雇用統計", "ドル円は上昇、金利も上昇。"),
+    ("ECB理事会", "ユーロは小動き。"),
+    ("U.S. CPI", "Inflation slowed in June."),
+]
+
+
+@pytest.fixture(scope="module")
+def session(tmp_path_factory):
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('search') / 'search.sqlite'}")
+    run_migrations(engine)
+    session = sessionmaker(bind=engine)()
+    start = datetime(2025, 7, 1)
+    session.add_all([
+        NewsArticle(category="market", title=title, summary=summary, url=f"https://example.com/{i}",
+                    published=start + timedelta(hours=i), currency_tags=[])
+        for i, (title, summary) in enumerate(ARTICLES)
+    ])
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def titles(results):
+    return sorted(article.title for article, _ in results)
+
+
+def test_bigram_text():
+    assert bigram_text("日銀の利上げ") == "日銀 銀の の利 利上 上げ げ"
+    assert bigram_text("USD/JPY") == "us sd d jp py y"
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("日銀", ["日銀が利上げを決定"]),  # 2文字の語
+    ("円", ["日銀が利上げを決定", "米雇用統計"]),  # 1文字の語（前方一致）
+    ("金利", ["米雇用統計"]),
+    ("利上げ", ["日銀が利上げを決定"]),  # trigram
+    ("ドル円 上昇", ["米雇用統計"]),  # 長い語と短い語の組み合わせ
+    ("cpi", ["U.S. CPI"]),
+])
+def test_search_uses_fts_index(session, query, expected):
+    total, results = search_news(session, query)
+    assert titles(results) == expected
+    assert total == len(expected)
+    assert all(score is not None for _, score in results)  # LIKEではなくFTS5（bm25）で検索した
+
+
+def test_short_term_with_symbol_falls_back_to_like(session):
+    total, results = search_news(session, "U.")
+    assert titles(results) == ["U.S. CPI"]
+    assert [score for _, score in results] == [None]
+
+
+def test_total_is_optional(session):
+    total, results = search_news(session, "円", include_total=False)
+    assert total is None
+    assert len(results) == 2
+
+
+def test_updated_summary_is_reindexed(session):
+    article = session.query(NewsArticle).filter(NewsArticle.title == "ECB理事会").one()
+    article.summary = "ユーロ円は下落。"
+    session.commit()
+    assert titles(search_news(session, "円")[1]) == ["ECB理事会", "日銀が利上げを決定", "米雇用統計"]
@@ -0,0 +1,32 @@
+import pytest
+from sqlalchemy import create_engine
+
+from app.script.migrations import MIGRATIONS, run_migrations, hot_queries, explain_query_plan
+
+# スキーマのマイグレーションと主要クエリのクエリプラン（app.script.migrations）のテスト
+
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory):
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('plans') / 'migrations.sqlite'}")
+    run_migrations(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_migrations_are_recorded_once(engine):
+    # 適用済みのマイグレーションは再実行されない
+    assert run_migrations(engine) == []
+    with engine.connect() as conn:
+        applied = sorted(v for (v,) in conn.exec_driver_sql("SELECT version FROM schema_migrations"))
+    assert applied == sorted(version for version, _, _ in MIGRATIONS)
+
+
+@pytest.mark.parametrize("name", sorted(hot_queries()))
+def test_hot_query_uses_index(engine, name):
+    stmt, index = hot_queries()[name]
+    with engine.connect() as conn:
+        plan = explain_query_plan(conn, stmt)
+    assert any(index in line for line in plan), plan
+    assert not any(line.startswith("SCAN news_articles") for line in plan), plan
+    assert not any(line.startswith("SCAN") and "INDEX" not in line for line in plan), plan
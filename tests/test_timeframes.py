@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("yfinance")  # app.script.bars がimport時に必要とする
+
+from app.script import bars, collect
+from app.script.db import SessionLocal
+from app.script.indicators import reset_engine
+from app.script.models import Candle, ResampledIndicator, TechnicalIndicator
+from app.script.timeframes import SUPPORTED_TIMEFRAMES, TIMEFRAMES, engine_key
+
+# 上位足（app.script.timeframes）のテスト
+# 空のストアから収集を1回実行しただけで、4h・1dの指標が保存されることを確認する
+
+
+def synthetic_download(pair_codes, start, end=None):
+    # 平日の1時間足だけを返すyfinanceの代わり
+    index = pd.date_range(start.replace(minute=0, second=0, microsecond=0), end or datetime.today(), freq="h")
+    index = index[index.dayofweek < 5]
+    frames = {}
+    for i, pair_code in enumerate(pair_codes):
+        rng = np.random.default_rng(i)
+        close = 100.0 + np.cumsum(rng.normal(0, 0.1, len(index)))
+        frames[pair_code] = pd.DataFrame(
+            {"Open": close, "High": close + 0.05, "Low": close - 0.05, "Close": close, "Volume": 0.0},
+            index=pd.Index(index, name="timestamp"),
+        )
+    return frames
+
+
+@pytest.fixture
+def fresh_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(bars, "download_bars_batch", synthetic_download)
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()  # collect_technical_data が最新行をdata/に書き出す
+
+    session = SessionLocal()
+    for model in [Candle, TechnicalIndicator, ResampledIndicator]:
+        session.query(model).delete()
+    session.commit()
+    for pair in collect.CURRENCY_PAIRS:
+        for timeframe in SUPPORTED_TIMEFRAMES:
+            reset_engine(engine_key(pair, timeframe))
+    yield session
+    session.close()
+
+
+def test_first_download_covers_daily_warmup(fresh_store):
+    end = datetime(2025, 7, 1)
+    start = bars.plan_download_start(fresh_store, "USDJPY", end)
+    assert start <= end - TIMEFRAMES["1d"]["history"]
+
+
+@pytest.mark.parametrize("timeframe", list(TIMEFRAMES))
+def test_fresh_store_has_resampled_rows(fresh_store, timeframe):
+    collect.collect_technical_data()
+
+    for pair in collect.CURRENCY_PAIRS:
+        rows = fresh_store.query(ResampledIndicator).filter(
+            ResampledIndicator.currency_pair == pair, ResampledIndicator.timeframe == timeframe
+        ).count()
+        assert rows > 0, f"no {timeframe} rows for {pair}"